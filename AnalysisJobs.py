@@ -0,0 +1,365 @@
+# AnalysisJobs.py
+"""
+Escaneos manuales (/analyze, /analyze/stocks, /analyze/Merval) como jobs de fondo.
+
+El endpoint solo encola y devuelve el id; un pool chico de workers corre
+escaneo -> IA -> guardado -> aviso, y el cliente consulta /jobs/{id} (progreso),
+/jobs/{id}/candidates (estado por activo), /jobs/{id}/results (parciales) o cancela.
+
+Todo el estado vive en la tabla analysis_jobs y se escribe en cada avance:
+si el proceso se reinicia, resume() retoma los jobs que quedaron a medias
+(sin volver a escanear ni a pagar la IA de los candidatos que ya estaban listos).
+"""
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import ANALYSIS_JOB_WORKERS, ANALYSIS_JOB_HISTORY
+from database import SessionLocal
+from modelsTables import AnalysisJob
+from AppServices import NewsIntel, Notifier
+from LiveFeed import live_feed
+
+ACTIVE_STATUSES = ("queued", "scanning", "analyzing", "saving")
+FINAL_CANDIDATE_STATUSES = ("done", "error")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "item"):   # Escalares NumPy que vienen del DataFrame del scanner
+        return value.item()
+    return str(value)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=_json_default, ensure_ascii=False)
+
+
+def candidate_view(candidate: dict) -> dict:
+    """Candidato guardado -> fila plana para la API."""
+    op = candidate["op"]
+    analysis = candidate.get("analysis") or {}
+    return {
+        "symbol": op.get("symbol"),
+        "name": op.get("name"),
+        "price": op.get("price"),
+        "percent_change": op.get("percent_change"),
+        "rsi": op.get("rsi"),
+        "technical_signal": op.get("technical_signal"),
+        "status": candidate["status"],
+        "ai_score": analysis.get("score"),
+        "ai_decision": analysis.get("decision"),
+        "ai_reason": analysis.get("reason"),
+    }
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobInterrupted(Exception):
+    """El proceso se está apagando: el job queda activo en la base para resume()."""
+    pass
+
+
+class AnalysisJobManager:
+    def __init__(self, analyzer, save_fn, format_fn, max_workers: int = ANALYSIS_JOB_WORKERS):
+        """
+        save_fn(db, market, opportunities, analyses) -> filas guardadas (save_signals de main).
+        format_fn(title, rows) -> texto del reporte de Telegram (format_detailed_message de main).
+        """
+        self.analyzer = analyzer
+        self.save_fn = save_fn
+        self.format_fn = format_fn
+        self.max_workers = max_workers
+        self._executor = None
+        self._stopping = False
+        self._jobs = {}     # job_id -> estado vivo (solo jobs activos en este proceso)
+        self._locks = {}    # job_id -> Lock (serializa avances y escrituras del mismo job)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "deduplicated": 0, "resumed": 0, "done": 0, "cancelled": 0, "failed": 0}
+
+    # --- API (endpoints) ---
+    def submit(self, market: str, threshold: float, dedupe: bool = True) -> dict:
+        """
+        Encola un escaneo. Si ya hay uno activo con el mismo mercado y threshold, devuelve ese
+        (dedupe=False fuerza un job nuevo: pruebas de carga, re-análisis a pedido).
+        """
+        with self._lock:
+            for job in (self._jobs.values() if dedupe else ()):
+                if job["market"] == market and job["threshold"] == threshold and not job["cancel_requested"]:
+                    self._stats["deduplicated"] += 1
+                    return self.summary(job)
+            job = {
+                "id": uuid.uuid4().hex, "market": market, "threshold": threshold, "status": "queued",
+                "cancel_requested": False, "attempts": 0, "candidates": None, "results": None, "ai_usage": None,
+                "error": None, "created_at": datetime.utcnow(), "started_at": None, "finished_at": None,
+            }
+            self._jobs[job["id"]] = job
+            self._locks[job["id"]] = threading.Lock()
+            self._stats["submitted"] += 1
+        self._persist(job)
+        self._pool().submit(self._run, job["id"])
+        return self.summary(job)
+
+    def get(self, job_id: str):
+        """Estado del job (en memoria si está corriendo, si no desde la base). None si no existe."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            with self._locks[job_id]:
+                candidates = job["candidates"]
+                return dict(job, candidates=[dict(c) for c in candidates] if candidates is not None else None)
+        db = SessionLocal()
+        try:
+            row = db.get(AnalysisJob, job_id)
+            return self._from_row(row) if row else None
+        finally:
+            db.close()
+
+    def list_jobs(self, limit: int = ANALYSIS_JOB_HISTORY, market: str = None) -> list:
+        db = SessionLocal()
+        try:
+            query = db.query(AnalysisJob)
+            if market:
+                query = query.filter(AnalysisJob.market == market.upper())
+            rows = query.order_by(AnalysisJob.created_at.desc()).limit(limit).all()
+            with self._lock:
+                live = dict(self._jobs)
+            # Los activos en este proceso salen de memoria (la fila puede ir un avance atrás)
+            return [self.summary(live.get(row.id) or self._from_row(row)) for row in rows]
+        finally:
+            db.close()
+
+    def cancel(self, job_id: str):
+        """
+        Pide la cancelación: lo que no arrancó no se analiza y el job no guarda señales.
+        Las llamadas a la IA que ya estaban en vuelo terminan (y quedan en los parciales).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            with self._locks[job_id]:
+                job["cancel_requested"] = True
+            self._persist(job)
+            return self.summary(job)
+
+        db = SessionLocal()
+        try:
+            row = db.get(AnalysisJob, job_id)
+            if row is None:
+                return None
+            if row.status in ACTIVE_STATUSES:
+                # Quedó activo en la base pero no en este proceso (ej: antes de resume()): se cierra acá
+                row.cancel_requested = True
+                row.status = "cancelled"
+                row.finished_at = datetime.utcnow()
+                db.commit()
+            return self.summary(self._from_row(row))
+        finally:
+            db.close()
+
+    def resume(self) -> int:
+        """Al arrancar: retoma los jobs que quedaron activos en la base (reinicio o caída)."""
+        db = SessionLocal()
+        try:
+            rows = db.query(AnalysisJob).filter(AnalysisJob.status.in_(ACTIVE_STATUSES)) \
+                     .order_by(AnalysisJob.created_at).all()
+            jobs = [self._from_row(row) for row in rows]
+        finally:
+            db.close()
+
+        resumed = 0
+        for job in jobs:
+            with self._lock:
+                if job["id"] in self._jobs:
+                    continue
+                self._jobs[job["id"]] = job
+                self._locks[job["id"]] = threading.Lock()
+            # Lo que estaba en vuelo al caerse se vuelve a pedir
+            for candidate in job["candidates"] or []:
+                if candidate["status"] not in FINAL_CANDIDATE_STATUSES:
+                    candidate["status"] = "pending"
+            self._pool().submit(self._run, job["id"])
+            resumed += 1
+        if resumed:
+            with self._lock:
+                self._stats["resumed"] += resumed
+            print(f"♻️ [JOBS] {resumed} análisis retomados después del reinicio")
+        return resumed
+
+    def shutdown(self):
+        """Apagado: no se espera a los jobs; quedan activos en la base y resume() los retoma."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._stopping = True
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "active": len(self._jobs), "workers": self.max_workers}
+
+    @staticmethod
+    def summary(job: dict) -> dict:
+        """Progreso: estado, conteo de candidatos por estado y fracción terminada."""
+        candidates = job["candidates"] or []
+        counts = {"pending": 0, "analyzing": 0, "done": 0, "error": 0, "cancelled": 0}
+        for candidate in candidates:
+            counts[candidate["status"]] = counts.get(candidate["status"], 0) + 1
+        finished = counts["done"] + counts["error"]
+        return {
+            "job_id": job["id"],
+            "market": job["market"],
+            "threshold": job["threshold"],
+            "status": job["status"],
+            "cancel_requested": job["cancel_requested"],
+            "attempts": job["attempts"],
+            "total_candidates": len(candidates) if job["candidates"] is not None else None,
+            "candidates_by_status": counts,
+            "progress": round(finished / len(candidates), 3) if candidates else (1.0 if job["status"] == "done" else 0.0),
+            "saved": len(job["results"]) if job["results"] is not None else None,
+            "ai_usage": job.get("ai_usage"),
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+
+    # --- Worker ---
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._stopping = False
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analysis-job")
+            return self._executor
+
+    def _update(self, job_id: str, **fields):
+        job = self._jobs[job_id]
+        with self._locks[job_id]:
+            job.update(fields)
+        self._persist(job)
+
+    def _run(self, job_id: str):
+        job = self._jobs[job_id]
+        market = job["market"]
+        db = SessionLocal()
+        try:
+            self._check(job)
+            self._update(job_id, attempts=job["attempts"] + 1, started_at=job["started_at"] or datetime.utcnow())
+
+            # 1. Escaneo (si se retoma con candidatos guardados, no se repite)
+            if job["candidates"] is None:
+                self._update(job_id, status="scanning")
+                opportunities = self.analyzer.find_market_opportunities(market, job["threshold"])
+                self._update(job_id, candidates=[{"op": op, "status": "pending", "analysis": None} for op in opportunities])
+                msg_inicio = f"🔎 Iniciando Análisis {market} ({len(opportunities)} activos)..."
+                print(msg_inicio)
+                Notifier.send_telegram_alert(msg_inicio)
+            self._check(job)
+
+            # 2. IA solo para los que faltan; cada resultado se persiste apenas llega
+            self._update(job_id, status="analyzing")
+            candidates = job["candidates"]
+            pending = [i for i, c in enumerate(candidates) if c["status"] not in FINAL_CANDIDATE_STATUSES]
+
+            def on_progress(index, status, analysis=None):
+                candidate = candidates[pending[index]]
+                with self._locks[job_id]:
+                    candidate["status"] = status
+                    if analysis is not None:
+                        candidate["analysis"] = analysis
+                self._persist(job)
+
+            if pending:
+                news_intel = NewsIntel()
+                news_intel.analyze_opportunities(
+                    [candidates[i]["op"] for i in pending],
+                    is_crypto=(market == 'CRYPTO'), is_merval=(market == 'MERVAL'),
+                    on_progress=on_progress, is_cancelled=lambda: job["cancel_requested"] or self._stopping
+                )
+                # Tokens y latencia de la IA de este job (si se retomó, solo el último tramo)
+                self._update(job_id, ai_usage=news_intel.last_usage)
+            self._check(job)
+
+            # 3. Guardado y reporte
+            self._update(job_id, status="saving")
+            ready = [c for c in candidates if c["status"] in FINAL_CANDIDATE_STATUSES]
+            saved = self.save_fn(db, market, [c["op"] for c in ready], [c["analysis"] for c in ready])
+            if saved:
+                Notifier.send_telegram_alert(self.format_fn(f"REPORTE {market}", saved))
+            self._finish(job_id, "done", results=[row._asdict() for row in saved])
+        except JobCancelled:
+            self._finish(job_id, "cancelled")
+        except JobInterrupted:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._locks.pop(job_id, None)
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Error Job {market} ({job_id}): {e}")
+            self._finish(job_id, "failed", error=str(e))
+        finally:
+            db.close()
+
+    def _check(self, job: dict):
+        """Entre etapas: ¿cancelaron el job o se está apagando el proceso?"""
+        if job["cancel_requested"]:
+            raise JobCancelled()
+        if self._stopping:
+            raise JobInterrupted()
+
+    def _finish(self, job_id: str, status: str, **fields):
+        job = self._jobs[job_id]
+        with self._locks[job_id]:
+            for candidate in job["candidates"] or []:
+                if candidate["status"] not in FINAL_CANDIDATE_STATUSES:
+                    candidate["status"] = "cancelled"
+        self._update(job_id, status=status, finished_at=datetime.utcnow(), **fields)
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._locks.pop(job_id, None)
+            self._stats[status] += 1
+
+    # --- Persistencia ---
+    def _persist(self, job: dict):
+        """Escribe el estado completo del job (lo llama cada avance, bajo el lock del job)."""
+        lock = self._locks.get(job["id"])
+        if lock is None:
+            return
+        with lock:
+            values = {
+                "market": job["market"], "threshold": job["threshold"], "status": job["status"],
+                "cancel_requested": job["cancel_requested"], "attempts": job["attempts"],
+                "candidates": _dumps(job["candidates"]) if job["candidates"] is not None else None,
+                "results": _dumps(job["results"]) if job["results"] is not None else None,
+                "ai_usage": _dumps(job["ai_usage"]) if job.get("ai_usage") is not None else None,
+                "error": job["error"], "created_at": job["created_at"],
+                "started_at": job["started_at"], "finished_at": job["finished_at"],
+            }
+            db = SessionLocal()
+            try:
+                db.merge(AnalysisJob(id=job["id"], **values))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Job {job['id']}: no se pudo guardar el estado ({e})")
+            finally:
+                db.close()
+            summary = self.summary(job)
+        live_feed.publish("job", summary)
+
+    @staticmethod
+    def _from_row(row: AnalysisJob) -> dict:
+        return {
+            "id": row.id, "market": row.market, "threshold": row.threshold, "status": row.status,
+            "cancel_requested": bool(row.cancel_requested), "attempts": row.attempts or 0,
+            "candidates": json.loads(row.candidates) if row.candidates else None,
+            "results": json.loads(row.results) if row.results else None,
+            "ai_usage": json.loads(row.ai_usage) if row.ai_usage else None,
+            "error": row.error, "created_at": row.created_at,
+            "started_at": row.started_at, "finished_at": row.finished_at,
+        }
@@ -1,38 +1,242 @@
-import requests
 import yfinance as yf
 import pandas as pd
+import numpy as np
+import hashlib
+import json
+import re
+import threading
+import time
 from typing import List
+from datetime import datetime, timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 from config import (
     CMC_API_KEY, CMC_BASE_URL, USE_MOCK_DATA, WATCHLIST_STOCKS, WATCHLIST_MERVAL,
-    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, GEMINI_API_KEY,
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, GEMINI_API_KEY, AI_MAX_WORKERS, AI_BATCH_SIZE,
+    AI_STRUCTURED_OUTPUT, AI_USAGE_CYCLES, AI_USAGE_CALLS_PER_MARKET,
     TV_HEADERS, TV_COOKIES, TV_COLUMNS, TV_RAW_LISTS,
-    TV_COIN_URL, TV_COIN_COLUMNS # <--- IMPORTANTE: Nuevas variables
+    TV_COIN_URL, TV_COIN_COLUMNS, # <--- IMPORTANTE: Nuevas variables
+    SENTIMENT_CACHE_TTL_HOURS, SENTIMENT_CACHE_MAX_ENTRIES, PRICE_CACHE_TTL_SECONDS,
+    SNAPSHOT_ENABLED, SCAN_TOP_N, SCAN_OVERFETCH, USA_MIN_MARKET_CAP, NOISE_WORDS, UPSTREAM_MODE,
+    SCAN_CACHE_SECONDS, SCAN_CACHE_MAX_CHANGE, UNIVERSE_LIMITS
 )
+from database import engine, SessionLocal
+from modelsTables import SentimentCacheEntry, Trade, PositionMark
+from CandlePatterns import add_pattern_columns
+from ProviderClient import http_get, http_post
+from SnapshotStore import save_snapshot
+from LiveFeed import live_feed
+from Indicators import IndicatorEngine
+from TVScanner import sharded_scan
+from UpstreamReplay import gemini_model
+from TelegramOutbox import telegram_outbox
 from GoogleNews import GoogleNews
 import google.generativeai as genai
 
 genai.configure(api_key=GEMINI_API_KEY)
 
+# --- CACHE PERSISTENTE DE SENTIMIENTO (SQLite) ---
+class SentimentCache:
+    """
+    Guarda score/decision/reason de Gemini por (símbolo, mercado, huella de titulares).
+    Si los 5 titulares principales no cambiaron, no volvemos a llamar a la IA.
+    """
+    def __init__(self, ttl_hours: float = SENTIMENT_CACHE_TTL_HOURS, max_entries: int = SENTIMENT_CACHE_MAX_ENTRIES):
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    @staticmethod
+    def fingerprint(headlines: List[str]) -> str:
+        """Hash estable de los titulares (ignora orden, mayúsculas y espacios)."""
+        normalizados = sorted(" ".join(h.lower().split()) for h in headlines)
+        return hashlib.sha1("\n".join(normalizados).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_key(symbol: str, market: str, headlines_hash: str) -> str:
+        return f"{market}:{symbol.upper()}:{headlines_hash}"
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            SentimentCacheEntry.__table__.create(bind=engine, checkfirst=True)
+            self._table_ready = True
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit: self.hits += 1
+            else: self.misses += 1
+
+    def get(self, symbol: str, market: str, headlines_hash: str):
+        """Devuelve el análisis cacheado o None (expirado o inexistente)."""
+        key = self.make_key(symbol, market, headlines_hash)
+        db = SessionLocal()
+        try:
+            self._ensure_table()
+            entry = db.query(SentimentCacheEntry).filter(SentimentCacheEntry.cache_key == key).first()
+            if entry and datetime.utcnow() - entry.created_at <= self.ttl:
+                entry.last_used_at = datetime.utcnow()
+                db.commit()
+                self._count(hit=True)
+                return {"score": entry.score, "decision": entry.decision, "reason": entry.reason}
+        except Exception as e:
+            print(f"⚠️ Cache IA (lectura): {e}")
+        finally:
+            db.close()
+        self._count(hit=False)
+        return None
+
+    def put(self, symbol: str, market: str, headlines_hash: str, analysis: dict):
+        """Guarda (o reemplaza) un análisis y aplica TTL + límite de tamaño (LRU)."""
+        key = self.make_key(symbol, market, headlines_hash)
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            self._ensure_table()
+            entry = db.query(SentimentCacheEntry).filter(SentimentCacheEntry.cache_key == key).first()
+            if entry is None:
+                entry = SentimentCacheEntry(cache_key=key, symbol=symbol.upper(), market=market, headlines_hash=headlines_hash)
+                db.add(entry)
+            entry.score = analysis.get('score')
+            entry.decision = analysis.get('decision')
+            entry.reason = analysis.get('reason')
+            entry.created_at = now
+            entry.last_used_at = now
+            db.flush()
+
+            # 1. Borrar expirados
+            db.query(SentimentCacheEntry).filter(SentimentCacheEntry.created_at < now - self.ttl).delete(synchronize_session=False)
+
+            # 2. Desalojar los menos usados si nos pasamos del máximo
+            sobrantes = db.query(SentimentCacheEntry).count() - self.max_entries
+            if sobrantes > 0:
+                viejos = db.query(SentimentCacheEntry.id).order_by(SentimentCacheEntry.last_used_at.asc()).limit(sobrantes)
+                db.query(SentimentCacheEntry).filter(SentimentCacheEntry.id.in_(viejos.scalar_subquery())).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Cache IA (escritura): {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "ttl_hours": self.ttl.total_seconds() / 3600,
+                "max_entries": self.max_entries
+            }
+
+# Instancia compartida por todo el proceso (Scheduler + /analyze)
+sentiment_cache = SentimentCache()
+
+# --- CONSUMO DE LA IA (TOKENS + LATENCIA) ---
+def _usage_summary(calls: int, errors: int, assets: int, prompt_tokens: int, output_tokens: int, latencies) -> dict:
+    latencies = np.asarray(latencies, dtype=float)
+    return {
+        "calls": calls,
+        "errors": errors,
+        "assets": assets,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": prompt_tokens + output_tokens,
+        "tokens_per_asset": round((prompt_tokens + output_tokens) / assets, 1) if assets else 0.0,
+        "latency_avg": round(float(latencies.mean()), 3) if latencies.size else 0.0,
+        "latency_p50": round(float(np.percentile(latencies, 50)), 3) if latencies.size else 0.0,
+        "latency_p95": round(float(np.percentile(latencies, 95)), 3) if latencies.size else 0.0,
+        "latency_max": round(float(latencies.max()), 3) if latencies.size else 0.0,
+    }
+
+class AIUsageMeter:
+    """
+    Cada llamada a Gemini deja tokens de entrada/salida (usage_metadata) y latencia.
+    Se acumula por mercado (desde el arranque) y por ciclo (un analyze_opportunities),
+    para ajustar AI_BATCH_SIZE, el prompt y el modo estructurado mirando costo y demora.
+    """
+    def __init__(self, cycles: int = AI_USAGE_CYCLES, calls_per_market: int = AI_USAGE_CALLS_PER_MARKET):
+        self._lock = threading.Lock()
+        self._markets = {}                    # market -> totales + latencias recientes
+        self._cycles = deque(maxlen=cycles)   # resúmenes de los últimos ciclos
+        self._calls_per_market = calls_per_market
+
+    def start_cycle(self, market: str) -> dict:
+        return {"market": market, "started_at": datetime.utcnow(), "t0": time.perf_counter(),
+                "calls": 0, "errors": 0, "assets": 0, "prompt_tokens": 0, "output_tokens": 0, "latencies": []}
+
+    def record(self, market: str, latency: float, prompt_tokens: int, output_tokens: int, assets: int, ok: bool, cycle: dict = None):
+        with self._lock:
+            totals = self._markets.get(market)
+            if totals is None:
+                totals = self._markets[market] = {"calls": 0, "errors": 0, "assets": 0, "prompt_tokens": 0,
+                                                  "output_tokens": 0, "latencies": deque(maxlen=self._calls_per_market)}
+            for bucket in (totals, cycle) if cycle is not None else (totals,):
+                bucket["calls"] += 1
+                bucket["errors"] += 0 if ok else 1
+                bucket["assets"] += assets
+                bucket["prompt_tokens"] += prompt_tokens
+                bucket["output_tokens"] += output_tokens
+                bucket["latencies"].append(latency)
+
+    def finish_cycle(self, cycle: dict) -> dict:
+        with self._lock:
+            summary = {"market": cycle["market"], "started_at": cycle["started_at"],
+                       "wall_seconds": round(time.perf_counter() - cycle["t0"], 3),
+                       **_usage_summary(cycle["calls"], cycle["errors"], cycle["assets"],
+                                        cycle["prompt_tokens"], cycle["output_tokens"], cycle["latencies"])}
+            if cycle["calls"]:
+                self._cycles.append(summary)
+            return summary
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "structured_output": AI_STRUCTURED_OUTPUT,
+                "batch_size": AI_BATCH_SIZE,
+                "markets": {market: _usage_summary(t["calls"], t["errors"], t["assets"], t["prompt_tokens"],
+                                                   t["output_tokens"], list(t["latencies"]))
+                            for market, t in self._markets.items()},
+                "recent_cycles": list(self._cycles)[::-1]
+            }
+
+# Instancia compartida por todo el proceso (endpoint /ai/usage)
+ai_usage = AIUsageMeter()
+
 class NewsIntel:
-    def __init__(self):
-        self.googlenews = GoogleNews(lang='en', period='1d') # Noticias de últimas 24h
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, cache: SentimentCache = None):
+        # SDK real, SDK + grabación o stand-in local según UPSTREAM_MODE (ver UpstreamReplay.py)
+        self.model = gemini_model('gemini-2.5-flash')
+        self.cache = cache if cache is not None else sentiment_cache
+        self.usage = None        # Ciclo en curso (ver analyze_opportunities)
+        self.last_usage = None   # Resumen del último ciclo: tokens y latencia de la IA
 
-    def get_sentiment_analysis(self, symbol: str, asset_name: str = "", is_crypto: bool = True, is_merval: bool = False) -> dict:
+    @staticmethod
+    def market_flavor(is_crypto: bool, is_merval: bool) -> str:
+        if is_crypto: return "crypto"
+        if is_merval: return "merval"
+        return "stock"
+
+    def fetch_headlines(self, symbol: str, asset_name: str = "", is_crypto: bool = True, is_merval: bool = False):
         """
         Busca noticias con contexto dinámico de idioma y región.
+        Cada llamada crea su propio cliente GoogleNews, así es seguro usarla desde varios hilos.
+        Devuelve (search_term, titulares top 5).
         """
         # 1. AJUSTE DE IDIOMA SEGÚN MERCADO 🔥
         if is_merval:
             # Si es Merval, forzamos Español y región Argentina
-            self.googlenews = GoogleNews(lang='es', region='AR')
+            googlenews = GoogleNews(lang='es', region='AR')
             # Limpiamos el nombre (a veces viene como "Grupo Financiero Galicia S.A.")
             clean_name = asset_name.split(' inc')[0].split(' S.A.')[0].split(' Corp')[0]
             # Búsqueda más natural para diarios argentinos
             search_term = f"{clean_name} acciones economía"
         else:
             # Para Crypto y Stocks USA, seguimos en Inglés
-            self.googlenews = GoogleNews(lang='en') 
+            googlenews = GoogleNews(lang='en')
             if is_crypto:
                 search_term = f"{asset_name} cryptocurrency" if asset_name else f"{symbol} crypto coin"
             else:
@@ -41,23 +245,22 @@ class NewsIntel:
         print(f"🧠 [IA] Buscando ({'ES' if is_merval else 'EN'}): '{search_term}'...")
         
         # 2. EJECUCIÓN (Igual que antes)
-        self.googlenews.clear()
-        self.googlenews.search(search_term)
-        results = self.googlenews.result()
+        googlenews.clear()
+        googlenews.search(search_term)
+        results = googlenews.result()
         
         # Reintento inteligente para Merval
         if not results and is_merval:
              print(f"   ⚠️ Reintentando con ticker: {symbol}...")
-             self.googlenews.search(f"{symbol} acciones merval")
-             results = self.googlenews.result()
-
-        if not results:
-            return {"score": 50, "decision": "NEUTRAL", "reason": f"Sin noticias para {search_term}"}
+             googlenews.search(f"{symbol} acciones merval")
+             results = googlenews.result()
 
-        # 3. PROMPT CONTEXTUALIZADO (Ajustamos el rol de la IA)
         top_news = [f"- {item['title']} (Source: {item['media']})" for item in results[:5]]
-        news_text = "\n".join(top_news)
+        return search_term, top_news
 
+    @staticmethod
+    def _role(is_crypto: bool, is_merval: bool):
+        """Rol del analista y tipo de activo según el mercado."""
         if is_crypto:
             asset_type = "cryptocurrency"
             role = "Crypto Analyst, Senior Financial Analyst "
@@ -68,8 +271,105 @@ class NewsIntel:
         else:
             asset_type = "stock"
             role = "Senior Financial Analyst Wall Street Expert"
+        return role, asset_type
+
+    @staticmethod
+    def _parse_json(text: str):
+        """Quita los bloques ```json de Gemini y parsea."""
+        clean_json = text.replace("```json", "").replace("```", "").strip()
+        return json.loads(clean_json)
+
+    @staticmethod
+    def _is_valid_analysis(analysis) -> bool:
+        if not isinstance(analysis, dict): return False
+        if analysis.get('decision') not in ("BUY", "WAIT", "NEUTRAL"): return False
+        try:
+            int(analysis.get('score'))
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def get_sentiment_analysis(self, symbol: str, asset_name: str = "", is_crypto: bool = True, is_merval: bool = False) -> dict:
+        """
+        Noticias -> Cache (huella de titulares) -> Gemini.
+        """
+        search_term, top_news = self.fetch_headlines(symbol, asset_name, is_crypto, is_merval)
+        return self._analyze_headlines(symbol, asset_name, is_crypto, is_merval, search_term, top_news)
+
+    def _analyze_headlines(self, symbol: str, asset_name: str, is_crypto: bool, is_merval: bool, search_term: str, top_news: List[str]) -> dict:
+        if not top_news:
+            return {"score": 50, "decision": "NEUTRAL", "reason": f"Sin noticias para {search_term}"}
+
+        # Si los titulares son los mismos que la última vez, no gastamos IA
+        market = self.market_flavor(is_crypto, is_merval)
+        headlines_hash = SentimentCache.fingerprint(top_news)
+        cached = self.cache.get(symbol, market, headlines_hash)
+        if cached:
+            print(f"   ♻️ Cache IA {symbol}: {cached.get('decision')}")
+            return cached
+
+        analysis = self._ask_single(symbol, asset_name, is_crypto, is_merval, top_news)
+        if analysis.get('decision') != "ERROR":
+            self.cache.put(symbol, market, headlines_hash, analysis)
+        return analysis
+
+    # JSON Schema de la respuesta (modo estructurado): Gemini ya no puede devolver otra cosa
+    ANALYSIS_SCHEMA = {
+        "type": "OBJECT",
+        "properties": {
+            "score": {"type": "INTEGER"},
+            "decision": {"type": "STRING", "enum": ["BUY", "WAIT", "NEUTRAL"]},
+            "reason": {"type": "STRING"},
+        },
+        "required": ["score", "decision", "reason"],
+    }
+    BATCH_SCHEMA = {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {"id": {"type": "INTEGER"}, "ticker": {"type": "STRING"}, **ANALYSIS_SCHEMA["properties"]},
+            "required": ["id", "ticker", "score", "decision", "reason"],
+        },
+    }
+    # Consigna compacta: el formato lo fija el schema, el prompt solo lleva el criterio
+    COMPACT_TASK = ("Rate news sentiment using ONLY headlines relevant to {target} (ignore namesakes, "
+                    "e.g. Dash crypto vs DoorDash; weigh FUD, hype, fundamentals and local macro/regulation). "
+                    "score: 0=panic, 50=neutral/irrelevant, 100=greed. reason: brief, in Spanish; "
+                    "say so if the news are irrelevant.")
+
+    def _generate(self, prompt: str, schema: dict, market: str, assets: int):
+        """
+        Llamada a Gemini + parseo, midiendo latencia y tokens (ai_usage y el ciclo en curso).
+        Con AI_STRUCTURED_OUTPUT la respuesta viene forzada a 'schema' (JSON puro).
+        """
+        kwargs = {}
+        if AI_STRUCTURED_OUTPUT:
+            kwargs["generation_config"] = {"response_mime_type": "application/json", "response_schema": schema}
+        usage, ok = None, False
+        start = time.perf_counter()
+        try:
+            response = self.model.generate_content(prompt, **kwargs)
+            usage = getattr(response, "usage_metadata", None)
+            parsed = self._parse_json(response.text)
+            ok = True
+            return parsed
+        finally:
+            ai_usage.record(market, time.perf_counter() - start,
+                            getattr(usage, "prompt_token_count", 0) or 0,
+                            getattr(usage, "candidates_token_count", 0) or 0,
+                            assets, ok, self.usage)
+
+    def _ask_single(self, symbol: str, asset_name: str, is_crypto: bool, is_merval: bool, top_news: List[str]) -> dict:
+        """Una llamada a Gemini para UN activo (modo clásico)."""
+        # 3. PROMPT CONTEXTUALIZADO (Ajustamos el rol de la IA)
+        news_text = "\n".join(top_news)
+        role, asset_type = self._role(is_crypto, is_merval)
         
-        prompt = f"""
+        if AI_STRUCTURED_OUTPUT:
+            prompt = (f"Role: {role}.\nTicker: {symbol} | Asset: {asset_name or symbol} ({asset_type})\n"
+                      f"Headlines:\n{news_text}\n{self.COMPACT_TASK.format(target='this asset')}")
+        else:
+            prompt = f"""
         Role: {role}.
         Asset: {asset_name if asset_name else symbol} ({asset_type}).
         Ticker: {symbol}
@@ -92,35 +392,423 @@ class NewsIntel:
         """
 
         try:
-            response = self.model.generate_content(prompt)
-            clean_json = response.text.replace("```json", "").replace("```", "").strip()
-            import json
-            analysis = json.loads(clean_json)
-            return analysis
+            return self._generate(prompt, self.ANALYSIS_SCHEMA, self.market_flavor(is_crypto, is_merval), 1)
         except Exception as e:
             print(f"❌ Error IA: {e}")
             return {"score": 50, "decision": "ERROR", "reason": "Fallo en IA"}
 
+    def _ask_batch(self, items: List[dict], is_crypto: bool, is_merval: bool) -> dict:
+        """
+        Una sola llamada a Gemini para VARIOS activos del mismo mercado.
+        items: [{'symbol', 'name', 'top_news'}]. Devuelve {posición: análisis} solo con las respuestas válidas.
+        """
+        role, asset_type = self._role(is_crypto, is_merval)
+        bloques = []
+        for idx, item in enumerate(items, start=1):
+            news_text = "\n".join(item['top_news'])
+            bloques.append(f"[{idx}] Ticker: {item['symbol']} | Asset: {item['name'] or item['symbol']} ({asset_type})\n{news_text}")
+        assets_text = "\n\n".join(bloques)
+
+        if AI_STRUCTURED_OUTPUT:
+            prompt = (f"Role: {role}.\n{assets_text}\n\n"
+                      f"For EACH asset independently (id = its [number]): "
+                      f"{self.COMPACT_TASK.format(target='THAT asset')}")
+        else:
+            prompt = f"""
+        Role: {role}.
+
+        Assets and Recent Headlines:
+        {assets_text}
+
+        Task (for EACH asset independently):
+        1. Analyze sentiment considering local economic context (inflation, regulations).
+        2. Filter out irrelevant news (e.g., if analyzing 'Dash' crypto, ignore 'DoorDash' stocks).
+        3. Identify FUD, Hype, or Fundamentals.
+        4. Analyze the sentiment ONLY based on relevant news of THAT asset.
+
+        Response format (JSON array only, one object per asset):
+        [
+            {{
+                "id": (the [number] of the asset),
+                "ticker": "TICKER",
+                "score": (integer 0-100, 0=Panic, 50=Neutral/Irrelevant, 100=Greed),
+                "decision": ("BUY", "WAIT", "NEUTRAL"),
+                "reason": "Brief explanation in Spanish. If news are irrelevant, state it."
+            }}
+        ]
+        """
+
+        try:
+            parsed = self._generate(prompt, self.BATCH_SCHEMA, self.market_flavor(is_crypto, is_merval), len(items))
+        except Exception as e:
+            print(f"⚠️ Batch IA malformado ({len(items)} activos): {e}")
+            return {}
+        if not isinstance(parsed, list): return {}
+
+        por_ticker = {item['symbol'].upper(): pos for pos, item in enumerate(items)}
+        resultados = {}
+        for entry in parsed:
+            if not self._is_valid_analysis(entry): continue
+            # Preferimos el id; si falta o no cuadra, usamos el ticker
+            pos = None
+            try:
+                pos = int(entry.get('id')) - 1
+            except (TypeError, ValueError):
+                pass
+            if pos is None or not (0 <= pos < len(items)) or str(entry.get('ticker', items[pos]['symbol'])).upper() != items[pos]['symbol'].upper():
+                pos = por_ticker.get(str(entry.get('ticker', '')).upper())
+            if pos is None or pos in resultados: continue
+            resultados[pos] = {"score": int(entry['score']), "decision": entry['decision'], "reason": entry.get('reason', '')}
+        return resultados
+
+    def analyze_batch(self, opportunities: List[dict], is_crypto: bool = True, is_merval: bool = False, batch_size: int = AI_BATCH_SIZE, max_workers: int = AI_MAX_WORKERS, on_progress=None, is_cancelled=None) -> List[dict]:
+        """
+        Modo Batch: noticias en paralelo, luego N activos por llamada a Gemini.
+        Si la respuesta de un batch viene rota (o le falta algún activo), esos activos se analizan uno por uno.
+        Devuelve los análisis en el MISMO orden que 'opportunities' (None = cancelado, ver analyze_opportunities).
+        """
+        if not opportunities: return []
+        market = self.market_flavor(is_crypto, is_merval)
+        workers = max(1, min(max_workers, len(opportunities)))
+        notify = on_progress or (lambda index, status, analysis=None: None)
+        cancelled = is_cancelled or (lambda: False)
+
+        def buscar(indexed):
+            i, op = indexed
+            if cancelled():
+                return None
+            notify(i, "analyzing")
+            try:
+                return self.fetch_headlines(op['symbol'], op['name'], is_crypto, is_merval)
+            except Exception as e:
+                print(f"❌ Error Noticias ({op.get('symbol')}): {e}")
+                return op['symbol'], []
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="news-ai") as executor:
+            # 1. Noticias de todos los candidatos
+            headlines = list(executor.map(buscar, enumerate(opportunities)))
+
+            # 2. Sin noticias o en cache -> no entran al batch
+            results = [None] * len(opportunities)
+            pending = []
+            for i, (op, found) in enumerate(zip(opportunities, headlines)):
+                if found is None:
+                    notify(i, "cancelled")
+                    continue
+                search_term, top_news = found
+                if not top_news:
+                    results[i] = {"score": 50, "decision": "NEUTRAL", "reason": f"Sin noticias para {search_term}"}
+                    notify(i, "done", results[i])
+                    continue
+                headlines_hash = SentimentCache.fingerprint(top_news)
+                cached = self.cache.get(op['symbol'], market, headlines_hash)
+                if cached:
+                    results[i] = cached
+                    notify(i, "done", cached)
+                else:
+                    pending.append({"index": i, "symbol": op['symbol'], "name": op['name'], "top_news": top_news, "hash": headlines_hash})
+
+            # 3. Batches a Gemini (también en paralelo entre sí)
+            chunks = [pending[k:k + batch_size] for k in range(0, len(pending), batch_size)]
+            print(f"📦 [IA] Batch {market}: {len(pending)} activos en {len(chunks)} llamadas ({len(opportunities) - len(pending)} resueltos sin IA)")
+
+            def procesar_chunk(chunk):
+                if cancelled():
+                    for item in chunk:
+                        notify(item['index'], "cancelled")
+                    return
+                respuestas = self._ask_batch(chunk, is_crypto, is_merval)
+                for pos, item in enumerate(chunk):
+                    analysis = respuestas.get(pos)
+                    if analysis is None:
+                        # Fallback: llamada individual para este activo
+                        print(f"   ↩️ Fallback individual: {item['symbol']}")
+                        analysis = self._ask_single(item['symbol'], item['name'], is_crypto, is_merval, item['top_news'])
+                    if analysis.get('decision') != "ERROR":
+                        self.cache.put(item['symbol'], market, item['hash'], analysis)
+                    results[item['index']] = analysis
+                    notify(item['index'], "error" if analysis.get('decision') == "ERROR" else "done", analysis)
+
+            list(executor.map(procesar_chunk, chunks))
+
+        return results
+
+    def analyze_opportunities(self, opportunities: List[dict], is_crypto: bool = True, is_merval: bool = False, max_workers: int = AI_MAX_WORKERS, on_progress=None, is_cancelled=None) -> List[dict]:
+        """
+        Etapa IA concurrente: noticias + Gemini para todos los candidatos en paralelo.
+        Con AI_BATCH_SIZE > 1 se agrupan varios activos por llamada (ver analyze_batch).
+        Devuelve los análisis en el MISMO orden que 'opportunities'.
+        Hooks opcionales (jobs de fondo, ver AnalysisJobs.py):
+          - on_progress(index, status, analysis=None): status = analyzing / done / error / cancelled.
+          - is_cancelled(): si devuelve True, los candidatos que todavía no arrancaron quedan en None.
+        """
+        if not opportunities: return []
+        # Tokens y latencia de la IA de este ciclo (queda en self.last_usage y en ai_usage)
+        self.usage = ai_usage.start_cycle(self.market_flavor(is_crypto, is_merval))
+        try:
+            if AI_BATCH_SIZE > 1:
+                return self.analyze_batch(opportunities, is_crypto=is_crypto, is_merval=is_merval, max_workers=max_workers,
+                                          on_progress=on_progress, is_cancelled=is_cancelled)
+            return self._analyze_one_by_one(opportunities, is_crypto, is_merval, max_workers, on_progress, is_cancelled)
+        finally:
+            self.last_usage = ai_usage.finish_cycle(self.usage)
+            self.usage = None
+            print(f"   📊 [IA] {self.last_usage['calls']} llamadas, {self.last_usage['total_tokens']} tokens, "
+                  f"p50 {self.last_usage['latency_p50']:.2f}s")
+
+    def _analyze_one_by_one(self, opportunities: List[dict], is_crypto: bool, is_merval: bool, max_workers: int, on_progress=None, is_cancelled=None) -> List[dict]:
+        """Modo clásico (AI_BATCH_SIZE = 1): noticias + Gemini por activo, en paralelo."""
+        notify = on_progress or (lambda index, status, analysis=None: None)
+        cancelled = is_cancelled or (lambda: False)
+
+        def analizar(indexed):
+            i, op = indexed
+            if cancelled():
+                notify(i, "cancelled")
+                return None
+            notify(i, "analyzing")
+            try:
+                analysis = self.get_sentiment_analysis(
+                    symbol=op['symbol'],
+                    asset_name=op['name'],
+                    is_crypto=is_crypto,
+                    is_merval=is_merval
+                )
+            except Exception as e:
+                print(f"❌ Error IA ({op.get('symbol')}): {e}")
+                analysis = {"score": 50, "decision": "NEUTRAL", "reason": "Error IA"}
+            notify(i, "error" if analysis.get('decision') == "ERROR" else "done", analysis)
+            return analysis
+
+        workers = max(1, min(max_workers, len(opportunities)))
+        print(f"⚡ [IA] Analizando {len(opportunities)} activos con {workers} workers...")
+        # executor.map conserva el orden de entrada
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="news-ai") as executor:
+            return list(executor.map(analizar, enumerate(opportunities)))
+
 # --- CLASE NOTIFICADOR ---
 class Notifier:
-    """Encargada de enviar alertas a Telegram."""
+    """Encargada de enviar alertas a Telegram (vía la cola de fondo, ver TelegramOutbox.py)."""
     
     @staticmethod
     def send_telegram_alert(message: str):
+        """Encola el aviso y vuelve enseguida: el envío, el rate limit y los reintentos son del sender de fondo."""
         if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
             print("⚠️ Faltan credenciales de Telegram en config.py")
             return
+        telegram_outbox.enqueue(message, TELEGRAM_CHAT_ID)
 
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": TELEGRAM_CHAT_ID,
-            "text": message,
-            "parse_mode": "Markdown"
+# --- CACHE COMPARTIDA DE PRECIOS ---
+class PriceCache:
+    """
+    Cache en memoria de precios para todo el proceso.
+    - TTL por clase de activo (crypto se mueve más rápido que stocks).
+    - Cada llamador puede exigir un max_age más estricto (trades vs dashboards).
+    - Single-flight: pedidos concurrentes del mismo símbolo comparten UNA consulta a la red.
+    """
+    def __init__(self, ttl_by_class: dict = None):
+        self.ttl_by_class = ttl_by_class or PRICE_CACHE_TTL_SECONDS
+        self._entries = {}   # symbol -> {price, source, fetched_at, ts}
+        self._inflight = {}  # symbol -> Future
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def asset_class(symbol: str) -> str:
+        return "stock" if symbol in WATCHLIST_STOCKS or symbol in WATCHLIST_MERVAL else "crypto"
+
+    def _max_age(self, symbol: str, max_age: float = None) -> float:
+        ttl = self.ttl_by_class.get(self.asset_class(symbol), 60)
+        return ttl if max_age is None else min(ttl, max_age)
+
+    def _quote(self, symbol: str, entry: dict) -> dict:
+        return {
+            "symbol": symbol,
+            "price": entry['price'],
+            "source": entry['source'],
+            "fetched_at": entry['fetched_at'],
+            "age_seconds": round(time.monotonic() - entry['ts'], 3)
         }
+
+    def _fresh(self, symbol: str, max_age: float = None):
+        entry = self._entries.get(symbol)
+        if entry and time.monotonic() - entry['ts'] <= self._max_age(symbol, max_age):
+            return self._quote(symbol, entry)
+        return None
+
+    def _store(self, symbol: str, price: float, source: str) -> dict:
+        entry = {"price": price, "source": source, "fetched_at": datetime.utcnow(), "ts": time.monotonic()}
+        # Los fallos (precio 0) no se cachean, así el próximo pedido vuelve a intentar
+        if price and price > 0:
+            with self._lock:
+                self._entries[symbol] = entry
+        return self._quote(symbol, entry)
+
+    def get_or_fetch(self, symbol: str, fetcher, max_age: float = None) -> dict:
+        """fetcher(symbol) -> (precio, fuente)"""
+        with self._lock:
+            quote = self._fresh(symbol, max_age)
+            if quote: return quote
+            future = self._inflight.get(symbol)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[symbol] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            price, source = fetcher(symbol)
+            quote = self._store(symbol, price, source)
+            future.set_result(quote)
+            return quote
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(symbol, None)
+
+    def get_many_or_fetch(self, symbols: List[str], bulk_fetcher, max_age: float = None) -> dict:
+        """bulk_fetcher(symbols) -> {symbol: (precio, fuente)}. Solo recibe los símbolos vencidos."""
+        quotes, waiting, owned = {}, {}, {}
+        with self._lock:
+            for symbol in symbols:
+                quote = self._fresh(symbol, max_age)
+                if quote:
+                    quotes[symbol] = quote
+                elif symbol in self._inflight:
+                    waiting[symbol] = self._inflight[symbol]
+                else:
+                    owned[symbol] = self._inflight[symbol] = Future()
+
+        if owned:
+            try:
+                fetched = bulk_fetcher(list(owned))
+                for symbol, future in owned.items():
+                    price, source = fetched.get(symbol, (0.0, None))
+                    quotes[symbol] = self._store(symbol, price, source)
+                    future.set_result(quotes[symbol])
+            except Exception as e:
+                for future in owned.values():
+                    if not future.done(): future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    for symbol in owned:
+                        self._inflight.pop(symbol, None)
+
+        for symbol, future in waiting.items():
+            quotes[symbol] = future.result()
+
+        return {symbol: quotes[symbol] for symbol in symbols}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "ttl_seconds": dict(self.ttl_by_class)
+            }
+
+# Instancia compartida por todo el proceso (trades, portafolio, dashboard)
+price_cache = PriceCache()
+
+# --- CACHE DE ESCANEOS POR MERCADO ---
+class ScanSnapshotCache:
+    """
+    Último escaneo procesado de cada perfil de mercado (CRYPTO / USA / MERVAL), en memoria.
+    - Ventana de frescura: dentro de SCAN_CACHE_SECONDS otro threshold se sirve filtrando el mismo DataFrame.
+    - El escaneo viene ordenado por caída y sin cortar por threshold (solo por el tope 'max_change'):
+      las filas <= cualquier threshold más estricto son un prefijo, así que el resultado es el mismo
+      que con un escaneo propio.
+    - Single-flight: misses concurrentes del mismo mercado comparten UN escaneo.
+    """
+    def __init__(self, ttl_seconds: float = SCAN_CACHE_SECONDS, max_change: float = SCAN_CACHE_MAX_CHANGE):
+        self.ttl_seconds = ttl_seconds
+        self.max_change = max_change
+        self._entries = {}   # market -> {snapshot, max_change, fetched_at, ts}
+        self._inflight = {}  # market -> (max_change, Future)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _fresh(self, market: str, threshold: float):
+        entry = self._entries.get(market)
+        if entry and time.monotonic() - entry['ts'] <= self.ttl_seconds and threshold <= entry['max_change']:
+            return entry['snapshot']
+        return None
+
+    def get_or_scan(self, market: str, threshold: float, scanner) -> dict:
+        """
+        scanner(max_change) -> snapshot {df, col_change, min_vol} (escaneo + técnicos).
+        El snapshot es compartido: quien lo use filtra y no lo modifica.
+        """
+        max_change = max(threshold, self.max_change)
+        with self._lock:
+            snapshot = self._fresh(market, threshold)
+            if snapshot is not None:
+                self.hits += 1
+                return snapshot
+            inflight = self._inflight.get(market)
+            leader = inflight is None
+            if leader:
+                future = Future()
+                self._inflight[market] = (max_change, future)
+                self.misses += 1
+            elif threshold <= inflight[0]:
+                future = inflight[1]
+                self.coalesced += 1
+            else:
+                # Hay un escaneo en vuelo pero con un tope más bajo: no nos sirve, escaneamos aparte
+                self.misses += 1
+                future = None
+
+        if future is None:
+            return scanner(max_change)
+        if not leader:
+            return future.result()
+
         try:
-            requests.post(url, json=payload, timeout=5)
+            snapshot = scanner(max_change)
+            # Un escaneo vacío (fallo o mercado sin datos) no se cachea: el próximo pedido reintenta
+            if not snapshot['df'].empty:
+                with self._lock:
+                    self._entries[market] = {"snapshot": snapshot, "max_change": max_change,
+                                             "fetched_at": datetime.utcnow(), "ts": time.monotonic()}
+            future.set_result(snapshot)
+            return snapshot
         except Exception as e:
-            print(f"Error enviando Telegram: {e}")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(market, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.coalesced + self.misses
+            now = time.monotonic()
+            return {
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+                "ttl_seconds": self.ttl_seconds,
+                "inflight": len(self._inflight),
+                "markets": {market: {"rows": len(entry['snapshot']['df']), "max_change": entry['max_change'],
+                                     "fetched_at": entry['fetched_at'],
+                                     "age_seconds": round(now - entry['ts'], 1)}
+                            for market, entry in self._entries.items()}
+            }
+
+# Instancia compartida por todo el proceso (endpoints manuales, jobs y ciclo automático)
+scan_cache = ScanSnapshotCache()
 
 # --- CLASE ANALISTA DE MERCADO ---
 class MarketAnalyzer:
@@ -137,9 +825,11 @@ class MarketAnalyzer:
 
     # --- 3. SCANNER DE CRYPTO COINS (NUEVO) ---
     # --- 3. SCANNER DE CRYPTO COINS (Lógica de tradingview.py) ---
-    def scan_coin_market(self, limit=300):
+    def scan_coin_market(self, limit=300, max_change=None, max_rank=None, sort_by="crypto_total_rank", sort_order="asc"):
         """
         Escanea el mercado Cripto. (Listas definidas internamente para evitar NameErrors).
+        max_change / max_rank: filtros que se resuelven en el servidor de TradingView
+        (solo viajan las filas que nos interesan).
         """
         # 1. Definimos las listas AQUÍ DENTRO para que la función sea autónoma
         local_lists = [
@@ -162,13 +852,22 @@ class MarketAnalyzer:
             "ignore_unknown_fields": False, 
             "options": {"lang": "es"},
             "range": [0, limit], 
-            "sort": {"sortBy": "crypto_total_rank", "sortOrder": "asc"},
+            "sort": {"sortBy": sort_by, "sortOrder": sort_order},
             "symbols": {}, 
             "markets": ["coin"]
         }
+
+        # Filtros del lado del servidor
+        filtros = []
+        if max_change is not None:
+            filtros.append({"left": "24h_close_change|5", "operation": "eless", "right": max_change})
+        if max_rank is not None:
+            filtros.append({"left": "crypto_total_rank", "operation": "eless", "right": max_rank})
+        if filtros:
+            payload["filter"] = filtros
         
         try:
-            r = requests.post(TV_COIN_URL, headers=TV_HEADERS, cookies=TV_COOKIES, json=payload, timeout=10)
+            r = http_post(TV_COIN_URL, headers=TV_HEADERS, cookies=TV_COOKIES, json=payload, timeout=10)
             
             if r.status_code == 200:
                 json_data = r.json()
@@ -211,28 +910,18 @@ class MarketAnalyzer:
         if "change" in df.columns:
             df["change"] = pd.to_numeric(df["change"], errors='coerce').fillna(0.0)
 
-        # 2. Detectar Patrones de Velas
-        candle_cols = [c for c in df.columns if "Candle." in c]
-        
-        def detectar(row):
-            patrones = []
-            for col in candle_cols:
-                if pd.notna(row[col]) and row[col] == 1:
-                    nombre = col.replace("Candle.", "").replace(".", " ")
-                    patrones.append(nombre)
-            return ", ".join(patrones) if patrones else None # Retorna None si no hay, para limpieza
-
-        if candle_cols:
-            df['Patrones_Hoy'] = df.apply(detectar, axis=1)
-        else:
-            df['Patrones_Hoy'] = None
+        # 2. Detectar Patrones de Velas (vectorizado, ver CandlePatterns.py)
+        add_pattern_columns(df)
 
         return df
     # --- MÉTODOS DE BÚSQUEDA ---
 
     # --- 1. MOTOR DE TRADINGVIEW (CORE) ---
-    def scan_tradingview(self, markets=None, limit=500):
-        """Obtiene el DataFrame crudo de TradingView (Precios + Técnicos)."""
+    def scan_tradingview(self, markets=None, limit=500, max_change=None, min_volume=None, min_market_cap=None, sort_by="market_cap_basic", sort_order="desc"):
+        """
+        Obtiene el DataFrame crudo de TradingView (Precios + Técnicos).
+        max_change / min_volume / min_market_cap se agregan al filter2 (filtrado en el servidor).
+        """
         url = 'https://scanner.tradingview.com/global/scan'
         target_markets = markets if markets else ["america", "argentina", "brazil", "mexico"]
         
@@ -241,7 +930,7 @@ class MarketAnalyzer:
             "ignore_unknown_fields": False,
             "options": {"lang": "es"},
             "range": [0, limit],
-            "sort": {"sortBy": "market_cap_basic", "sortOrder": "desc"},
+            "sort": {"sortBy": sort_by, "sortOrder": sort_order},
             "symbols": {},
             "markets": target_markets,
             "filter2": {
@@ -262,15 +951,18 @@ class MarketAnalyzer:
             }
         }
 
+        # Predicados de la estrategia (caída, volumen, tamaño) -> filtrado en el servidor
+        operands = payload["filter2"]["operands"]
+        if max_change is not None:
+            operands.append({"expression": {"left": "change", "operation": "eless", "right": max_change}})
+        if min_volume:
+            operands.append({"expression": {"left": "volume", "operation": "greater", "right": min_volume}})
+        if min_market_cap:
+            operands.append({"expression": {"left": "market_cap_basic", "operation": "egreater", "right": min_market_cap}})
+
         try:
-            response = requests.post(url, headers=TV_HEADERS, cookies=TV_COOKIES, json=payload, timeout=10)
-            if response.status_code == 200:
-                json_data = response.json()
-                if 'data' in json_data:
-                    df = pd.DataFrame([d['d'] for d in json_data['data']])
-                    if len(df.columns) == len(TV_COLUMNS):
-                        df.columns = TV_COLUMNS
-                    return df
+            # Escaneos grandes o multi-mercado se piden en fragmentos paralelos (ver TVScanner.py)
+            return sharded_scan(url, payload, TV_COLUMNS, headers=TV_HEADERS, cookies=TV_COOKIES, timeout=10)
         except Exception as e:
             print(f"❌ Error Scanner TradingView: {e}")
         return pd.DataFrame()
@@ -283,60 +975,59 @@ class MarketAnalyzer:
         """
         if df_completo.empty: return pd.DataFrame()
 
-        # Lista 3 (Técnicos) + Contexto
-        columnas_deseadas = TV_RAW_LISTS[2] + ['close', 'change', 'volume', 'description']
+        # Lista 3 (Técnicos) + Contexto (market_cap_basic: _dedupe_by_name lo usa para quedarse con el listado principal)
+        columnas_deseadas = TV_RAW_LISTS[2] + ['close', 'change', 'volume', 'description', 'market_cap_basic']
         cols_existentes = list(set(c for c in columnas_deseadas if c in df_completo.columns))
         df_tech = df_completo[cols_existentes].copy()
 
-        # Detectar Patrones de Velas
-        candle_cols = [c for c in df_tech.columns if "Candle." in c]
-        
-        def detectar(row):
-            encontrados = []
-            for col in candle_cols:
-                if pd.notna(row[col]) and row[col] == 1:
-                    nombre = col.replace("Candle.", "").replace(".", " ")
-                    encontrados.append(nombre)
-            return ", ".join(encontrados) if encontrados else None
-
-        if candle_cols:
-            df_tech['Patrones_Hoy'] = df_tech.apply(detectar, axis=1)
-        else:
-            df_tech['Patrones_Hoy'] = None
+        # Detectar Patrones de Velas (vectorizado, ver CandlePatterns.py)
+        add_pattern_columns(df_tech)
             
         return df_tech
     
     
     
 
-    def get_current_price(self, symbol: str) -> float:
+    def get_current_price(self, symbol: str, max_age: float = None) -> float:
+        """
+        Precio actual (pasando por la cache compartida de precios).
+        max_age: antigüedad máxima aceptada en segundos (ej: trades piden precios más frescos).
+        """
+        return self.get_price_quote(symbol, max_age=max_age)['price']
+
+    def get_price_quote(self, symbol: str, max_age: float = None) -> dict:
+        """Como get_current_price, pero devuelve {symbol, price, source, fetched_at, age_seconds}."""
+        return price_cache.get_or_fetch(symbol.upper(), self._fetch_price, max_age=max_age)
+
+    def _fetch_price(self, symbol: str):
         """
-        Intenta obtener el precio de 3 fuentes en orden:
+        Intenta obtener el precio de 3 fuentes en orden (devuelve (precio, fuente)):
         1. Yahoo Finance (Stocks/Cripto)
         2. Binance (Cripto API Pública)
         3. CoinMarketCap (Tu API Key - Último recurso)
         """
-        # --- A. INTENTO YAHOO FINANCE ---
-        try:
-            ticker_str = symbol if symbol in WATCHLIST_STOCKS or symbol in WATCHLIST_MERVAL else f"{symbol}-USD"
-            ticker = yf.Ticker(ticker_str)
-            hist = ticker.history(period="1d")
-            if not hist.empty:
-                return hist['Close'].iloc[-1]
-        except Exception:
-            pass # Falló Yahoo, seguimos...
+        # --- A. INTENTO YAHOO FINANCE --- (yfinance no pasa por el stand-in: en replay se saltea)
+        if UPSTREAM_MODE != "replay":
+            try:
+                ticker_str = symbol if symbol in WATCHLIST_STOCKS or symbol in WATCHLIST_MERVAL else f"{symbol}-USD"
+                ticker = yf.Ticker(ticker_str)
+                hist = ticker.history(period="1d")
+                if not hist.empty:
+                    return float(hist['Close'].iloc[-1]), "yahoo"
+            except Exception:
+                pass # Falló Yahoo, seguimos...
 
         # --- B. INTENTO BINANCE (Solo Criptos) ---
         if symbol not in WATCHLIST_STOCKS or symbol not in WATCHLIST_MERVAL:
             try:
                 # Binance usa pares sin guion, ej: BTCUSDT
                 url = f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}USDT"
-                r = requests.get(url, timeout=3)
+                r = http_get(url, timeout=3)
                 if r.status_code == 200:
                     data = r.json()
                     price = float(data['price'])
                     print(f"✅ Precio {symbol} obtenido de Binance: {price}")
-                    return price
+                    return price, "binance"
             except Exception:
                 pass # Falló Binance, seguimos...
 
@@ -344,16 +1035,114 @@ class MarketAnalyzer:
         try:
             url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
             params = {'symbol': symbol, 'convert': 'USD'}
-            r = requests.get(url, headers=self.cmc_headers, params=params, timeout=5)
+            r = http_get(url, headers=self.cmc_headers, params=params, timeout=5)
             if r.status_code == 200:
                 data = r.json()
                 price = data['data'][symbol]['quote']['USD']['price']
                 print(f"✅ Precio {symbol} obtenido de CoinMarketCap: {price}")
-                return price
+                return float(price), "cmc"
         except Exception as e:
             print(f"❌ Fallaron todas las fuentes para {symbol}: {e}")
         
-        return 0.0
+        return 0.0, None
+
+    # --- PRECIOS EN LOTE (PORTAFOLIO) ---
+    def _yahoo_ticker(self, symbol: str) -> str:
+        return symbol if symbol in WATCHLIST_STOCKS or symbol in WATCHLIST_MERVAL else f"{symbol}-USD"
+
+    def get_current_prices(self, symbols: List[str], max_age: float = None) -> dict:
+        """
+        Versión en lote de get_current_price (con cache compartida).
+        Devuelve {symbol: precio} (0.0 si ninguna fuente lo tiene).
+        """
+        return {symbol: quote['price'] for symbol, quote in self.get_price_quotes(symbols, max_age=max_age).items()}
+
+    def get_price_quotes(self, symbols: List[str], max_age: float = None) -> dict:
+        """Devuelve {symbol: quote}; solo se consultan a la red los símbolos vencidos en cache."""
+        unique = list(dict.fromkeys(s.upper() for s in symbols if s))
+        return price_cache.get_many_or_fetch(unique, self._fetch_prices, max_age=max_age)
+
+    def _fetch_prices(self, symbols: List[str]) -> dict:
+        """
+        Misma cascada que _fetch_price, pero UNA llamada por proveedor.
+        1. Yahoo: un solo download multi-ticker.
+        2. Binance: un solo ticker/price con todos los pares.
+        3. CoinMarketCap: un quotes/latest separado por comas, solo con los que faltan.
+        Devuelve {symbol: (precio, fuente)}.
+        """
+        unique = list(dict.fromkeys(s.upper() for s in symbols if s))
+        prices = {}
+        if not unique: return prices
+
+        # --- A. YAHOO FINANCE (Un solo download) ---
+        tickers = {self._yahoo_ticker(s): s for s in unique}
+        try:
+            # yfinance no pasa por el stand-in: en replay los precios salen de Binance / CMC
+            data = yf.download(list(tickers), period="1d", progress=False, threads=True, auto_adjust=False) \
+                if UPSTREAM_MODE != "replay" else pd.DataFrame()
+            if not data.empty:
+                close = data['Close']
+                if isinstance(close, pd.Series):
+                    close = close.to_frame(name=next(iter(tickers)))
+                last = close.ffill().iloc[-1]
+                for ticker, symbol in tickers.items():
+                    value = last.get(ticker)
+                    if value is not None and pd.notna(value) and value > 0:
+                        prices[symbol] = (float(value), "yahoo")
+        except Exception as e:
+            print(f"⚠️ Yahoo (lote) falló: {e}")
+
+        # --- B. BINANCE (Todos los pares en una llamada) ---
+        missing = [s for s in unique if s not in prices]
+        if missing:
+            try:
+                r = http_get("https://api.binance.com/api/v3/ticker/price", timeout=5)
+                if r.status_code == 200:
+                    book = {item['symbol']: item['price'] for item in r.json()}
+                    for symbol in missing:
+                        pair = f"{symbol}USDT"
+                        if pair in book:
+                            prices[symbol] = (float(book[pair]), "binance")
+                            print(f"✅ Precio {symbol} obtenido de Binance: {book[pair]}")
+            except Exception as e:
+                print(f"⚠️ Binance (lote) falló: {e}")
+
+        # --- C. COINMARKETCAP (Solo los que siguen faltando) ---
+        missing = [s for s in unique if s not in prices]
+        if missing:
+            prices.update({sym: (price, "cmc") for sym, price in self._get_cmc_prices(missing).items()})
+
+        for symbol in unique:
+            if symbol not in prices:
+                print(f"❌ Fallaron todas las fuentes para {symbol}")
+                prices[symbol] = (0.0, None)
+        return prices
+
+    def _get_cmc_prices(self, symbols: List[str], retry: bool = True) -> dict:
+        """quotes/latest con varios símbolos. Si CMC rechaza alguno, reintenta una vez sin ellos."""
+        url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+        params = {'symbol': ",".join(symbols), 'convert': 'USD'}
+        found = {}
+        try:
+            r = http_get(url, headers=self.cmc_headers, params=params, timeout=5)
+            if r.status_code == 200:
+                data = r.json().get('data', {})
+                for symbol in symbols:
+                    quote = data.get(symbol)
+                    if isinstance(quote, list): quote = quote[0] if quote else None
+                    if quote:
+                        found[symbol] = float(quote['quote']['USD']['price'])
+                        print(f"✅ Precio {symbol} obtenido de CoinMarketCap: {found[symbol]}")
+            elif r.status_code == 400 and retry:
+                # Ej: 'Invalid value for "symbol": "AAPL,MELI"'
+                message = r.json().get('status', {}).get('error_message', '')
+                invalid = set(re.findall(r'[A-Z0-9]+', message.split(':')[-1])) if ':' in message else set()
+                valid = [s for s in symbols if s not in invalid]
+                if invalid and valid and len(valid) < len(symbols):
+                    return self._get_cmc_prices(valid, retry=False)
+        except Exception as e:
+            print(f"⚠️ CoinMarketCap (lote) falló: {e}")
+        return found
 
     # --- MÉTODO EN CASCADA (FIX PARA COMPRAS) ---
     # def get_current_price(self, symbol: str) -> float:
@@ -409,19 +1198,22 @@ class MarketAnalyzer:
     #     return 0.0
 
     def _calculate_rsi(self, series: pd.Series, period: int = 14) -> float:
+        """
+        RSI de una sola serie. Para muchos símbolos usar Indicators.IndicatorEngine (en lote).
+        RMA de Wilder con semilla = promedio simple de las primeras 'period' variaciones
+        (como TradingView); la versión anterior usaba ewm(adjust=False) desde la primera
+        variación, así que los valores cambian levemente (ej: 41.92 -> 42.19).
+        """
         if len(series) < period + 1: return 50.0
-        delta = series.diff()
-        gain = (delta.where(delta > 0, 0)).ewm(alpha=1/period, adjust=False).mean()
-        loss = (-delta.where(delta < 0, 0)).ewm(alpha=1/period, adjust=False).mean()
-        if float(loss.iloc[-1]) == 0: return 100.0
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return round(rsi.iloc[-1], 2)
+        close = series.to_frame()
+        engine, _ = IndicatorEngine.from_history(close, close, close, rsi_period=period)
+        rsi = engine.latest['RSI'][0]
+        return 50.0 if np.isnan(rsi) else round(float(rsi), 2)
 
     def get_market_sentiment(self):
         try:
             url = "https://api.alternative.me/fng/"
-            r = requests.get(url, timeout=3)
+            r = http_get(url, timeout=3)
             data = r.json()
             return data['data'][0] 
         except Exception:
@@ -431,106 +1223,198 @@ class MarketAnalyzer:
         if USE_MOCK_DATA: return self._get_mock_data()
         parameters = {'start': '1', 'limit': '100', 'convert': 'USD'}
         try:
-            response = requests.get(CMC_BASE_URL, headers=self.cmc_headers, params=parameters)
+            response = http_get(CMC_BASE_URL, headers=self.cmc_headers, params=parameters)
             response.raise_for_status()
             return response.json()['data']
         except Exception as e:
             print(f"Error CoinMarketCap: {e}")
             return []
 
+    def _persist_scan(self, df_raw: pd.DataFrame, market: str, kind: str = "raw"):
+        """
+        Snapshot columnar del escaneo crudo. Nunca rompe el ciclo si falla.
+        kind="raw": lo que devolvió el escaneo de oportunidades (ya filtrado por caída en el servidor).
+        kind="universe": el universo completo (snapshot_universe), fuente de BarStore.scanned_universe.
+        """
+        if not SNAPSHOT_ENABLED or df_raw is None or df_raw.empty: return
+        try:
+            path = save_snapshot(df_raw, market, kind=kind)
+            print(f"💾 Snapshot {market} ({kind}): {len(df_raw)} filas -> {path}")
+        except ImportError:
+            print("⚠️ Snapshots desactivados: falta instalar pyarrow")
+        except Exception as e:
+            print(f"⚠️ Error guardando snapshot {market}: {e}")
+
     def find_market_opportunities(self, market_type: str, threshold: float) -> List[dict]:
         """
         Escáner Universal: Sirve para Crypto, USA y Merval.
         market_type: 'CRYPTO', 'USA', 'MERVAL'
+        El escaneo (red + técnicos) sale de scan_cache si hay uno fresco del mismo mercado;
+        el threshold se aplica acá, filtrando.
         """
         print(f"📡 Escaneando {market_type} (Threshold: {threshold}%)...")
-        
+        snapshot = scan_cache.get_or_scan(market_type, threshold,
+                                          lambda max_change: self._scan_market(market_type, max_change))
+        df, col_change, min_vol = snapshot['df'], snapshot['col_change'], snapshot['min_vol']
+
+        if df.empty: return []
+
+        # 2. FILTRADO COMÚN
+        # Filtramos por caída y volumen (si aplica)
+        mask = (df[col_change] <= threshold)
+        if min_vol > 0 and 'volume' in df.columns:
+            mask = mask & (df['volume'] > min_vol)
+            
+        filtered = df[mask]
+
+        # 🔥 FILTRO ANTI-REPETIDOS 🔥
+        filtered = self._dedupe_by_name(filtered)
+
+        # 3. UNIFICACIÓN DE FORMATO (columnar, sin iterrows)
+        return self._build_opportunities(filtered, col_change, top_n=SCAN_TOP_N)
+
+    def _scan_market(self, market_type: str, max_change: float) -> dict:
+        """
+        Descarga + técnicos de un perfil de mercado (lo que guarda scan_cache).
+        max_change: tope de caída que se filtra en el servidor (el threshold fino lo aplica el llamador).
+        """
+        # Solo pedimos las filas que pueden terminar en el Top N (con margen para la deduplicación)
+        scan_limit = SCAN_TOP_N * SCAN_OVERFETCH
+
         # 1. ELEGIR FUENTE DE DATOS
+        # El filtro de caída/volumen y el orden por 'change' (asc) se resuelven en TradingView
         if market_type == 'CRYPTO':
-            df_raw = self.scan_coin_market(limit=300)
+            # Universo: Top 300 por ranking (igual que antes), pero solo viajan las que cayeron
+            df_raw = self.scan_coin_market(limit=scan_limit, max_change=max_change, max_rank=300,
+                                           sort_by="24h_close_change|5", sort_order="asc")
             df = self._process_crypto_technicals(df_raw)
             col_change = 'change' # En tu código crypto ya lo renombraste a 'change'
             min_vol = 0 # Opcional
         elif market_type == 'USA':
-            df_raw = self.scan_tradingview(markets=["america"], limit=800)
+            min_vol = 50000 # Filtro de volumen para USA
+            df_raw = self.scan_tradingview(markets=["america"], limit=scan_limit, max_change=max_change,
+                                           min_volume=min_vol, min_market_cap=USA_MIN_MARKET_CAP,
+                                           sort_by="change", sort_order="asc")
             df = self._process_technicals(df_raw)
             col_change = 'change'
-            min_vol = 50000 # Filtro de volumen para USA
         elif market_type == 'MERVAL':
-            df_raw = self.scan_tradingview(markets=["argentina"], limit=400)
+            df_raw = self.scan_tradingview(markets=["argentina"], limit=scan_limit, max_change=max_change,
+                                           sort_by="change", sort_order="asc")
             df = self._process_technicals(df_raw)
             col_change = 'change'
             min_vol = 0
 
-        if df.empty: return []
+        # Guardamos el escaneo crudo (Parquet) para análisis histórico
+        self._persist_scan(df_raw, market_type)
+        return {"df": df, "col_change": col_change, "min_vol": min_vol}
 
-        # 2. FILTRADO COMÚN
-        # Filtramos por caída y volumen (si aplica)
-        mask = (df[col_change] <= threshold)
-        if min_vol > 0 and 'volume' in df.columns:
-            mask = mask & (df['volume'] > min_vol)
-            
-        filtered = df[mask].copy() # Importante usar .copy() para evitar warnings
-
-    # 🔥 NUEVO: FILTRO ANTI-REPETIDOS 🔥
-    # Si tenemos la columna 'description' (Nombre de la empresa), borramos duplicados.
-    # keep='first' significa que se queda con el primero que aparece y borra los demás.
-        if 'description' in filtered.columns:
-            # 1. Función lambda para limpiar "basura" financiera
-            def clean_name(text):
-                if not isinstance(text, str): return str(text)
-                text = text.upper()
-                # Lista de palabras 'ruido' que hacen que los nombres parezcan distintos
-                noise_words = [
-                    " CEDEAR", " ADR", " S.A.", " SA", " INC.", " INC", " CORP", " LTD", 
-                    " PLC", " AG", " SHS", " CERT DEPOSITO", " ARG REPR", " SP ADR"
-                ]
-                for word in noise_words:
-                    text = text.replace(word, "")
-                # Truco extra: Quedarse solo con las primeras 2 palabras suele bastar
-                # para diferenciar "Coca Cola" de "Banco Galicia"
-                return " ".join(text.split()[:2])
-
-            # 2. Creamos columna temporal 'clean_id'
-            filtered['clean_id'] = filtered['description'].apply(clean_name)
-            
-            len_antes = len(filtered)
-            # 3. Borramos duplicados basándonos en el nombre LIMPIO
-            filtered = filtered.drop_duplicates(subset=['clean_id'], keep='first')
-            
-            print(f"   ✂️ Deduplicación Agresiva: {len_antes} -> {len(filtered)} (Se borraron {len_antes - len(filtered)} repetidos).")
+    def snapshot_universe(self, market_type: str) -> pd.DataFrame:
+        """
+        Escaneo sin filtro de caída (Top N por ranking / capitalización, UNIVERSE_LIMITS)
+        guardado como snapshot kind="universe". Es el universo que BarStore mantiene con velas.
+        """
+        limit = UNIVERSE_LIMITS[market_type]
+        if market_type == 'CRYPTO':
+            df_raw = self.scan_coin_market(limit=limit)
+        elif market_type == 'USA':
+            df_raw = self.scan_tradingview(markets=["america"], limit=limit)
+        else:
+            df_raw = self.scan_tradingview(markets=["argentina"], limit=limit)
+        self._persist_scan(df_raw, market_type, kind="universe")
+        return df_raw
 
-        opportunities = []
+    @staticmethod
+    def _clean_names(description: pd.Series) -> pd.Series:
+        """
+        Normaliza nombres de empresas sobre toda la columna:
+        mayúsculas, sin 'basura' financiera (CEDEAR, ADR, S.A., INC...) y solo las 2 primeras palabras.
+        """
+        try:
+            text = description.str.upper()
+        except AttributeError:
+            # Columna sin textos (ej: todo numérico)
+            return description.astype(str)
+        # Mismo orden que antes: cada palabra se quita sobre el resultado de la anterior
+        for word in NOISE_WORDS:
+            text = text.str.replace(word, "", regex=False)
+        # Truco extra: Quedarse solo con las primeras 2 palabras suele bastar
+        # para diferenciar "Coca Cola" de "Banco Galicia"
+        cleaned = text.str.replace(r'(?s)^\s*(\S*)\s*(\S*).*$', r'\1 \2', regex=True).str.strip()
+        # Valores que no eran texto se comparan por su str() (igual que antes)
+        return cleaned.where(text.notna(), description.astype(str))
 
-        # 3. UNIFICACIÓN DE FORMATO
-        for _, row in filtered.iterrows():
-            # Lógica de RSI y Velas (Idéntica para todos)
-            rsi = row.get('RSI', 50)
-            patron = row.get('Patrones_Hoy')
-            
-            tech_msg = []
-            if patron: tech_msg.append(f"🕯️ {patron}")
-            if rsi < 30: tech_msg.append(f"💎 Oversold ({round(rsi)})")
-            
-            signal_reason = " | ".join(tech_msg) if tech_msg else "Dip detected"
-            
-            # Detectar nombre y símbolo según el mercado
-            symbol = row.get('base_currency', row.get('name'))
-            name = row.get('base_currency_desc', row.get('description', symbol))
-
-            opportunities.append({
-                "symbol": symbol,
-                "name": name,
-                "price": float(row['close']),
-                "percent_change": float(row[col_change]), # Unificamos nombre del campo
-                "rsi": float(rsi) if pd.notna(rsi) else 50,
-                "technical_signal": signal_reason,
+    def _dedupe_by_name(self, filtered: pd.DataFrame) -> pd.DataFrame:
+        """
+        Si tenemos la columna 'description' (Nombre de la empresa), borramos duplicados.
+        keep='first' significa que se queda con el primero que aparece y borra los demás.
+        """
+        if 'description' not in filtered.columns: return filtered
+
+        # Ahora las filas llegan ordenadas por caída: para que sobreviva el listado
+        # principal (como antes), ordenamos por capitalización antes de deduplicar.
+        if 'market_cap_basic' in filtered.columns:
+            filtered = filtered.sort_values('market_cap_basic', ascending=False, na_position='last', kind='stable')
+
+        clean_id = self._clean_names(filtered['description'])
+        len_antes = len(filtered)
+        deduped = filtered[~clean_id.duplicated(keep='first')]
+        print(f"   ✂️ Deduplicación Agresiva: {len_antes} -> {len(deduped)} (Se borraron {len_antes - len(deduped)} repetidos).")
+        return deduped
+
+    @staticmethod
+    def _build_opportunities(filtered: pd.DataFrame, col_change: str, top_n: int = SCAN_TOP_N) -> List[dict]:
+        """
+        Top N por caída y armado de registros en bloque (arrays NumPy, sin iterrows).
+        Lógica de RSI y Velas idéntica para todos los mercados.
+        """
+        if filtered.empty: return []
+
+        # Top N más chicos con orden estable (empates en el orden original, igual que el sort de antes)
+        change = filtered[col_change].to_numpy(dtype=float)
+        order = np.argsort(change, kind='stable')[:top_n]
+        top = filtered.iloc[order]
+        n = len(top)
+
+        def column(name, default):
+            if name in top.columns: return top[name].to_numpy(dtype=object)
+            return np.full(n, default, dtype=object)
+
+        # Detectar nombre y símbolo según el mercado
+        symbol = column('base_currency', None) if 'base_currency' in top.columns else column('name', None)
+        if 'base_currency_desc' in top.columns:
+            name = column('base_currency_desc', None)
+        elif 'description' in top.columns:
+            name = column('description', None)
+        else:
+            name = symbol
+
+        # Señal técnica: "🕯️ <patrón> | 💎 Oversold (<rsi>)" o "Dip detected"
+        rsi = pd.to_numeric(pd.Series(column('RSI', 50)), errors='coerce').to_numpy(dtype=float)
+        patron = column('Patrones_Hoy', None)
+        has_patron = pd.notna(patron) & (patron != "")
+        oversold = rsi < 30
+
+        patron_txt = np.where(has_patron, "🕯️ " + np.where(has_patron, patron, "").astype(str).astype(object), "")
+        rsi_txt = np.where(oversold, "💎 Oversold (" + np.round(np.where(oversold, rsi, 0)).astype(np.int64).astype(str).astype(object) + ")", "")
+        separator = np.where(has_patron & oversold, " | ", "")
+        signal = np.where(has_patron | oversold, patron_txt + separator + rsi_txt, "Dip detected")
+
+        price = top['close'].to_numpy(dtype=float)
+        pct = change[order]
+
+        return [
+            {
+                "symbol": symbol[i],
+                "name": name[i],
+                "price": float(price[i]),
+                "percent_change": float(pct[i]), # Unificamos nombre del campo
+                "rsi": 50 if np.isnan(rsi[i]) else float(rsi[i]),
+                "technical_signal": str(signal[i]),
                 # Datos vacíos de IA para llenar después
                 "ai_score": None, "ai_decision": None, "ai_reason": None
-            })
-
-        opportunities.sort(key=lambda x: x['percent_change'])
-        return opportunities[:20]
+            }
+            for i in range(n)
+        ]
     
 
     
@@ -592,4 +1476,122 @@ class MarketAnalyzer:
         return [
             {"symbol": "BTC", "name": "Bitcoin", "quote": {"USD": {"price": 65000, "percent_change_24h": 1.2}}},
             {"symbol": "ETH", "name": "Ethereum", "quote": {"USD": {"price": 3500, "percent_change_24h": -6.5}}},
-        ]
\ No newline at end of file
+        ]
+
+# --- MOTOR MARK-TO-MARKET (Background) ---
+class MarkToMarketEngine:
+    """
+    Job de fondo: refresca en lote los precios de todas las posiciones OPEN y guarda
+    el último mark + PnL por posición en 'position_marks'.
+    Los endpoints (/dashboard, /portfolio, /my-portfolio) solo leen esa tabla:
+    ninguna llamada a APIs de precios en el camino del request.
+    """
+    def __init__(self, analyzer: MarketAnalyzer = None):
+        self.analyzer = analyzer or MarketAnalyzer()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _apply(mark: PositionMark, trade: Trade, price: float, source: str, now: datetime):
+        mark.symbol = trade.symbol
+        mark.mark_price = price
+        mark.price_source = source
+        mark.market_value = price * trade.quantity
+        mark.pnl_usd = mark.market_value - trade.invested_amount
+        mark.pnl_percent = (mark.pnl_usd / trade.invested_amount) * 100 if trade.invested_amount else 0.0
+        mark.marked_at = now
+
+    def mark_trade(self, db, trade: Trade, price: float, source: str):
+        """Mark inmediato de UNA posición (ej: al comprar, con el precio de ejecución)."""
+        mark = db.query(PositionMark).filter(PositionMark.trade_id == trade.id).first()
+        if mark is None:
+            mark = PositionMark(trade_id=trade.id)
+            db.add(mark)
+        self._apply(mark, trade, price, source, datetime.utcnow())
+        db.commit()
+        self._publish([mark], [])
+
+    def unmark_trade(self, db, trade_id: int):
+        """Saca el mark de una posición recién cerrada y avisa a los navegadores."""
+        deleted = db.query(PositionMark).filter(PositionMark.trade_id == trade_id).delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            self._publish([], [trade_id])
+
+    def run_once(self) -> dict:
+        """Un ciclo de valuación. Si el ciclo anterior sigue corriendo, no se solapa."""
+        if not self._lock.acquire(blocking=False):
+            return {}
+        db = SessionLocal()
+        try:
+            trades = db.query(Trade).filter(Trade.status == "OPEN").all()
+            open_ids = [t.id for t in trades]
+
+            # Limpiar marks de posiciones que ya se cerraron
+            closed = db.query(PositionMark).filter(~PositionMark.trade_id.in_(open_ids))
+            closed_ids = [m.trade_id for m in closed.all()]
+            closed.delete(synchronize_session=False)
+
+            if not trades:
+                db.commit()
+                self._publish([], closed_ids)
+                return {"positions": 0}
+
+            quotes = self.analyzer.get_price_quotes([t.symbol for t in trades])
+            marks = {m.trade_id: m for m in db.query(PositionMark).filter(PositionMark.trade_id.in_(open_ids)).all()}
+            now = datetime.utcnow()
+            updated = 0
+            changed = []
+
+            for trade in trades:
+                quote = quotes.get(trade.symbol.upper(), {})
+                price = quote.get('price', 0.0)
+                mark = marks.get(trade.id)
+                if price <= 0:
+                    # Sin precio: conservamos el último mark (o el de entrada si nunca tuvo)
+                    if mark is not None: continue
+                    price, source = trade.entry_price, "entry"
+                else:
+                    source = quote.get('source')
+                if mark is None:
+                    mark = PositionMark(trade_id=trade.id)
+                    db.add(mark)
+                    changed.append(mark)
+                elif mark.mark_price != price:
+                    changed.append(mark)
+                self._apply(mark, trade, price, source, now)
+                updated += 1
+
+            db.commit()
+            # Solo viajan al navegador las posiciones cuyo precio cambió
+            self._publish(changed, closed_ids)
+            print(f"📈 [MTM] {updated}/{len(trades)} posiciones valuadas")
+            return {"positions": len(trades), "updated": updated}
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Error Mark-to-Market: {e}")
+            return {}
+        finally:
+            db.close()
+            self._lock.release()
+
+    @staticmethod
+    def mark_event(mark: PositionMark) -> dict:
+        return {
+            "trade_id": mark.trade_id,
+            "symbol": mark.symbol,
+            "current_price": mark.mark_price,
+            "current_value": mark.market_value,
+            "pnl_usd": mark.pnl_usd,
+            "pnl_percent": mark.pnl_percent,
+            "price_source": mark.price_source,
+            "marked_at": mark.marked_at
+        }
+
+    def _publish(self, changed: list, closed_ids: list):
+        live_feed.publish_many("mark", [self.mark_event(m) for m in changed])
+        live_feed.publish_many("position_closed", [{"trade_id": trade_id} for trade_id in closed_ids])
+
+    @staticmethod
+    def get_marks(db) -> dict:
+        """{trade_id: PositionMark} con una sola consulta."""
+        return {m.trade_id: m for m in db.query(PositionMark).all()}
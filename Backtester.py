@@ -0,0 +1,252 @@
+# Backtester.py
+"""
+Backtest de las señales guardadas (CryptoSignal + StockSignal) contra el historial local de velas.
+
+Para cada señal: precio de entrada = el precio guardado al detectarla; a cada horizonte
+(días corridos) medimos el retorno al cierre y el peor retroceso intermedio (MAE, con los
+mínimos). Después agregamos por decisión IA y por tramo de score: cantidad, retorno medio
+y mediano, tasa de acierto (retorno > 0) y drawdown de la curva de las señales BUY.
+
+Curva BUY (por horizonte h): cartera equiponderada que compra cada señal BUY al precio
+guardado y la mantiene h días. El retorno de cada día es el promedio de los retornos de
+ese día (cierre contra cierre anterior) de las posiciones abiertas; así cada posición
+entra una sola vez y los retornos de h días solapados no se componen de más.
+
+Cada señal se cruza con las velas de SU mercado: MERVAL cotiza en BCBA y en pesos, así que
+va contra SYM.BA (BarStore.bar_symbol), nunca contra el listado en USD del mismo ticker.
+Las señales de acciones guardadas antes de la columna 'market' no se pueden ubicar
+(USA o MERVAL): quedan fuera y el reporte las cuenta en 'unknown_market'.
+
+Todo es indexado de arrays: una matriz día x símbolo de cierres/mínimos y un par
+(fila de entrada, columna del símbolo) por señal. 100k señales se evalúan en segundos.
+Uso: python Backtester.py --days 90 --market CRYPTO
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import literal, select, union_all
+
+from config import BACKTEST_FILL_DAYS, BACKTEST_HORIZONS, BACKTEST_SCORE_BUCKETS
+from database import engine
+from modelsTables import CryptoSignal, StockSignal
+
+
+STOCK_MARKETS = ("USA", "MERVAL")
+
+
+def load_signals(since: datetime = None, market: str = None) -> pd.DataFrame:
+    """
+    Señales de ambas tablas en un solo DataFrame.
+    market: CRYPTO / USA / MERVAL / STOCK (USA + MERVAL). La columna market de las acciones
+    es None en las señales viejas (sin mercado guardado).
+    """
+    market = market.upper() if market else None
+    queries = []
+    for model, name in ((CryptoSignal, "CRYPTO"), (StockSignal, "STOCK")):
+        if market and market != name and not (name == "STOCK" and market in STOCK_MARKETS):
+            continue
+        market_col = literal(name) if model is CryptoSignal else model.market
+        query = select(
+            model.id, market_col.label("market"), model.symbol, model.price,
+            model.ai_decision, model.ai_score, model.detected_at
+        )
+        if market in STOCK_MARKETS:
+            query = query.where(model.market == market)
+        if since is not None:
+            query = query.where(model.detected_at >= since)
+        queries.append(query)
+    if not queries:
+        return pd.DataFrame(columns=["id", "market", "symbol", "price", "ai_decision", "ai_score", "detected_at"])
+
+    with engine.connect() as conn:
+        df = pd.read_sql(union_all(*queries) if len(queries) > 1 else queries[0], conn)
+    df["detected_at"] = pd.to_datetime(df["detected_at"], utc=True)
+    df["symbol"] = df["symbol"].astype(str).str.upper()
+    return df
+
+
+def daily_matrix(frame: pd.DataFrame, start, end) -> pd.DataFrame:
+    """
+    Matriz diaria en calendario corrido. Los huecos DENTRO de las velas de cada símbolo
+    (fines de semana, feriados: hasta BACKTEST_FILL_DAYS) llevan el último cierre; después
+    de la última vela real (día en curso, símbolo que dejó de cotizar o BarStore atrasado)
+    queda NaN, así forward_returns no inventa retornos para horizontes que no pasaron.
+    """
+    days = pd.date_range(pd.Timestamp(start).floor("D"), pd.Timestamp(end).floor("D"), freq="D", tz="UTC")
+    if frame.empty:
+        return pd.DataFrame(index=days)
+    frame = frame.copy()
+    frame.index = frame.index.floor("D")
+    frame = frame[~frame.index.duplicated(keep="last")]
+    full = frame.reindex(days.union(frame.index))
+    filled = full.ffill(limit=BACKTEST_FILL_DAYS)
+    # Por columna: nada después de su última vela real
+    last_row = full.notna()[::-1].cummax()[::-1]
+    return filled.where(last_row).reindex(days)
+
+
+def _locate(signals: pd.DataFrame, close: pd.DataFrame):
+    """(fila de entrada, columna del símbolo, precio de entrada, tiene velas) de cada señal."""
+    col_of = {symbol: j for j, symbol in enumerate(close.columns)}
+    keys = signals["bar_key"] if "bar_key" in signals.columns else signals["symbol"]
+    cols = keys.map(col_of).fillna(-1).to_numpy(dtype=np.int64)
+    rows = close.index.searchsorted(signals["detected_at"].dt.floor("D"))
+    entry = signals["price"].to_numpy(dtype=float)
+    entry = np.where(entry > 0, entry, np.nan)
+    return rows, cols, entry, (cols >= 0) & (rows < len(close.index))
+
+
+def forward_returns(signals: pd.DataFrame, close: pd.DataFrame, low: pd.DataFrame, horizons: list) -> pd.DataFrame:
+    """
+    Agrega ret_{h}d (retorno al cierre h días después) y mae_{h}d (peor mínimo entre
+    la entrada y h días después, relativo a la entrada). NaN si el horizonte todavía no pasó
+    o no hay historial del símbolo.
+    """
+    out = signals.copy()
+    rows, cols, entry, has_prices = _locate(out, close)
+    days = close.index
+    close_arr = close.to_numpy(dtype=float)
+    low_arr = low.reindex_like(close).to_numpy(dtype=float)
+    out["has_prices"] = has_prices
+
+    low_frame = pd.DataFrame(low_arr)
+    for h in horizons:
+        target = rows + h
+        valid = has_prices & (target < len(days))
+        ret = np.full(len(out), np.nan)
+        ret[valid] = close_arr[target[valid], cols[valid]] / entry[valid] - 1
+        # Sin vela real en el destino = el horizonte todavía no pasó (tampoco cuenta el MAE)
+        valid &= ~np.isnan(ret)
+        out[f"ret_{h}d"] = ret
+
+        # Mínimo de las próximas h velas (filas t+1..t+h), una sola pasada por horizonte
+        fwd_min = low_frame[::-1].rolling(h, min_periods=1).min()[::-1].shift(-1).to_numpy()
+        mae = np.full(len(out), np.nan)
+        mae[valid] = np.minimum(fwd_min[rows[valid], cols[valid]] / entry[valid] - 1, 0)
+        out[f"mae_{h}d"] = mae
+    return out
+
+
+def position_curve(signals: pd.DataFrame, close: pd.DataFrame, h: int) -> pd.Series:
+    """
+    Retorno diario de una cartera equiponderada que mantiene cada señal h días:
+    promedio de los retornos del día de las posiciones abiertas (días sin posiciones no cuentan).
+    """
+    rows, cols, entry, has_prices = _locate(signals, close)
+    close_arr = close.to_numpy(dtype=float)
+    n_days = len(close.index)
+    total = np.zeros(n_days)
+    count = np.zeros(n_days)
+    prev = entry.copy()
+    for k in range(1, h + 1):
+        target = rows + k
+        valid = has_prices & (target < n_days) & np.isfinite(prev)
+        price = np.full(len(prev), np.nan)
+        price[valid] = close_arr[target[valid], cols[valid]]
+        ret = price / prev - 1
+        ok = valid & np.isfinite(ret)
+        np.add.at(total, target[ok], ret[ok])
+        np.add.at(count, target[ok], 1)
+        prev = price
+    held = count > 0
+    return pd.Series(total[held] / count[held], index=close.index[held])
+
+
+def max_drawdown(returns: pd.Series) -> float:
+    """Máxima caída de la curva compuesta (valor negativo, 0 si nunca cayó)."""
+    if returns.empty:
+        return 0.0
+    equity = (1 + returns).cumprod()
+    # El pico arranca en el capital inicial (1): una caída el primer día también cuenta
+    peak = equity.cummax().clip(lower=1.0)
+    return float(min((equity / peak - 1).min(), 0.0))
+
+
+def _group_stats(df: pd.DataFrame, key, horizons: list) -> list:
+    rows = []
+    for name, group in df.groupby(key, observed=True, dropna=False):
+        item = {"group": str(name), "signals": int(len(group))}
+        for h in horizons:
+            ret = group[f"ret_{h}d"].dropna()
+            item[f"{h}d"] = {
+                "n": int(len(ret)),
+                "mean": round(float(ret.mean()), 4) if len(ret) else None,
+                "median": round(float(ret.median()), 4) if len(ret) else None,
+                "hit_rate": round(float((ret > 0).mean()), 4) if len(ret) else None,
+                "avg_mae": round(float(group[f"mae_{h}d"].dropna().mean()), 4) if len(ret) else None,
+            }
+        rows.append(item)
+    return rows
+
+
+def summarize(df: pd.DataFrame, horizons: list, close: pd.DataFrame, score_buckets: list = None) -> dict:
+    score_buckets = score_buckets or BACKTEST_SCORE_BUCKETS
+    evaluated = df[df["has_prices"]]
+    labels = [f"{lo}-{hi - 1}" for lo, hi in zip(score_buckets[:-1], score_buckets[1:])]
+    bucket = pd.cut(evaluated["ai_score"], bins=score_buckets, right=False, labels=labels)
+
+    # Curva de las señales BUY: cartera que mantiene cada una h días (ver docstring del módulo)
+    buys = evaluated[evaluated["ai_decision"] == "BUY"]
+    drawdowns = {f"{h}d": round(max_drawdown(position_curve(buys, close, h)), 4) for h in horizons}
+
+    return {
+        "signals": int(len(df)),
+        "evaluated": int(len(evaluated)),
+        "missing_prices": int(len(df) - len(evaluated)),
+        "by_decision": _group_stats(evaluated, evaluated["ai_decision"].fillna("N/A"), horizons),
+        "by_score": _group_stats(evaluated, bucket, horizons),
+        "buy_curve_max_drawdown": drawdowns,
+    }
+
+
+def run_backtest(horizons: list = None, since_days: int = None, market: str = None, store=None) -> dict:
+    """Backtest completo: señales de la DB + velas diarias locales (BarStore)."""
+    from BarStore import bar_store, bar_symbol
+
+    horizons = sorted(set(horizons or BACKTEST_HORIZONS))
+    if horizons[0] < 1:
+        raise ValueError(f"Horizontes inválidos (deben ser >= 1 día): {horizons}")
+    store = store or bar_store
+    since = datetime.utcnow() - timedelta(days=since_days) if since_days else None
+
+    signals = load_signals(since=since, market=market)
+    # Acciones sin mercado: el mismo ticker puede ser USA (USD) o un CEDEAR de BCBA (ARS)
+    unknown = signals["market"].isna()
+    signals = signals[~unknown]
+    extra = {"unknown_market": int(unknown.sum())}
+    if extra["unknown_market"]:
+        extra["note"] = (f"{extra['unknown_market']} señales de acciones sin mercado (guardadas antes de la columna "
+                         "market) quedan fuera: no se sabe si son USA o MERVAL.")
+
+    if signals.empty:
+        return {"signals": 0, "evaluated": 0, "missing_prices": 0, "by_decision": [], "by_score": [],
+                "buy_curve_max_drawdown": {}, **extra, "horizons": horizons, "since": since, "market": market}
+
+    signals = signals.assign(bar_key=[bar_symbol(s, m) for s, m in zip(signals["symbol"], signals["market"])])
+    start = signals["detected_at"].min()
+    end = pd.Timestamp.now(tz="UTC")
+    bars = store.read_matrices(signals["bar_key"].unique().tolist(), "1d", ["close", "low"], start=start - timedelta(days=1))
+    close = daily_matrix(bars["close"], start, end)
+    low = daily_matrix(bars["low"], start, end)
+
+    report = summarize(forward_returns(signals, close, low, horizons), horizons, close)
+    report.update(extra)
+    report["horizons"] = horizons
+    report["since"] = since
+    report["market"] = market
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Backtest de señales guardadas")
+    parser.add_argument("--days", type=int, default=None, help="Solo señales de los últimos N días")
+    parser.add_argument("--market", choices=["CRYPTO", "STOCK", "USA", "MERVAL"], default=None)
+    parser.add_argument("--horizons", default=None, help="Ej: 1,3,7,14")
+    args = parser.parse_args()
+
+    horizons = [int(h) for h in args.horizons.split(",")] if args.horizons else None
+    print(json.dumps(run_backtest(horizons, args.days, args.market), indent=2, default=str, ensure_ascii=False))
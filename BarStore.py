@@ -0,0 +1,344 @@
+# BarStore.py
+"""
+Historial local de velas OHLCV (diarias e intradiarias).
+
+Estructura en disco (Parquet comprimido, una carpeta por intervalo y símbolo):
+    BARS_DIR/interval=1d/symbol=AAPL/part_20240101T000000_20251231T000000.parquet
+
+- Append-friendly: cada backfill agrega un 'part' nuevo con SOLO las velas que faltaban.
+  El rango (primera y última vela) va en el nombre del archivo, así saber qué tenemos
+  no requiere abrir ningún Parquet. Cuando se juntan muchos parts se compactan en uno.
+- Solo se guardan velas CERRADAS (la vela en curso cambia hasta el cierre).
+- Lectura por rango de un símbolo: se leen solo los parts que se solapan con el rango.
+
+Fuentes: Binance (klines) para cripto, con Yahoo (SYM-USD) de respaldo; Yahoo para acciones.
+Uso: python BarStore.py   (backfill incremental de watchlists + universo escaneado)
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    BARS_DIR, BARS_INTERVALS, BARS_HISTORY_DAYS, BARS_MAX_PARTS, BARS_MAX_WORKERS,
+    SNAPSHOT_COMPRESSION, WATCHLIST_STOCKS, WATCHLIST_MERVAL, UPSTREAM_MODE
+)
+from ProviderClient import http_get
+
+BAR_COLUMNS = ["open", "high", "low", "close", "volume"]
+INTERVAL_STEP = {
+    "1m": timedelta(minutes=1), "5m": timedelta(minutes=5), "15m": timedelta(minutes=15),
+    "30m": timedelta(minutes=30), "1h": timedelta(hours=1), "1d": timedelta(days=1),
+}
+# Yahoo solo sirve intradiario reciente
+YAHOO_MAX_DAYS = {"1m": 7, "5m": 59, "15m": 59, "30m": 59, "1h": 729}
+BINANCE_KLINES_URL = "https://api.binance.com/api/v3/klines"
+BINANCE_KLINES_LIMIT = 1000
+
+_TS_FORMAT = "%Y%m%dT%H%M%S"
+_PART_RE = re.compile(r"^part_(?P<first>\d{8}T\d{6})_(?P<last>\d{8}T\d{6})\.parquet$")
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _to_utc(ts) -> datetime:
+    ts = pd.Timestamp(ts)
+    return (ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")).to_pydatetime()
+
+
+def _utc_index(index) -> pd.DatetimeIndex:
+    index = pd.DatetimeIndex(index)
+    return (index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")).rename("ts")
+
+
+def _safe_symbol(symbol: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", symbol.upper())
+
+
+def normalize_bars(df: pd.DataFrame) -> pd.DataFrame:
+    """Cualquier tabla OHLCV -> columnas estándar, índice 'ts' UTC ordenado y sin duplicados."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], tz="UTC", name="ts"), dtype=float)
+    out = df.rename(columns=str.lower)[BAR_COLUMNS].astype(float)
+    out.index = _utc_index(out.index)
+    out = out[~out.index.duplicated(keep="last")].sort_index()
+    return out.dropna(subset=["close"])
+
+
+def closed_bars(df: pd.DataFrame, interval: str, now: datetime = None) -> pd.DataFrame:
+    """Descarta la vela en curso (la que todavía no cerró)."""
+    now = now or _utc_now()
+    return df[df.index + INTERVAL_STEP[interval] <= now]
+
+
+# --- FUENTES ---
+def fetch_yahoo(tickers: list, interval: str, start: datetime) -> dict:
+    """Una sola descarga de Yahoo para varios tickers. Devuelve {ticker: DataFrame}."""
+    if UPSTREAM_MODE == "replay":
+        return {}  # yfinance no pasa por el stand-in (ver UpstreamReplay.py)
+    import yfinance as yf
+
+    if interval in YAHOO_MAX_DAYS:
+        start = max(start, _utc_now() - timedelta(days=YAHOO_MAX_DAYS[interval]))
+    data = yf.download(list(tickers), start=start, interval=interval, group_by="ticker",
+                       auto_adjust=False, progress=False, threads=True)
+    if data is None or data.empty:
+        return {}
+
+    frames = {}
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex):
+            if ticker not in data.columns.get_level_values(0): continue
+            sub = data[ticker]
+        else:
+            sub = data
+        frames[ticker] = normalize_bars(sub.dropna(how="all"))
+    return frames
+
+
+def fetch_binance(symbol: str, interval: str, start: datetime) -> pd.DataFrame:
+    """Klines de Binance paginadas desde 'start'. None si el par no existe en Binance."""
+    rows = []
+    start_ms = int(start.timestamp() * 1000)
+    while True:
+        r = http_get(BINANCE_KLINES_URL, params={
+            "symbol": f"{symbol.upper()}USDT", "interval": interval,
+            "startTime": start_ms, "limit": BINANCE_KLINES_LIMIT
+        })
+        if r.status_code == 400:
+            return None
+        r.raise_for_status()
+        page = r.json()
+        rows.extend(page)
+        if len(page) < BINANCE_KLINES_LIMIT:
+            break
+        start_ms = page[-1][0] + 1
+
+    if not rows:
+        return normalize_bars(None)
+    raw = np.array([k[:6] for k in rows], dtype=float)
+    df = pd.DataFrame(raw[:, 1:], columns=BAR_COLUMNS,
+                      index=pd.to_datetime(raw[:, 0].astype("int64"), unit="ms", utc=True))
+    return normalize_bars(df)
+
+
+class BarStore:
+    def __init__(self, base_dir: str = None):
+        self.base_dir = base_dir or BARS_DIR
+
+    def _symbol_dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.base_dir, f"interval={interval}", f"symbol={_safe_symbol(symbol)}")
+
+    def _parts(self, symbol: str, interval: str) -> list:
+        """[(primera, última, ruta)] ordenado por primera vela."""
+        folder = self._symbol_dir(symbol, interval)
+        if not os.path.isdir(folder):
+            return []
+        parts = []
+        for name in os.listdir(folder):
+            match = _PART_RE.match(name)
+            if match:
+                first = datetime.strptime(match.group("first"), _TS_FORMAT).replace(tzinfo=timezone.utc)
+                last = datetime.strptime(match.group("last"), _TS_FORMAT).replace(tzinfo=timezone.utc)
+                parts.append((first, last, os.path.join(folder, name)))
+        parts.sort(key=lambda item: item[0])
+        return parts
+
+    def coverage(self, symbol: str, interval: str = "1d"):
+        """(primera, última) vela guardada, o None si no hay historial. No lee los Parquet."""
+        parts = self._parts(symbol, interval)
+        if not parts:
+            return None
+        return min(p[0] for p in parts), max(p[1] for p in parts)
+
+    def _write_part(self, folder: str, bars: pd.DataFrame) -> str:
+        os.makedirs(folder, exist_ok=True)
+        first, last = bars.index[0], bars.index[-1]
+        path = os.path.join(folder, f"part_{first.strftime(_TS_FORMAT)}_{last.strftime(_TS_FORMAT)}.parquet")
+        tmp_path = path + ".tmp"
+        # Temporal + rename: nunca queda un part a medio escribir
+        bars.reset_index().to_parquet(tmp_path, engine="pyarrow", compression=SNAPSHOT_COMPRESSION, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def append(self, symbol: str, interval: str, bars: pd.DataFrame) -> int:
+        """Agrega solo las velas que no tenemos. Devuelve cuántas se guardaron."""
+        bars = normalize_bars(bars)
+        cov = self.coverage(symbol, interval)
+        if cov is not None:
+            first, last = cov
+            bars = bars[(bars.index < first) | (bars.index > last)]
+        if bars.empty:
+            return 0
+
+        folder = self._symbol_dir(symbol, interval)
+        # Un part por tramo contiguo (lo que va antes y lo que va después del historial)
+        if cov is not None:
+            for chunk in (bars[bars.index < cov[0]], bars[bars.index > cov[1]]):
+                if not chunk.empty: self._write_part(folder, chunk)
+        else:
+            self._write_part(folder, bars)
+
+        if len(self._parts(symbol, interval)) > BARS_MAX_PARTS:
+            self.compact(symbol, interval)
+        return len(bars)
+
+    def compact(self, symbol: str, interval: str = "1d"):
+        """Une todos los parts de un símbolo en uno solo."""
+        parts = self._parts(symbol, interval)
+        if len(parts) < 2:
+            return
+        bars = self.read(symbol, interval)
+        path = self._write_part(self._symbol_dir(symbol, interval), bars)
+        for _, _, old in parts:
+            if old != path: os.remove(old)
+
+    def read(self, symbol: str, interval: str = "1d", start=None, end=None, columns: list = None) -> pd.DataFrame:
+        """Velas de un símbolo en [start, end]. Solo abre los parts que tocan el rango."""
+        start = _to_utc(start) if start is not None else None
+        end = _to_utc(end) if end is not None else None
+        frames = []
+        for first, last, path in self._parts(symbol, interval):
+            if (start and last < start) or (end and first > end):
+                continue
+            frames.append(pd.read_parquet(path, engine="pyarrow", columns=["ts"] + (columns or BAR_COLUMNS)))
+        if not frames:
+            return normalize_bars(None)[columns or BAR_COLUMNS]
+
+        df = pd.concat(frames, ignore_index=True).set_index("ts").sort_index()
+        df.index = _utc_index(df.index)
+        df = df[~df.index.duplicated(keep="last")]
+        if start is not None: df = df[df.index >= start]
+        if end is not None: df = df[df.index <= end]
+        return df
+
+    def read_matrix(self, symbols: list, interval: str = "1d", field: str = "close", start=None, end=None) -> pd.DataFrame:
+        """Matriz ancha tiempo x símbolo de un campo (ej: close) para cálculos vectorizados."""
+        return self.read_matrices(symbols, interval, [field], start=start, end=end)[field]
+
+    def read_matrices(self, symbols: list, interval: str = "1d", fields: list = None, start=None, end=None) -> dict:
+        """Varios campos a la vez ({campo: matriz tiempo x símbolo}) leyendo cada símbolo una sola vez."""
+        fields = fields or BAR_COLUMNS
+        series = {field: {} for field in fields}
+        for symbol in dict.fromkeys(s.upper() for s in symbols):
+            df = self.read(symbol, interval, start=start, end=end, columns=fields)
+            if not df.empty:
+                for field in fields:
+                    series[field][symbol] = df[field]
+        return {field: pd.DataFrame(columns) for field, columns in series.items()}
+
+    # --- BACKFILL INCREMENTAL ---
+    def missing_start(self, symbol: str, interval: str, history_days: int = None) -> datetime:
+        """Desde dónde hay que pedir: la vela siguiente a la última guardada (o el historial completo)."""
+        cov = self.coverage(symbol, interval)
+        if cov is not None:
+            return cov[1] + INTERVAL_STEP[interval]
+        days = history_days or BARS_HISTORY_DAYS.get(interval, 365)
+        return _utc_now() - timedelta(days=days)
+
+    def backfill(self, symbols: list, interval: str = "1d", asset_class: str = "stock", history_days: int = None) -> dict:
+        """
+        Trae solo los tramos faltantes de cada símbolo. Devuelve {símbolo: velas nuevas}.
+        Acciones: una descarga de Yahoo por cada fecha de inicio distinta (normalmente una sola).
+        Cripto: klines de Binance por símbolo en paralelo (respaldo Yahoo SYM-USD).
+        """
+        now = _utc_now()
+        pending = {}
+        for symbol in dict.fromkeys(s.upper() for s in symbols if s):
+            start = self.missing_start(symbol, interval, history_days)
+            if start + INTERVAL_STEP[interval] <= now:   # Hay al menos una vela cerrada nueva
+                pending[symbol] = start
+        if not pending:
+            return {}
+
+        results = {}
+        if asset_class == "crypto":
+            def run(item):
+                symbol, start = item
+                try:
+                    bars = fetch_binance(symbol, interval, start)
+                    if bars is None:
+                        bars = fetch_yahoo([f"{symbol}-USD"], interval, start).get(f"{symbol}-USD")
+                    return symbol, self.append(symbol, interval, closed_bars(bars, interval, now)) if bars is not None else 0
+                except Exception as e:
+                    print(f"⚠️ Backfill {symbol} ({interval}): {e}")
+                    return symbol, 0
+
+            with ThreadPoolExecutor(max_workers=BARS_MAX_WORKERS, thread_name_prefix="bars") as executor:
+                results.update(executor.map(run, pending.items()))
+        else:
+            # Agrupamos por fecha de inicio para hacer UNA descarga multi-ticker por grupo
+            groups = {}
+            for symbol, start in pending.items():
+                key = start.date() if interval == "1d" else start.replace(minute=0, second=0, microsecond=0)
+                groups.setdefault(key, []).append(symbol)
+            for symbols_group in groups.values():
+                start = min(pending[s] for s in symbols_group)
+                try:
+                    frames = fetch_yahoo(symbols_group, interval, start)
+                except Exception as e:
+                    print(f"⚠️ Backfill Yahoo ({interval}, {len(symbols_group)} tickers): {e}")
+                    frames = {}
+                for symbol in symbols_group:
+                    bars = frames.get(symbol)
+                    results[symbol] = self.append(symbol, interval, closed_bars(bars, interval, now)) if bars is not None else 0
+        return results
+
+
+# --- UNIVERSO A MANTENER ---
+def bar_symbol(symbol: str, market: str) -> str:
+    """
+    Clave (y ticker de Yahoo) de un símbolo escaneado. MERVAL cotiza en BCBA y en pesos:
+    lleva '.BA' para no mezclarse con el listado de USA del mismo ticker (AAPL vs AAPL.BA).
+    """
+    symbol = str(symbol).upper()
+    return f"{symbol}.BA" if market == "MERVAL" and not symbol.endswith(".BA") else symbol
+
+
+def scanned_universe(market: str) -> list:
+    """
+    Símbolos del último snapshot del universo completo de un mercado (SnapshotStore, kind="universe").
+    Si todavía no hay ninguno, cae al último escaneo crudo (que solo trae las filas que cayeron).
+    """
+    from SnapshotStore import load_latest
+
+    df = load_latest(market, kind="universe")
+    if df.empty:
+        df = load_latest(market)
+    if df.empty:
+        return []
+    column = "base_currency" if "base_currency" in df.columns else "name"
+    return [s for s in df[column].dropna().astype(str).tolist() if s]
+
+
+def backfill_universe(store: "BarStore" = None, intervals: list = None) -> dict:
+    """
+    Backfill incremental de watchlists + universo escaneado (CRYPTO, USA, MERVAL).
+    WATCHLIST_MERVAL son ADRs en USD (ticker pelado); lo escaneado en MERVAL va como SYM.BA.
+    """
+    store = store or bar_store
+    merval = [bar_symbol(s, "MERVAL") for s in scanned_universe("MERVAL")]
+    stocks = list(WATCHLIST_STOCKS) + list(WATCHLIST_MERVAL) + scanned_universe("USA") + merval
+    cryptos = scanned_universe("CRYPTO")
+
+    summary = {}
+    for interval in intervals or BARS_INTERVALS:
+        new_stock = store.backfill(stocks, interval, asset_class="stock")
+        new_crypto = store.backfill(cryptos, interval, asset_class="crypto")
+        summary[interval] = {"symbols": len(new_stock) + len(new_crypto),
+                             "bars": sum(new_stock.values()) + sum(new_crypto.values())}
+        print(f"🕯️ [BARS] {interval}: {summary[interval]['bars']} velas nuevas en {summary[interval]['symbols']} símbolos")
+    return summary
+
+
+# Instancia compartida del proceso
+bar_store = BarStore()
+
+
+if __name__ == "__main__":
+    backfill_universe()
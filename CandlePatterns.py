@@ -0,0 +1,106 @@
+# CandlePatterns.py
+"""
+Motor vectorizado de patrones de velas.
+
+TradingView devuelve cada patrón como una columna 'Candle.*' con 0/1.
+En vez de recorrer fila por fila con df.apply, armamos una matriz booleana
+(filas x patrones) con NumPy y sacamos de ahí:
+  - 'Patrones_Hoy': texto legible ("Hammer, Doji") igual que antes.
+  - 'Patrones_Mask': bitmask entero compacto (bit i = CANDLE_PATTERNS[i]).
+"""
+import numpy as np
+import pandas as pd
+from config import TV_RAW_LISTS
+
+CANDLE_PREFIX = "Candle."
+
+# Orden canónico de los bits (Lista 3 de TradingView). Es estable entre escaneos.
+CANDLE_PATTERNS = [c for c in TV_RAW_LISTS[2] if c.startswith(CANDLE_PREFIX)]
+_BIT_INDEX = {col: i for i, col in enumerate(CANDLE_PATTERNS)}
+
+
+def candle_columns(df: pd.DataFrame) -> list:
+    """Columnas de velas presentes en el DataFrame (en el orden del DataFrame)."""
+    return [c for c in df.columns if CANDLE_PREFIX in c]
+
+
+def pattern_label(col: str) -> str:
+    """Candle.Doji.Dragonfly -> 'Doji Dragonfly'"""
+    return col.replace(CANDLE_PREFIX, "").replace(".", " ")
+
+
+def candle_matrix(df: pd.DataFrame, cols: list) -> np.ndarray:
+    """Matriz booleana (filas x cols): True solo donde el valor es exactamente 1 (NaN = False)."""
+    if not cols:
+        return np.zeros((len(df), 0), dtype=bool)
+    values = df[cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return values == 1
+
+
+def patterns_bitmask(df: pd.DataFrame, cols: list = None, matrix: np.ndarray = None) -> np.ndarray:
+    """Bitmask int64 por fila usando el orden canónico CANDLE_PATTERNS."""
+    cols = candle_columns(df) if cols is None else cols
+    matrix = candle_matrix(df, cols) if matrix is None else matrix
+
+    # Columnas fuera del orden canónico se agregan al final
+    bits = []
+    extra = len(CANDLE_PATTERNS)
+    for col in cols:
+        if col in _BIT_INDEX:
+            bits.append(_BIT_INDEX[col])
+        else:
+            bits.append(extra)
+            extra += 1
+    if extra > 63:
+        raise ValueError(f"Demasiados patrones de velas para un bitmask int64: {extra}")
+
+    weights = np.left_shift(np.int64(1), np.array(bits, dtype=np.int64))
+    return matrix.astype(np.int64) @ weights if cols else np.zeros(len(df), dtype=np.int64)
+
+
+def decode_bitmask(mask: int) -> list:
+    """Bitmask -> lista de nombres legibles (solo patrones canónicos)."""
+    return [pattern_label(col) for i, col in enumerate(CANDLE_PATTERNS) if mask >> i & 1]
+
+
+def detect_patterns(df: pd.DataFrame, empty_label=None):
+    """
+    Devuelve (labels, mask) alineados con df.index.
+    El texto se arma una vez por COMBINACIÓN distinta de patrones, no por fila.
+    """
+    cols = candle_columns(df)
+    matrix = candle_matrix(df, cols)
+    mask = patterns_bitmask(df, cols, matrix)
+
+    if len(df) == 0:
+        return pd.Series([], index=df.index, dtype=object), pd.Series(mask, index=df.index)
+
+    # Agrupamos filas con la misma combinación (bits en el orden de columnas del df)
+    local_weights = np.left_shift(np.int64(1), np.arange(len(cols), dtype=np.int64))
+    local_mask = matrix.astype(np.int64) @ local_weights
+    combos, inverse = np.unique(local_mask, return_inverse=True)
+    names = [pattern_label(c) for c in cols]
+    combo_labels = np.empty(len(combos), dtype=object)
+    for i, combo in enumerate(combos):
+        found = [name for j, name in enumerate(names) if combo >> j & 1]
+        combo_labels[i] = ", ".join(found) if found else empty_label
+
+    labels = pd.Series(combo_labels[np.asarray(inverse).ravel()], index=df.index, dtype=object)
+    return labels, pd.Series(mask, index=df.index)
+
+
+def add_pattern_columns(df: pd.DataFrame, empty_label=None, no_candles_label=None) -> pd.DataFrame:
+    """
+    Agrega 'Patrones_Hoy' y 'Patrones_Mask' al DataFrame (in-place) y lo devuelve.
+    empty_label: valor cuando la fila no tiene patrones.
+    no_candles_label: valor cuando el DataFrame no trae columnas de velas.
+    """
+    if not candle_columns(df):
+        df['Patrones_Hoy'] = no_candles_label
+        df['Patrones_Mask'] = 0
+        return df
+
+    labels, mask = detect_patterns(df, empty_label=empty_label)
+    df['Patrones_Hoy'] = labels
+    df['Patrones_Mask'] = mask
+    return df
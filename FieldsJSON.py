@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, Any
 
 class CoinSignalSchema(BaseModel):
     symbol: str
@@ -21,6 +21,7 @@ class CoinSignalSchema(BaseModel):
 
 class StockSignalSchema(BaseModel):
     symbol: str
+    market: Optional[str] = None
     price: float
     percent_change: float
     rsi: Optional[float] = None
@@ -51,6 +52,39 @@ class PortfolioItemSchema(BaseModel):
     pnl_usd: float
     pnl_percent: float
     bought_at: datetime
+    # --- FRESCURA DEL PRECIO ---
+    price_source: Optional[str] = None        # yahoo / binance / cmc
+    price_age_seconds: Optional[float] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- JOBS DE ANÁLISIS (/analyze en segundo plano) ---
+class AnalysisJobSchema(BaseModel):
+    job_id: str
+    market: str
+    threshold: float
+    status: str                        # queued / scanning / analyzing / saving / done / cancelled / failed
+    cancel_requested: bool = False
+    attempts: int = 0
+    total_candidates: Optional[int] = None   # None = todavía escaneando
+    candidates_by_status: Dict[str, int] = {}
+    progress: float = 0.0              # 0..1, candidatos con la IA terminada
+    saved: Optional[int] = None        # Señales guardadas (al terminar)
+    ai_usage: Optional[Dict[str, Any]] = None   # Llamadas, tokens y latencia de la IA
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobCandidateSchema(BaseModel):
+    symbol: str
+    name: Optional[str] = None
+    price: Optional[float] = None
+    percent_change: Optional[float] = None
+    rsi: Optional[float] = None
+    technical_signal: Optional[str] = None
+    status: str                        # pending / analyzing / done / error / cancelled
+    ai_score: Optional[int] = None
+    ai_decision: Optional[str] = None
+    ai_reason: Optional[str] = None
@@ -0,0 +1,189 @@
+# Indicators.py
+"""
+Motor de indicadores en lote sobre una matriz tiempo x símbolos.
+
+Calcula los mismos técnicos que devuelve TradingView (mismos nombres de columna):
+    RSI (14, Wilder), Stoch.K / Stoch.D (14, 3, 3), Mom (10), CCI20 (hlc3), AO (5/34 sobre hl2)
+
+Todo el estado vive en arrays (un valor o una ventana por símbolo), así que avanzar
+UNA vela es una operación vectorizada para TODOS los símbolos a la vez:
+  - Modo lote: IndicatorEngine.from_history(...) recorre el historial vela por vela.
+  - Modo incremental: engine.update(high, low, close) con la vela nueva, sin recalcular nada.
+Los dos modos usan el mismo paso, así que dan exactamente los mismos valores.
+
+Un NaN en 'close' significa que ese símbolo no tuvo vela en ese momento:
+su estado no se toca (igual que calcular cada símbolo por separado sobre su propia serie).
+"""
+import numpy as np
+import pandas as pd
+
+RSI_PERIOD = 14
+STOCH_PERIOD, STOCH_SMOOTH_K, STOCH_SMOOTH_D = 14, 3, 3
+MOM_PERIOD = 10
+CCI_PERIOD = 20
+AO_FAST, AO_SLOW = 5, 34
+
+INDICATORS = ["RSI", "Stoch.K", "Stoch.D", "Mom", "CCI20", "AO"]
+
+
+class _Window:
+    """Ventana circular (símbolos x largo) con puntero y contador propio por símbolo."""
+
+    def __init__(self, n: int, length: int):
+        self.values = np.full((n, length), np.nan)
+        self.ptr = np.zeros(n, dtype=np.int64)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.length = length
+
+    def push(self, values: np.ndarray, rows: np.ndarray):
+        self.values[rows, self.ptr[rows]] = values[rows]
+        self.ptr[rows] = (self.ptr[rows] + 1) % self.length
+        self.count[rows] += 1
+
+    def full(self) -> np.ndarray:
+        return self.count >= self.length
+
+    def oldest(self) -> np.ndarray:
+        # Con la ventana llena, el próximo lugar a escribir es el valor más viejo
+        return self.values[np.arange(len(self.ptr)), self.ptr]
+
+
+def _masked(values: np.ndarray, ok: np.ndarray) -> np.ndarray:
+    return np.where(ok, values, np.nan)
+
+
+class IndicatorEngine:
+    def __init__(self, symbols: list, rsi_period: int = RSI_PERIOD):
+        self.symbols = [str(s).upper() for s in symbols]
+        n = len(self.symbols)
+
+        # RSI (RMA de Wilder, semilla = promedio simple de las primeras rsi_period variaciones)
+        self.rsi_period = rsi_period
+        self.prev_close = np.full(n, np.nan)
+        self.deltas = np.zeros(n, dtype=np.int64)
+        self.avg_gain = np.zeros(n)
+        self.avg_loss = np.zeros(n)
+
+        self.mom = _Window(n, MOM_PERIOD + 1)
+        self.highs = _Window(n, STOCH_PERIOD)
+        self.lows = _Window(n, STOCH_PERIOD)
+        self.raw_k = _Window(n, STOCH_SMOOTH_K)
+        self.k = _Window(n, STOCH_SMOOTH_D)
+        self.tp = _Window(n, CCI_PERIOD)
+        self.hl2_fast = _Window(n, AO_FAST)
+        self.hl2_slow = _Window(n, AO_SLOW)
+
+        self.bars = np.zeros(n, dtype=np.int64)
+        self.latest = {name: np.full(n, np.nan) for name in INDICATORS}
+
+    # --- PASO INCREMENTAL (una vela para todos los símbolos) ---
+    def update(self, high, low, close) -> dict:
+        """
+        Avanza el estado con UNA vela por símbolo (arrays alineados con self.symbols).
+        Devuelve {indicador: array} con el valor de ESTA vela (NaN donde el símbolo no tuvo vela).
+        """
+        high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+        rows = np.flatnonzero(~np.isnan(close))
+        has_bar = ~np.isnan(close)
+        self.bars[rows] += 1
+
+        # RSI
+        p = self.rsi_period
+        delta = close - self.prev_close
+        has_delta = has_bar & ~np.isnan(delta)
+        gain = np.where(has_delta, np.maximum(delta, 0), 0.0)
+        loss = np.where(has_delta, np.maximum(-delta, 0), 0.0)
+        self.deltas[has_delta] += 1
+        warmup = has_delta & (self.deltas <= p)
+        smooth = has_delta & (self.deltas > p)
+        self.avg_gain[warmup] += gain[warmup] / p
+        self.avg_loss[warmup] += loss[warmup] / p
+        self.avg_gain[smooth] = (self.avg_gain[smooth] * (p - 1) + gain[smooth]) / p
+        self.avg_loss[smooth] = (self.avg_loss[smooth] * (p - 1) + loss[smooth]) / p
+        self.prev_close[rows] = close[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(self.avg_loss == 0, 100.0,
+                           np.where(self.avg_gain == 0, 0.0, 100 - 100 / (1 + self.avg_gain / self.avg_loss)))
+        rsi = _masked(rsi, has_delta & (self.deltas >= p))
+
+        # Mom
+        self.mom.push(close, rows)
+        mom = _masked(close - self.mom.oldest(), has_bar & self.mom.full())
+
+        # Stoch K/D
+        self.highs.push(high, rows)
+        self.lows.push(low, rows)
+        stoch_ready = has_bar & self.highs.full()
+        hh = self.highs.values.max(axis=1)
+        ll = self.lows.values.min(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            raw_k = np.where(hh - ll != 0, 100 * (close - ll) / (hh - ll), np.nan)
+        k_rows = np.flatnonzero(stoch_ready)
+        self.raw_k.push(raw_k, k_rows)
+        k_ready = stoch_ready & self.raw_k.full()
+        k = _masked(self.raw_k.values.mean(axis=1), k_ready)
+        self.k.push(k, np.flatnonzero(k_ready))
+        d = _masked(self.k.values.mean(axis=1), k_ready & self.k.full())
+
+        # CCI20 (hlc3, desvío medio absoluto)
+        self.tp.push((high + low + close) / 3, rows)
+        tp_mean = self.tp.values.mean(axis=1)
+        mean_dev = np.abs(self.tp.values - tp_mean[:, None]).mean(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cci = np.where(mean_dev != 0, ((high + low + close) / 3 - tp_mean) / (0.015 * mean_dev), np.nan)
+        cci = _masked(cci, has_bar & self.tp.full())
+
+        # AO (SMA5 - SMA34 de hl2)
+        hl2 = (high + low) / 2
+        self.hl2_fast.push(hl2, rows)
+        self.hl2_slow.push(hl2, rows)
+        ao = _masked(self.hl2_fast.values.mean(axis=1) - self.hl2_slow.values.mean(axis=1),
+                     has_bar & self.hl2_slow.full())
+
+        step = {"RSI": rsi, "Stoch.K": k, "Stoch.D": d, "Mom": mom, "CCI20": cci, "AO": ao}
+        for name, values in step.items():
+            self.latest[name][rows] = values[rows]
+        return step
+
+    def snapshot(self) -> pd.DataFrame:
+        """Último valor conocido de cada indicador por símbolo (mismas columnas que TradingView)."""
+        return pd.DataFrame({name: self.latest[name] for name in INDICATORS}, index=pd.Index(self.symbols, name="symbol"))
+
+    # --- MODO LOTE ---
+    @classmethod
+    def from_history(cls, high: pd.DataFrame, low: pd.DataFrame, close: pd.DataFrame, rsi_period: int = RSI_PERIOD):
+        """
+        Recorre matrices tiempo x símbolo (mismas filas y columnas) y devuelve
+        (engine listo para seguir en modo incremental, {indicador: DataFrame tiempo x símbolo}).
+        """
+        high, low = high.reindex_like(close), low.reindex_like(close)
+        engine = cls(list(close.columns), rsi_period=rsi_period)
+        h, l, c = high.to_numpy(dtype=float), low.to_numpy(dtype=float), close.to_numpy(dtype=float)
+        out = {name: np.full(c.shape, np.nan) for name in INDICATORS}
+        for t in range(c.shape[0]):
+            step = engine.update(h[t], l[t], c[t])
+            for name in INDICATORS:
+                out[name][t] = step[name]
+        frames = {name: pd.DataFrame(values, index=close.index, columns=engine.symbols) for name, values in out.items()}
+        return engine, frames
+
+
+def compute_indicators(high: pd.DataFrame, low: pd.DataFrame, close: pd.DataFrame) -> dict:
+    """Historial completo de cada indicador: {indicador: DataFrame tiempo x símbolo}."""
+    return IndicatorEngine.from_history(high, low, close)[1]
+
+
+def indicators_from_store(symbols: list, interval: str = "1d", start=None, store=None):
+    """
+    Arma el motor desde el historial local (BarStore) y devuelve (engine, snapshot),
+    listo para seguir con engine.update() cuando llegue la próxima vela.
+    """
+    from BarStore import bar_store
+
+    store = store or bar_store
+    bars = store.read_matrices(symbols, interval, ["high", "low", "close"], start=start)
+    if bars["close"].empty:
+        engine = IndicatorEngine(symbols)
+        return engine, engine.snapshot()
+    engine, _ = IndicatorEngine.from_history(bars["high"], bars["low"], bars["close"])
+    return engine, engine.snapshot()
@@ -0,0 +1,91 @@
+# LiveFeed.py
+"""
+Canal de novedades en vivo para el Dashboard y el Portafolio (Server-Sent Events).
+
+Los jobs de fondo (ciclo de análisis, mark-to-market) corren en threads del scheduler
+y publican eventos chicos (diffs) acá; cada navegador conectado a /stream tiene su
+propia cola asyncio y recibe solo lo nuevo, sin volver a renderizar la página.
+
+Cada evento lleva un id incremental: si el navegador se reconecta con 'Last-Event-ID'
+le reenviamos lo que se perdió (mientras siga en el buffer).
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+from config import LIVE_FEED_BUFFER, LIVE_FEED_QUEUE_SIZE
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def sse_format(event: dict) -> str:
+    """Evento -> bloque de texto SSE ('id', 'event', 'data')."""
+    data = json.dumps(event["data"], default=_json_default, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+class LiveFeed:
+    def __init__(self, buffer_size: int = LIVE_FEED_BUFFER, queue_size: int = LIVE_FEED_QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._subscribers = []          # [(loop, queue)]
+        self._buffer = deque(maxlen=buffer_size)
+        self._queue_size = queue_size
+        self._last_id = 0
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict):
+        # Cliente lento: descartamos lo más viejo antes que bloquear al publicador
+        if queue.full():
+            try: queue.get_nowait()
+            except asyncio.QueueEmpty: pass
+        queue.put_nowait(event)
+
+    def publish(self, event_type: str, data: dict) -> int:
+        """Publica un evento a todos los suscriptores. Se puede llamar desde cualquier thread."""
+        with self._lock:
+            self._last_id += 1
+            event = {"id": self._last_id, "event": event_type, "data": data}
+            self._buffer.append(event)
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # El loop de ese cliente ya se cerró
+                self.unsubscribe(queue)
+        return event["id"]
+
+    def publish_many(self, event_type: str, items: list):
+        for data in items:
+            self.publish(event_type, data)
+
+    def subscribe(self, last_event_id: int = None) -> asyncio.Queue:
+        """Crea la cola del cliente (llamar desde el event loop) y le carga lo que se perdió."""
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+            if last_event_id is not None:
+                for event in self._buffer:
+                    if event["id"] > last_event_id:
+                        self._offer(queue, event)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [(loop, q) for loop, q in self._subscribers if q is not queue]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "last_event_id": self._last_id,
+                    "buffered": len(self._buffer)}
+
+
+# Instancia compartida del proceso
+live_feed = LiveFeed()
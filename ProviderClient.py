@@ -0,0 +1,102 @@
+# ProviderClient.py
+"""
+Capa HTTP compartida para todos los proveedores (TradingView, Binance, CoinMarketCap,
+alternative.me, Telegram).
+
+Una sesión keep-alive por host (sin handshake TCP+TLS en cada llamada), pool
+dimensionado por host, timeout por defecto, reintentos con jitter SOLO para GETs
+(idempotentes) y negociación gzip.
+
+Con UPSTREAM_MODE=record cada respuesta se graba como cassette, y con UPSTREAM_MODE=replay
+todas las llamadas van al stand-in local (ver UpstreamReplay.py).
+"""
+import inspect
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_TIMEOUT, HTTP_RETRIES, HTTP_POOL_DEFAULT, HTTP_POOL_SIZES, UPSTREAM_MODE
+from UpstreamReplay import recorder, replay_url, install_urllib_hooks
+
+# backoff_jitter existe desde urllib3 2.0; con 1.26 (pins viejos de requests) se reintenta sin jitter
+_RETRY_HAS_JITTER = "backoff_jitter" in inspect.signature(Retry.__init__).parameters
+
+
+class ProviderSession(requests.Session):
+    """requests.Session con timeout por defecto (requests no lo trae)."""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        if UPSTREAM_MODE == "replay":
+            url = replay_url(url)
+        response = super().request(method, url, **kwargs)
+        if UPSTREAM_MODE == "record":
+            recorder.record_response(response)
+        return response
+
+
+def build_session(pool_size: int = HTTP_POOL_DEFAULT, retries: int = HTTP_RETRIES, timeout: float = HTTP_TIMEOUT) -> ProviderSession:
+    """Arma una sesión con pool keep-alive y política de reintentos."""
+    jitter = {"backoff_jitter": 0.3} if _RETRY_HAS_JITTER else {}   # Evita que todos los workers reintenten a la vez
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),  # POST no se reintenta (no es idempotente)
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        **jitter,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+    session = ProviderSession(timeout=timeout)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+_sessions = {}
+_lock = threading.Lock()
+
+# GoogleNews no usa requests: su urllib pasa por el mismo record/replay
+install_urllib_hooks()
+
+
+def get_session(url_or_host: str) -> ProviderSession:
+    """Devuelve (creando si hace falta) la sesión compartida del host."""
+    host = urlsplit(url_or_host).hostname if "://" in url_or_host else url_or_host
+    session = _sessions.get(host)
+    if session is None:
+        with _lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = build_session(pool_size=HTTP_POOL_SIZES.get(host, HTTP_POOL_DEFAULT))
+                _sessions[host] = session
+    return session
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return get_session(url).get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return get_session(url).post(url, **kwargs)
+
+
+def close_sessions():
+    """Cierra todas las conexiones (apagado del servidor)."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
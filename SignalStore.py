@@ -0,0 +1,88 @@
+# SignalStore.py
+"""
+Persistencia en lote de las señales de un ciclo.
+
+En vez de crear un objeto ORM por señal (db.add uno por uno + flush por objeto),
+armamos los parámetros de todas las filas y las insertamos con UN solo INSERT
+por lotes (executemany) dentro de UNA transacción.
+
+Lo que se devuelve son filas livianas (namedtuple) con los mismos atributos que
+el modelo: sirven igual para el reporte de Telegram, el live feed y los schemas
+de respuesta (from_attributes), sin identity map ni carga perezosa.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from modelsTables import CryptoSignal, StockSignal
+
+
+def _columns(model) -> list:
+    return [column.name for column in model.__table__.columns]
+
+
+CryptoSignalRow = namedtuple("CryptoSignalRow", _columns(CryptoSignal))
+StockSignalRow = namedtuple("StockSignalRow", _columns(StockSignal))
+
+# Cripto usa su tabla; Stock y Merval comparten StockSignal
+_TARGETS = {
+    "CRYPTO": (CryptoSignal, CryptoSignalRow),
+}
+_DEFAULT_TARGET = (StockSignal, StockSignalRow)
+
+
+def signal_params(market_type: str, opportunities: list, analyses: list, decisions: list = None, detected_at: datetime = None) -> list:
+    """
+    Oportunidad + análisis IA -> dict de columnas listo para el INSERT.
+    decisions: si se indica, solo se incluyen esas decisiones IA.
+    """
+    detected_at = detected_at or datetime.utcnow()
+    is_crypto = market_type == "CRYPTO"
+    params = []
+    for op, ai_analysis in zip(opportunities, analyses):
+        if decisions is not None and ai_analysis.get('decision') not in decisions:
+            continue
+        row = {
+            "symbol": op['symbol'],
+            "price": op['price'],
+            "rsi": op['rsi'],
+            "technical_signal": op['technical_signal'],
+            "ai_score": ai_analysis.get('score'),
+            "ai_decision": ai_analysis.get('decision'),
+            "ai_reason": ai_analysis.get('reason'),
+            "detected_at": detected_at,
+        }
+        if is_crypto:
+            row["name"] = op['name']
+            row["percent_change_24h"] = op['percent_change'] # Ojo: unificamos a percent_change en el scanner
+        else:
+            row["market"] = market_type
+            row["percent_change"] = op['percent_change']
+        params.append(row)
+    return params
+
+
+def bulk_save_signals(db, market_type: str, opportunities: list, analyses: list, decisions: list = None) -> list:
+    """
+    Inserta todas las señales del ciclo en una transacción y devuelve filas livianas
+    (con su id y detected_at) en el mismo orden de entrada.
+    """
+    model, row_type = _TARGETS.get(market_type, _DEFAULT_TARGET)
+    params = signal_params(market_type, opportunities, analyses, decisions)
+    if not params:
+        return []
+
+    try:
+        # RETURNING en lote, en el orden de los parámetros (insertmanyvalues de SQLAlchemy 2)
+        ids = db.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), params
+        ).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    fields = row_type._fields
+    return [row_type(**{f: (new_id if f == "id" else row.get(f)) for f in fields})
+            for new_id, row in zip(ids, params)]
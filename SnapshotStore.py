@@ -0,0 +1,127 @@
+# SnapshotStore.py
+"""
+Snapshots columnares (Parquet comprimido) de cada escaneo.
+
+Estructura en disco (particionado por mercado y fecha, estilo Hive):
+    SNAPSHOT_DIR/market=USA/date=2026-01-15/raw_20260115T130000Z.parquet
+
+Así el análisis histórico es una lectura local en vez de volver a scrapear TradingView.
+"""
+import os
+import re
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from config import SNAPSHOT_DIR, SNAPSHOT_COMPRESSION
+
+_TS_FORMAT = "%Y%m%dT%H%M%S%fZ"
+_FILE_RE = re.compile(r"^(?P<kind>[A-Za-z0-9_]+)_(?P<ts>\d{8}T\d{12}Z)\.parquet$")
+
+
+def _market_dir(market: str, base_dir: str = None) -> str:
+    return os.path.join(base_dir or SNAPSHOT_DIR, f"market={market.upper()}")
+
+
+def _to_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    TradingView a veces mezcla tipos en una misma columna (ej: número y texto).
+    Parquet exige un tipo por columna: esas columnas se guardan como texto.
+    """
+    import pyarrow as pa
+
+    fixed = None
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if fixed is None:
+                fixed = df.copy()
+            fixed[col] = df[col].map(lambda v: v if v is None or (isinstance(v, float) and pd.isna(v)) else str(v))
+    return df if fixed is None else fixed
+
+
+def save_snapshot(df: pd.DataFrame, market: str, kind: str = "raw", ts: datetime = None, base_dir: str = None) -> str:
+    """Guarda el DataFrame como Parquet comprimido y devuelve la ruta. No guarda DataFrames vacíos."""
+    if df is None or df.empty:
+        return None
+
+    ts = _to_utc(ts or datetime.now(timezone.utc))
+    folder = os.path.join(_market_dir(market, base_dir), f"date={ts.strftime('%Y-%m-%d')}")
+    os.makedirs(folder, exist_ok=True)
+
+    path = os.path.join(folder, f"{kind}_{ts.strftime(_TS_FORMAT)}.parquet")
+    tmp_path = path + ".tmp"
+    # Escribimos a un temporal y renombramos: nunca queda un snapshot a medio escribir
+    _arrow_safe(df).to_parquet(tmp_path, engine="pyarrow", compression=SNAPSHOT_COMPRESSION, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def list_snapshots(market: str, kind: str = "raw", date: str = None, base_dir: str = None) -> list:
+    """
+    Lista [(timestamp, ruta)] ordenada de más vieja a más nueva.
+    date: 'YYYY-MM-DD' para limitar a un día.
+    """
+    root = _market_dir(market, base_dir)
+    if not os.path.isdir(root):
+        return []
+
+    days = [f"date={date}"] if date else sorted(os.listdir(root))
+    snapshots = []
+    for day in days:
+        folder = os.path.join(root, day)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            match = _FILE_RE.match(name)
+            if match and match.group("kind") == kind:
+                ts = datetime.strptime(match.group("ts"), _TS_FORMAT).replace(tzinfo=timezone.utc)
+                snapshots.append((ts, os.path.join(folder, name)))
+    snapshots.sort(key=lambda item: item[0])
+    return snapshots
+
+
+def load_snapshot(market: str, at: datetime = None, kind: str = "raw", columns: list = None, base_dir: str = None) -> pd.DataFrame:
+    """
+    Carga el snapshot más reciente tomado en o antes de 'at' (o el último si at=None).
+    columns: lee solo esas columnas (ventaja del formato columnar).
+    Devuelve un DataFrame vacío si no hay snapshots.
+    """
+    snapshots = list_snapshots(market, kind=kind, base_dir=base_dir)
+    if at is not None:
+        at = _to_utc(at)
+        snapshots = [item for item in snapshots if item[0] <= at]
+    if not snapshots:
+        return pd.DataFrame()
+
+    ts, path = snapshots[-1]
+    df = pd.read_parquet(path, engine="pyarrow", columns=columns)
+    df.attrs["snapshot_at"] = ts
+    df.attrs["snapshot_path"] = path
+    return df
+
+
+def load_latest(market: str, kind: str = "raw", columns: list = None, base_dir: str = None) -> pd.DataFrame:
+    return load_snapshot(market, at=None, kind=kind, columns=columns, base_dir=base_dir)
+
+
+def load_range(market: str, start: datetime, end: datetime = None, kind: str = "raw", columns: list = None, base_dir: str = None) -> pd.DataFrame:
+    """Concatena todos los snapshots entre start y end, con una columna 'snapshot_at'."""
+    start = _to_utc(start)
+    end = _to_utc(end) if end else datetime.now(timezone.utc)
+    frames = []
+    for ts, path in list_snapshots(market, kind=kind, base_dir=base_dir):
+        if start <= ts <= end:
+            df = pd.read_parquet(path, engine="pyarrow", columns=columns)
+            df["snapshot_at"] = ts
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
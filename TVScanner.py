@@ -0,0 +1,125 @@
+# TVScanner.py
+"""
+Descarga fragmentada (sharded) del scanner de TradingView.
+
+Un escaneo grande ("range": [0, 1000] sobre 14 mercados) llega como UNA respuesta
+gigante y en serie. Acá lo partimos en fragmentos que se piden en paralelo (concurrencia
+acotada) y se unen en un solo DataFrame con el mismo mapeo de columnas. Si un fragmento
+falla, el resto se conserva.
+
+Cómo se parte:
+  - Con 'sort' y 'range' (el caso normal: Top N global): SOLO páginas de rango
+    ([0, 250], [250, 500], ...) sobre todos los mercados juntos. El servidor ordena
+    globalmente, así que cada página ya es un tramo de la respuesta original: se piden
+    exactamente end - start filas y 'range' con inicio > 0 sigue siendo esa página.
+  - Sin 'sort' (o split_markets explícito sin orden): un pedido por mercado, paginado.
+    Ojo: cada mercado tiene que traer [0, end) para poder armar [start, end) después,
+    así que viajan hasta mercados x end filas para devolver end - start (con 14 mercados
+    y limit=1000, ~14k filas). Por eso no se usa cuando hay un orden global.
+"""
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from config import SCAN_SHARD_SIZE, SCAN_MAX_WORKERS
+from ProviderClient import http_post
+
+
+def scanner_to_dataframe(json_data: dict, columns: list) -> pd.DataFrame:
+    """JSON del scanner -> DataFrame con nombres de columnas (más '__s', el id 'EXCHANGE:TICKER')."""
+    rows = json_data.get('data') or []
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame([d['d'] for d in rows])
+    if len(df.columns) == len(columns):
+        df.columns = columns
+    elif len(df.columns) < len(columns):
+        # Asignación segura de columnas (igual que scan_coin_market)
+        df.columns = columns[:len(df.columns)]
+    df['__s'] = [d.get('s') for d in rows]
+    return df
+
+
+def splits_by_market(payload: dict, split_markets: bool = True) -> bool:
+    """Un pedido por mercado solo si no hay orden global que se pueda paginar en el servidor."""
+    has_global_order = bool((payload.get("sort") or {}).get("sortBy")) and "range" in payload
+    return split_markets and len(payload.get("markets") or []) > 1 and not has_global_order
+
+
+def build_shards(payload: dict, split_markets: bool = True, shard_size: int = SCAN_SHARD_SIZE) -> list:
+    """Divide un payload en varios: páginas de rango (y por mercado si no hay orden global)."""
+    start, end = payload.get("range", [0, 100])
+    markets = payload.get("markets") or []
+    by_market = splits_by_market(payload, split_markets)
+    market_groups = [[m] for m in markets] if by_market else [markets]
+    # Por mercado, el offset no es global: cada uno trae [0, end) y se recorta después de unir
+    first = 0 if by_market else start
+
+    shards = []
+    for group in market_groups:
+        for page_start in range(first, end, shard_size):
+            shard = copy.deepcopy(payload)
+            shard["markets"] = group
+            shard["range"] = [page_start, min(page_start + shard_size, end)]
+            shards.append(shard)
+    return shards
+
+
+def _fetch_shard(url: str, shard: dict, columns: list, headers: dict, cookies: dict, timeout: float) -> pd.DataFrame:
+    response = http_post(url, headers=headers, cookies=cookies, json=shard, timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}")
+    return scanner_to_dataframe(response.json(), columns)
+
+
+def sharded_scan(url: str, payload: dict, columns: list, headers: dict = None, cookies: dict = None,
+                 split_markets: bool = True, shard_size: int = SCAN_SHARD_SIZE,
+                 max_workers: int = SCAN_MAX_WORKERS, timeout: float = 10) -> pd.DataFrame:
+    """
+    Ejecuta el escaneo en fragmentos paralelos y devuelve un único DataFrame.
+    df.attrs['failed_shards'] indica cuántos fragmentos fallaron (resultado parcial).
+    """
+    shards = build_shards(payload, split_markets=split_markets, shard_size=shard_size)
+    workers = max(1, min(max_workers, len(shards)))
+
+    def run(shard):
+        try:
+            return _fetch_shard(url, shard, columns, headers, cookies, timeout)
+        except Exception as e:
+            print(f"⚠️ Fragmento TV falló ({shard['markets']} {shard['range']}): {e}")
+            return None
+
+    if len(shards) == 1:
+        results = [run(shards[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tv-shard") as executor:
+            results = list(executor.map(run, shards))
+
+    failed = sum(1 for r in results if r is None)
+    frames = [r for r in results if r is not None and not r.empty]
+    if failed:
+        print(f"⚠️ Escaneo parcial: {failed}/{len(shards)} fragmentos fallaron")
+    if not frames:
+        df = pd.DataFrame()
+        df.attrs['failed_shards'] = failed
+        return df
+
+    df = pd.concat(frames, ignore_index=True)
+    # Las páginas se piden en momentos distintos: una fila puede aparecer en dos
+    df = df[~(df['__s'].notna() & df['__s'].duplicated(keep='first'))]
+
+    # Por mercado: reordenar como lo hubiera hecho el servidor y recortar [start, end).
+    # Las páginas globales ya llegan en orden (concat respeta el orden de los fragmentos).
+    if splits_by_market(payload, split_markets):
+        sort = payload.get("sort") or {}
+        sort_col = sort.get("sortBy")
+        if sort_col in df.columns:
+            df = df.sort_values(sort_col, ascending=sort.get("sortOrder", "asc") == "asc",
+                                na_position='last', kind='stable')
+        start, end = payload.get("range", [0, len(df)])
+        df = df.iloc[start:end]
+
+    df = df.drop(columns=['__s']).reset_index(drop=True)
+    df.attrs['failed_shards'] = failed
+    return df
@@ -0,0 +1,243 @@
+# TelegramOutbox.py
+"""
+Cola de salida de Telegram: nadie espera a Telegram.
+
+Notifier.send_telegram_alert() solo encola (no bloquea al endpoint ni al ciclo de escaneo);
+un thread de fondo envía respetando los límites de la API de bots:
+  - Token bucket por chat (~1 msg/s, ráfagas cortas), otro para grupos (20 msg/min)
+    y uno global del bot (30 msg/s).
+  - Coalescing: lo que llega dentro de TELEGRAM_COALESCE_SECONDS para el mismo chat
+    se junta en un solo mensaje (digest), así una ráfaga no se come el límite.
+  - Split: nada pasa de 4096 caracteres (se corta en saltos de línea).
+  - 429 -> espera 'retry_after'; 5xx / red -> reintento con backoff; Markdown inválido
+    -> se reenvía como texto plano (antes se perdía en silencio).
+"""
+import threading
+import time
+from collections import deque
+
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_MAX_CHARS, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST,
+    TELEGRAM_GROUP_PER_MINUTE, TELEGRAM_GLOBAL_RATE, TELEGRAM_COALESCE_SECONDS, TELEGRAM_QUEUE_MAX,
+    TELEGRAM_MAX_ATTEMPTS
+)
+from ProviderClient import http_post
+
+DIGEST_SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """'rate' tokens por segundo, hasta 'capacity' acumulados."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Toma un token y devuelve cuántos segundos hay que esperar para usarlo (0 si ya está)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_CHARS) -> list:
+    """Corta en partes <= limit, preferentemente en un salto de línea (después en un espacio)."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip("\n ")
+    if text:
+        parts.append(text)
+    return parts
+
+
+def pack_messages(texts: list, limit: int = TELEGRAM_MAX_CHARS) -> list:
+    """Junta varios avisos en la menor cantidad de mensajes <= limit (sin partir un aviso si entra entero)."""
+    packed = []
+    for text in texts:
+        for piece in split_message(text, limit):
+            if packed and len(packed[-1]) + len(DIGEST_SEPARATOR) + len(piece) <= limit:
+                packed[-1] += DIGEST_SEPARATOR + piece
+            else:
+                packed.append(piece)
+    return packed
+
+
+class TelegramOutbox:
+    def __init__(self, token: str = TELEGRAM_BOT_TOKEN, max_chars: int = TELEGRAM_MAX_CHARS,
+                 coalesce_seconds: float = TELEGRAM_COALESCE_SECONDS, queue_max: int = TELEGRAM_QUEUE_MAX,
+                 max_attempts: int = TELEGRAM_MAX_ATTEMPTS):
+        self.token = token
+        self.max_chars = max_chars
+        self.coalesce_seconds = coalesce_seconds
+        self.max_attempts = max_attempts
+        self._pending = deque(maxlen=queue_max)   # [{chat_id, text, enqueued}]
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._sending = False
+        self._chat_buckets = {}
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self._stats = {"enqueued": 0, "sent": 0, "digests": 0, "splits": 0, "dropped": 0,
+                       "retries": 0, "failed": 0, "plain_text_fallbacks": 0, "last_error": None}
+
+    # --- API (cualquier thread, no bloquea) ---
+    def enqueue(self, text: str, chat_id=TELEGRAM_CHAT_ID) -> bool:
+        if not text:
+            return False
+        with self._cond:
+            if len(self._pending) == self._pending.maxlen:
+                self._stats["dropped"] += 1   # La deque descarta el más viejo
+            self._pending.append({"chat_id": str(chat_id), "text": text, "enqueued": time.monotonic()})
+            self._stats["enqueued"] += 1
+            self._cond.notify()
+        self.start()
+        return True
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="telegram-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Apagado: manda lo pendiente (sin esperar la ventana de coalescing) hasta 'timeout'."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self, timeout: float = 30) -> bool:
+        """Espera a que la cola quede vacía (scripts y pruebas)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify()
+            while self._pending or self._sending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.1))
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self._stats, "pending": len(self._pending),
+                    "running": self._thread is not None and self._thread.is_alive()}
+
+    # --- Sender de fondo ---
+    def _next_batch(self):
+        """Bloquea hasta que haya un lote listo: todos los pendientes del chat del aviso más viejo."""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    if self._stopping:
+                        return None
+                    self._cond.wait()
+                    continue
+                wait = self._pending[0]["enqueued"] + self.coalesce_seconds - time.monotonic()
+                if wait > 0 and not self._stopping:
+                    self._cond.wait(wait)
+                    continue
+                chat_id = self._pending[0]["chat_id"]
+                batch = [item for item in self._pending if item["chat_id"] == chat_id]
+                rest = [item for item in self._pending if item["chat_id"] != chat_id]
+                self._pending.clear()
+                self._pending.extend(rest)
+                self._sending = True
+                return chat_id, [item["text"] for item in batch]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            chat_id, texts = batch
+            try:
+                parts = pack_messages(texts, self.max_chars)
+                with self._cond:
+                    if len(texts) > 1:
+                        self._stats["digests"] += 1
+                    self._stats["splits"] += sum(1 for text in texts if len(text) > self.max_chars)
+                for part in parts:
+                    self._deliver(chat_id, part)
+            except Exception as e:
+                print(f"⚠️ Cola Telegram: {e}")
+            finally:
+                with self._cond:
+                    self._sending = False
+                    self._cond.notify_all()
+
+    def _wait_for_slot(self, chat_id: str):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Grupos (id negativo): 20 mensajes por minuto; chats privados: ~1 por segundo
+            bucket = self._chat_buckets[chat_id] = (
+                TokenBucket(TELEGRAM_GROUP_PER_MINUTE / 60, 1) if chat_id.startswith("-")
+                else TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+            )
+        delay = max(bucket.reserve(), self._global_bucket.reserve())
+        if delay > 0:
+            time.sleep(delay)
+
+    def _deliver(self, chat_id: str, text: str):
+        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": "Markdown"}
+        for attempt in range(1, self.max_attempts + 1):
+            self._wait_for_slot(chat_id)
+            try:
+                r = http_post(url, json=payload, timeout=10)
+            except Exception as e:
+                error, retry_after = str(e), min(2 ** attempt, 30)
+            else:
+                if r.status_code == 200:
+                    with self._cond:
+                        self._stats["sent"] += 1
+                    return True
+                body = self._json(r)
+                error = f"HTTP {r.status_code}: {body.get('description', '')}"
+                if r.status_code == 400 and "parse" in body.get("description", "") and "parse_mode" in payload:
+                    # Markdown roto (ej: un '_' suelto o un corte en medio de un '**'): va como texto plano
+                    payload.pop("parse_mode")
+                    with self._cond:
+                        self._stats["plain_text_fallbacks"] += 1
+                    continue
+                if r.status_code == 429:
+                    retry_after = float((body.get("parameters") or {}).get("retry_after", 1))
+                elif r.status_code >= 500:
+                    retry_after = min(2 ** attempt, 30)
+                else:
+                    break   # 400/401/403: reintentar no sirve
+            with self._cond:
+                self._stats["retries"] += 1
+                self._stats["last_error"] = error
+            time.sleep(retry_after)
+
+        with self._cond:
+            self._stats["failed"] += 1
+            self._stats["last_error"] = error
+        print(f"❌ Telegram: no se pudo enviar ({error})")
+        return False
+
+    @staticmethod
+    def _json(response) -> dict:
+        try:
+            body = response.json()
+            return body if isinstance(body, dict) else {}
+        except ValueError:
+            return {}
+
+
+# Instancia compartida por todo el proceso
+telegram_outbox = TelegramOutbox()
@@ -0,0 +1,597 @@
+# UpstreamReplay.py
+"""
+Record / replay de los proveedores externos (TradingView, Binance, CoinMarketCap,
+alternative.me, Telegram, GoogleNews y Gemini), para correr el pipeline sin red.
+
+Modos (UPSTREAM_MODE):
+  - live:   APIs reales (por defecto).
+  - record: APIs reales, y cada respuesta se guarda como cassette en CASSETTE_DIR/<host>.jsonl.
+  - replay: todo apunta al stand-in local (REPLAY_URL): ProviderClient reescribe las URLs,
+            GoogleNews (urllib) pasa por un handler propio y Gemini usa un cliente REST liviano.
+
+Stand-in: un servidor HTTP multi-hilo que responde desde los cassettes, con latencia
+y errores inyectables (por host). Lo que no está grabado se sintetiza de forma determinística:
+  - TradingView: el universo grabado (o los fixtures de benchmarks/) filtrado y ordenado según el payload.
+  - Gemini: un "analista" falso (misma respuesta para el mismo ticker, formato JSON válido).
+  - GoogleNews, Telegram, Binance (ticker/price) y alternative.me (fng).
+Yahoo no pasa por acá: yfinance trae su propio transporte, así que en replay se saltea
+y los precios salen de Binance / CoinMarketCap.
+
+Uso:
+    python UpstreamReplay.py serve --latency-ms 120 --jitter-ms 40 --error-rate 0.02
+    UPSTREAM_MODE=replay TELEGRAM_BOT_TOKEN=x TELEGRAM_CHAT_ID=1 python main.py
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.request
+import urllib.response
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, parse_qsl, unquote_plus, urlencode, urlsplit
+
+from config import (
+    UPSTREAM_MODE, CASSETTE_DIR, REPLAY_URL, REPLAY_LATENCY_MS, REPLAY_JITTER_MS,
+    REPLAY_ERROR_RATE, REPLAY_ERROR_STATUS
+)
+
+SCANNER_HOST = "scanner.tradingview.com"
+GEMINI_HOST = "generativelanguage.googleapis.com"
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "fixtures")
+# Universo por defecto del scanner si no hay cassettes grabados
+SCANNER_FIXTURES = {"/global/scan": "tv_global_scan.json.gz", "/coin/scan": "tv_coin_scan.json.gz"}
+# Mercados de TradingView -> prefijo del id 'EXCHANGE:TICKER'
+MARKET_EXCHANGES = {
+    "america": {"NASDAQ", "NYSE", "AMEX", "OTC", "NYSE ARCA", "CBOE", "BATS"},
+    "argentina": {"BCBA"},
+    "brazil": {"BMFBOVESPA"},
+    "mexico": {"BMV"},
+}
+# Operaciones de filtro del scanner que entiende el stand-in (el resto se ignora)
+FILTER_OPS = {
+    "eless": lambda s, v: s <= v, "less": lambda s, v: s < v,
+    "egreater": lambda s, v: s >= v, "greater": lambda s, v: s > v,
+}
+
+
+# =========================================================================
+# CLAVES DE PEDIDOS
+# =========================================================================
+def split_url(url: str):
+    """URL -> (host, path sin secretos, query)."""
+    parts = urlsplit(url)
+    return parts.hostname or "", scrub_path(parts.path or "/"), parts.query
+
+
+def scrub_path(path: str) -> str:
+    """El token de Telegram viaja en el path: no se graba ni forma parte de la clave."""
+    return re.sub(r"/bot[^/]+/", "/bot<TOKEN>/", path)
+
+
+def canonical_body(body) -> str:
+    """Cuerpo comparable: JSON con claves ordenadas (o el texto tal cual)."""
+    if body is None:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return str(body)
+
+
+def request_key(method: str, host: str, path: str, query: str, body) -> str:
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    raw = f"{method.upper()} {host}{scrub_path(path)}?{query}\n{canonical_body(body)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def replay_url(url: str) -> str:
+    """https://host/path?q -> REPLAY_URL/host/path?q (el stand-in enruta por el primer segmento)."""
+    if url.startswith(REPLAY_URL):
+        return url
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{REPLAY_URL.rstrip('/')}/{parts.hostname}{parts.path or '/'}{query}"
+
+
+# =========================================================================
+# GRABACIÓN (modo record)
+# =========================================================================
+class CassetteRecorder:
+    """Agrega cada intercambio a CASSETTE_DIR/<host>.jsonl (sin headers: ahí viajan las API keys)."""
+
+    def __init__(self, directory: str = CASSETTE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def record(self, method: str, url: str, body, status: int, content_type: str, text: str):
+        host, path, query = split_url(url)
+        entry = {
+            "method": method.upper(), "host": host, "path": path, "query": query,
+            "body": canonical_body(body), "status": status, "content_type": content_type,
+            "response": text, "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{host}.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def record_response(self, response):
+        """Respuesta de requests (ProviderClient)."""
+        request = response.request
+        if request.url.startswith(REPLAY_URL):
+            return
+        self.record(request.method, request.url, request.body, response.status_code,
+                    response.headers.get("Content-Type", ""), response.text)
+
+
+recorder = CassetteRecorder()
+
+
+def load_cassettes(directory: str = CASSETTE_DIR) -> list:
+    entries = []
+    if not os.path.isdir(directory):
+        return entries
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    return entries
+
+
+# =========================================================================
+# GOOGLENEWS (urllib)
+# =========================================================================
+class _UrllibHook(urllib.request.BaseHandler):
+    """GoogleNews usa urllib.urlopen: en replay lo desviamos al stand-in, en record grabamos."""
+    handler_order = 100  # Antes que HTTPSHandler
+
+    def __init__(self):
+        self._direct = urllib.request.build_opener()
+
+    def https_open(self, req):
+        if UPSTREAM_MODE != "replay":
+            return None
+        local = urllib.request.Request(replay_url(req.full_url), data=req.data,
+                                       headers=dict(req.header_items()), method=req.get_method())
+        return self._direct.open(local, timeout=req.timeout)
+
+    def https_response(self, req, response):
+        if UPSTREAM_MODE != "record":
+            return response
+        body = response.read()
+        recorder.record(req.get_method(), req.full_url, req.data, response.status,
+                        response.headers.get_content_type(), body.decode("utf-8", "replace"))
+        return urllib.response.addinfourl(io.BytesIO(body), response.headers, response.url, response.status)
+
+
+def install_urllib_hooks():
+    if UPSTREAM_MODE in ("record", "replay"):
+        urllib.request.install_opener(urllib.request.build_opener(_UrllibHook()))
+
+
+# =========================================================================
+# GEMINI
+# =========================================================================
+def gemini_url(model_name: str) -> str:
+    return f"https://{GEMINI_HOST}/v1beta/models/{model_name}:generateContent"
+
+
+def gemini_request(prompt: str, generation_config: dict = None) -> dict:
+    """Cuerpo REST de generateContent (generation_config en snake_case, como lo recibe el SDK)."""
+    body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if generation_config:
+        body["generationConfig"] = {re.sub(r"_(\w)", lambda m: m.group(1).upper(), key): value
+                                    for key, value in generation_config.items()}
+    return body
+
+
+def gemini_response(text: str, prompt_tokens: int = 0, output_tokens: int = 0) -> dict:
+    """Respuesta con el formato REST de generateContent."""
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                          "totalTokenCount": prompt_tokens + output_tokens},
+    }
+
+
+class GeminiReply:
+    """Lo mínimo que usa NewsIntel de la respuesta del SDK: .text y .usage_metadata."""
+
+    def __init__(self, body: dict):
+        parts = body["candidates"][0]["content"]["parts"]
+        self.text = "".join(part.get("text", "") for part in parts)
+        usage = body.get("usageMetadata") or {}
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=usage.get("promptTokenCount", 0),
+            candidates_token_count=usage.get("candidatesTokenCount", 0),
+            total_token_count=usage.get("totalTokenCount", 0),
+        )
+
+
+class StandInGeminiModel:
+    """Cliente REST contra el stand-in (pasa por ProviderClient: latencia y errores inyectados incluidos)."""
+
+    def __init__(self, model_name: str, timeout: float = 60):
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def generate_content(self, prompt: str, **kwargs) -> GeminiReply:
+        from ProviderClient import http_post
+
+        r = http_post(gemini_url(self.model_name), json=gemini_request(prompt, kwargs.get("generation_config")),
+                      timeout=self.timeout)
+        r.raise_for_status()
+        return GeminiReply(r.json())
+
+
+class RecordingGeminiModel:
+    """Envuelve el modelo real del SDK y graba cada respuesta como si fuera la llamada REST."""
+
+    def __init__(self, model, model_name: str):
+        self._model = model
+        self.model_name = model_name
+
+    def generate_content(self, prompt: str, **kwargs):
+        response = self._model.generate_content(prompt, **kwargs)
+        usage = getattr(response, "usage_metadata", None)
+        body = gemini_response(response.text, getattr(usage, "prompt_token_count", 0),
+                               getattr(usage, "candidates_token_count", 0))
+        request = gemini_request(prompt, kwargs.get("generation_config"))
+        recorder.record("POST", gemini_url(self.model_name), json.dumps(request), 200,
+                        "application/json", json.dumps(body, ensure_ascii=False))
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def gemini_model(model_name: str):
+    """Modelo de Gemini según UPSTREAM_MODE (SDK real, SDK + grabación, o stand-in)."""
+    if UPSTREAM_MODE == "replay":
+        return StandInGeminiModel(model_name)
+    import google.generativeai as genai
+
+    model = genai.GenerativeModel(model_name)
+    return RecordingGeminiModel(model, model_name) if UPSTREAM_MODE == "record" else model
+
+
+def _stable_int(*parts) -> int:
+    return int(hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def fake_analysis(ticker: str) -> dict:
+    """Mismo ticker -> misma respuesta (la corrida es reproducible)."""
+    score = _stable_int("gemini", ticker.upper()) % 101
+    decision = "BUY" if score >= 65 else "WAIT" if score <= 35 else "NEUTRAL"
+    return {"score": score, "decision": decision, "reason": f"Respuesta simulada: sentimiento {score}/100 para {ticker}."}
+
+
+def fake_gemini_text(prompt: str) -> str:
+    """Responde los prompts de NewsIntel: batch ('[n] Ticker: X') o individual ('Ticker: X')."""
+    batch = re.findall(r"^\s*\[(\d+)\] Ticker: ([^\s|]+)", prompt, re.M)
+    if batch:
+        return json.dumps([{"id": int(idx), "ticker": ticker, **fake_analysis(ticker)} for idx, ticker in batch],
+                          ensure_ascii=False)
+    match = re.search(r"Ticker: ([^\s|]+)", prompt)
+    return json.dumps(fake_analysis(match.group(1) if match else "?"), ensure_ascii=False)
+
+
+# =========================================================================
+# TRADINGVIEW (universo grabado)
+# =========================================================================
+def scanner_table(bodies: list):
+    """Respuestas del scanner ({'columns', 'data'}) -> tabla única (una fila por id 'EXCHANGE:TICKER')."""
+    import pandas as pd
+
+    frames = []
+    for body in bodies:
+        if not body.get("data"):
+            continue
+        frame = pd.DataFrame([row["d"] for row in body["data"]], columns=body["columns"], dtype=object)
+        frame["__s"] = [row["s"] for row in body["data"]]
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["__s"])
+    table = pd.concat(frames, ignore_index=True)
+    return table.drop_duplicates("__s", keep="last").reset_index(drop=True)
+
+
+def _scanner_expressions(payload: dict) -> list:
+    exprs = list(payload.get("filter") or [])
+    for operand in (payload.get("filter2") or {}).get("operands", []):
+        if "expression" in operand:
+            exprs.append(operand["expression"])
+    return exprs
+
+
+def scanner_answer(table, payload: dict, match_markets: bool = True) -> dict:
+    """
+    Lo que respondería el scanner: mercados (por exchange), filtros numéricos, sort y range.
+    Los filtros de tipo (stock / dr / typespecs) se ignoran: el universo grabado ya pasó por ellos.
+    """
+    import pandas as pd
+
+    mask = pd.Series(True, index=table.index)
+    markets = payload.get("markets") or []
+    if match_markets and markets and all(m in MARKET_EXCHANGES for m in markets):
+        exchanges = set().union(*(MARKET_EXCHANGES[m] for m in markets))
+        mask &= table["__s"].astype(str).str.split(":").str[0].isin(exchanges)
+    for expr in _scanner_expressions(payload):
+        op = FILTER_OPS.get(expr.get("operation"))
+        if op is not None and expr.get("left") in table.columns:
+            mask &= op(pd.to_numeric(table[expr["left"]], errors="coerce"), expr["right"]).fillna(False)
+    view = table[mask]
+
+    sort = payload.get("sort") or {}
+    if sort.get("sortBy") in view.columns:
+        key = pd.to_numeric(view[sort["sortBy"]], errors="coerce")
+        view = view.loc[key.sort_values(ascending=sort.get("sortOrder", "asc") == "asc",
+                                        na_position="last", kind="stable").index]
+
+    start, end = payload.get("range", [0, len(view)])
+    page = view.iloc[start:end]
+    values = page.reindex(columns=payload.get("columns") or []).astype(object)
+    values = values.where(values.notna(), None).to_numpy(dtype=object).tolist()
+    return {"totalCount": int(mask.sum()), "data": [{"s": s, "d": d} for s, d in zip(page["__s"], values)]}
+
+
+# =========================================================================
+# STAND-IN
+# =========================================================================
+NEWS_TEMPLATES = [
+    "{q}: analistas revisan sus proyecciones", "{q} extends losses as markets turn cautious",
+    "What's next for {q} after the latest drop", "{q}: volumen en alza y soporte clave",
+    "Investors weigh {q} fundamentals amid volatility", "{q} recupera terreno tras la caída",
+]
+NEWS_MEDIA = ["Reuters", "Bloomberg", "Ámbito", "CoinDesk", "Infobae", "MarketWatch"]
+
+
+def fake_news_page(query: str) -> str:
+    """HTML con la estructura que parsea GoogleNews (c-wiz -> a, time, data-n-tid)."""
+    seed = _stable_int("news", query)
+    articles = []
+    for i in range(5):
+        title = NEWS_TEMPLATES[(seed + i) % len(NEWS_TEMPLATES)].format(q=query)
+        media = NEWS_MEDIA[(seed // 7 + i) % len(NEWS_MEDIA)]
+        articles.append(
+            f'<c-wiz data-node-index="1;{i}"><a href="./articles/{seed}-{i}"></a>'
+            f'<a href="./articles/{seed}-{i}">{title}</a><div><a>{media}</a>'
+            f'<time datetime="{datetime.utcnow().isoformat()}Z">hace {i + 1} horas</time></div>'
+            f'<div data-n-tid="{i}">{media}</div></c-wiz>'
+        )
+    return f"<html><body>{''.join(articles)}</body></html>"
+
+
+def _parse_overrides(values) -> dict:
+    """['gemini=800', 'telegram=50'] -> {'gemini': 800.0, ...} (el host se compara por substring)."""
+    out = {}
+    for value in values or []:
+        host, _, amount = value.partition("=")
+        out[host.strip()] = float(amount)
+    return out
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, cassette_dir: str = CASSETTE_DIR, latency_ms: float = REPLAY_LATENCY_MS,
+                 jitter_ms: float = REPLAY_JITTER_MS, error_rate: float = REPLAY_ERROR_RATE,
+                 error_status: list = None, host_latency: dict = None, host_error_rate: dict = None,
+                 seed: int = 0):
+        super().__init__(address, StandInHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status or REPLAY_ERROR_STATUS
+        self.host_latency = host_latency or {}
+        self.host_error_rate = host_error_rate or {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": {}, "replayed": 0, "synthetic": 0, "unmatched": 0,
+                      "injected_errors": 0, "telegram_messages": 0}
+        self.load(cassette_dir)
+
+    # --- Datos ---
+    def load(self, cassette_dir: str):
+        self.exact, self.by_path, scanner_bodies = {}, {}, {}
+        entries = load_cassettes(cassette_dir)
+        for entry in entries:
+            key = request_key(entry["method"], entry["host"], entry["path"], entry["query"], entry["body"])
+            self.exact[key] = entry
+            self.by_path[(entry["method"], entry["host"], entry["path"])] = entry
+            if entry["host"] == SCANNER_HOST and entry["status"] == 200:
+                try:
+                    body = json.loads(entry["response"])
+                    body["columns"] = json.loads(entry["body"])["columns"]
+                    scanner_bodies.setdefault(entry["path"], []).append(body)
+                except (ValueError, KeyError):
+                    pass
+        for path, fixture in SCANNER_FIXTURES.items():
+            fixture_path = os.path.join(FIXTURES_DIR, fixture)
+            if path not in scanner_bodies and os.path.exists(fixture_path):
+                with gzip.open(fixture_path, "rt", encoding="utf-8") as f:
+                    scanner_bodies[path] = [json.load(f)]
+        self.scanner = {path: scanner_table(bodies) for path, bodies in scanner_bodies.items()}
+        print(f"📼 Stand-in: {len(entries)} respuestas grabadas, universo TV: "
+              + ", ".join(f"{p} ({len(t)} filas)" for p, t in self.scanner.items()))
+
+    def _host_value(self, overrides: dict, host: str, default: float) -> float:
+        for pattern, value in overrides.items():
+            if pattern in host:
+                return value
+        return default
+
+    def fault_for(self, host: str):
+        """(demora en segundos, error a inyectar o None)."""
+        latency = self._host_value(self.host_latency, host, self.latency_ms)
+        error_rate = self._host_value(self.host_error_rate, host, self.error_rate)
+        with self._lock:
+            delay = max(0.0, latency + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            error = self._rng.choice(self.error_status) if self._rng.random() < error_rate else None
+            self.stats["requests"][host] = self.stats["requests"].get(host, 0) + 1
+            if error is not None:
+                self.stats["injected_errors"] += 1
+        return delay, error
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    # --- Respuestas ---
+    def respond(self, method: str, host: str, path: str, query: str, body: bytes):
+        """Devuelve (status, content_type, texto)."""
+        if host == SCANNER_HOST and path in self.scanner and method == "POST":
+            self._count("synthetic")
+            payload = json.loads(body or b"{}")
+            return 200, "application/json", json.dumps(scanner_answer(self.scanner[path], payload))
+
+        entry = self.exact.get(request_key(method, host, path, query, body))
+        if entry is not None:
+            self._count("replayed")
+            return entry["status"], entry["content_type"] or "application/json", entry["response"]
+
+        synthetic = self.synthesize(method, host, path, query, body)
+        if synthetic is not None:
+            self._count("synthetic")
+            return synthetic
+
+        entry = self.by_path.get((method, host, path))
+        if entry is not None:
+            self._count("replayed")
+            return entry["status"], entry["content_type"] or "application/json", entry["response"]
+
+        self._count("unmatched")
+        return 404, "application/json", json.dumps({"error": f"Sin cassette para {method} {host}{path}"})
+
+    def synthesize(self, method: str, host: str, path: str, query: str, body: bytes):
+        params = {k: v[-1] for k, v in parse_qs(query).items()}
+        if host == GEMINI_HOST and path.endswith(":generateContent"):
+            request = json.loads(body or b"{}")
+            prompt = "".join(p.get("text", "") for c in request.get("contents", []) for p in c.get("parts", []))
+            text = fake_gemini_text(prompt)
+            return 200, "application/json", json.dumps(gemini_response(text, len(prompt) // 4, len(text) // 4))
+        if host == "api.telegram.org" and path.endswith("/sendMessage"):
+            self._count("telegram_messages")
+            message = json.loads(body or b"{}")
+            result = {"message_id": self.stats["telegram_messages"], "date": int(time.time()),
+                      "chat": {"id": message.get("chat_id")}, "text": message.get("text", "")}
+            return 200, "application/json", json.dumps({"ok": True, "result": result})
+        if host == "news.google.com" and path.startswith("/search"):
+            query_text = unquote_plus(params.get("q", "")).split(" when:")[0]
+            return 200, "text/html; charset=utf-8", fake_news_page(query_text)
+        if host == "api.alternative.me" and path.startswith("/fng"):
+            value = _stable_int("fng", datetime.utcnow().date()) % 101
+            label = "Fear" if value < 45 else "Greed" if value > 55 else "Neutral"
+            return 200, "application/json", json.dumps(
+                {"name": "Fear and Greed Index", "data": [{"value": str(value), "value_classification": label,
+                                                           "timestamp": str(int(time.time()))}]})
+        if host == "api.binance.com" and path == "/api/v3/ticker/price":
+            book = self._binance_book()
+            if "symbol" in params:
+                if params["symbol"] not in book:
+                    return 400, "application/json", json.dumps({"code": -1121, "msg": "Invalid symbol."})
+                return 200, "application/json", json.dumps({"symbol": params["symbol"], "price": book[params["symbol"]]})
+            return 200, "application/json", json.dumps([{"symbol": s, "price": p} for s, p in book.items()])
+        return None
+
+    def _binance_book(self) -> dict:
+        """Pares XUSDT con el último 'close' del universo cripto grabado."""
+        table = self.scanner.get("/coin/scan")
+        if table is None or "base_currency" not in table.columns or "close" not in table.columns:
+            return {}
+        return {f"{base}USDT": f"{float(close):.8f}" for base, close in zip(table["base_currency"], table["close"])
+                if isinstance(base, str) and isinstance(close, (int, float))}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, igual que los proveedores reales
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _send(self, status: int, content_type: str, text: str):
+        payload = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.path.startswith("/__replay/stats"):
+            return self._send(200, "application/json", json.dumps(self.server.stats))
+
+        host, _, rest = self.path.lstrip("/").partition("/")
+        path, _, query = ("/" + rest).partition("?")
+        delay, error = self.server.fault_for(host)
+        time.sleep(delay)
+        if error == "reset":
+            # Cortamos la conexión sin responder (como un proxy que se cae)
+            self.close_connection = True
+            return
+        if error is not None:
+            return self._send(int(error), "application/json", json.dumps({"error": "Error inyectado por el stand-in"}))
+        try:
+            status, content_type, text = self.server.respond(method, host, scrub_path(path), query, body)
+        except Exception as e:
+            status, content_type, text = 500, "application/json", json.dumps({"error": str(e)})
+        self._send(status, content_type, text)
+
+
+def start_stand_in(host: str = "127.0.0.1", port: int = 8765, **settings) -> StandInServer:
+    """Arranca el stand-in en un hilo de fondo (para scripts de carga); .shutdown() lo detiene."""
+    server = StandInServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, name="stand-in", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stand-in local de los proveedores externos")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Servir los cassettes")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=urlsplit(REPLAY_URL).port or 8765)
+    serve.add_argument("--cassettes", default=CASSETTE_DIR)
+    serve.add_argument("--latency-ms", type=float, default=REPLAY_LATENCY_MS)
+    serve.add_argument("--jitter-ms", type=float, default=REPLAY_JITTER_MS)
+    serve.add_argument("--error-rate", type=float, default=REPLAY_ERROR_RATE, help="0.05 = 5%% de respuestas con error")
+    serve.add_argument("--error-status", default=",".join(str(s) for s in REPLAY_ERROR_STATUS),
+                       help="Errores a inyectar, ej: 429,503,reset")
+    serve.add_argument("--host-latency", action="append", help="Latencia por host, ej: generativelanguage=900")
+    serve.add_argument("--host-error-rate", action="append", help="Errores por host, ej: telegram=0.2")
+    serve.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandInServer(
+        (args.host, args.port), cassette_dir=args.cassettes, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, error_status=[s.strip() for s in args.error_status.split(",") if s.strip()],
+        host_latency=_parse_overrides(args.host_latency), host_error_rate=_parse_overrides(args.host_error_rate),
+        seed=args.seed,
+    )
+    print(f"🎭 Stand-in escuchando en http://{args.host}:{args.port} (stats: /__replay/stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
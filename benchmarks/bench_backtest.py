@@ -0,0 +1,94 @@
+# benchmarks/bench_backtest.py
+"""
+Benchmark + verificación del Backtester (sin DB ni BarStore: señales y velas sintéticas).
+
+Verifica antes de medir:
+  - Velas que terminan hace 10 días: una señal en la última vela no tiene retorno a ningún
+    horizonte (NaN, fuera de n / media / tasa de acierto) y no entra en la curva BUY.
+  - Fin de semana de una acción: el sábado lleva el cierre del viernes y el lunes es real.
+Después mide forward_returns + summarize con muchas señales sobre muchos símbolos.
+Uso: python benchmarks/bench_backtest.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Backtester import daily_matrix, forward_returns, position_curve, summarize
+
+SIZES = [(10_000, 100), (100_000, 300)]
+HORIZONS = [1, 3, 7, 14]
+DAYS = 400
+
+
+def check_stale_bars():
+    now = pd.Timestamp.now(tz="UTC").floor("D")
+    idx = pd.date_range(now - pd.Timedelta(days=60), now - pd.Timedelta(days=10), freq="D", tz="UTC")
+    bars = pd.DataFrame({"X": np.linspace(100, 150, len(idx))}, index=idx)
+    close = daily_matrix(bars, idx[0], now)
+    signals = pd.DataFrame({"symbol": ["X", "X"], "price": [bars["X"].iloc[-1], bars["X"].iloc[-8]],
+                            "detected_at": [idx[-1], idx[-8]], "ai_decision": "BUY", "ai_score": 70})
+    out = forward_returns(signals, close, close, [1, 3, 7])
+    last, older = out.iloc[0], out.iloc[1]
+    assert all(np.isnan(last[f"ret_{h}d"]) for h in (1, 3, 7)), f"Retorno inventado tras la última vela: {last.to_dict()}"
+    assert np.isnan(last["mae_1d"]), "MAE inventado tras la última vela"
+    assert np.isfinite(older["ret_7d"]), "La señal con 7 días de velas reales tiene que evaluarse"
+
+    report = summarize(out, [1, 3, 7], close)
+    buy = next(g for g in report["by_decision"] if g["group"] == "BUY")
+    assert buy["1d"]["n"] == 1 and buy["7d"]["n"] == 1, f"Conteos con señales sin horizonte: {buy}"
+    curve = position_curve(signals.iloc[[0]], close, 7)
+    assert curve.empty, "La curva BUY usó días sin velas reales"
+
+
+def check_weekend_fill():
+    # Lunes a viernes; la señal del viernes a 1 día cae en sábado (cierre del viernes)
+    idx = pd.bdate_range("2026-03-02", "2026-03-20", tz="UTC")
+    bars = pd.DataFrame({"S": np.arange(len(idx), dtype=float) + 100}, index=idx)
+    close = daily_matrix(bars, idx[0], idx[-1])
+    friday = pd.Timestamp("2026-03-06", tz="UTC")
+    signals = pd.DataFrame({"symbol": ["S"], "price": [bars.loc[friday, "S"]], "detected_at": [friday]})
+    out = forward_returns(signals, close, close, [1, 3])
+    assert out["ret_1d"].iloc[0] == 0.0, out["ret_1d"].iloc[0]
+    assert abs(out["ret_3d"].iloc[0] - (bars["S"].iloc[5] / bars.loc[friday, "S"] - 1)) < 1e-12
+
+
+def make_case(n_signals: int, n_symbols: int, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2025-01-01", periods=DAYS, freq="D", tz="UTC")
+    symbols = [f"S{i}" for i in range(n_symbols)]
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (DAYS, n_symbols)), axis=0))
+    bars = pd.DataFrame(prices, index=idx, columns=symbols)
+    rows = rng.integers(0, DAYS, n_signals)
+    cols = rng.integers(0, n_symbols, n_signals)
+    signals = pd.DataFrame({
+        "symbol": np.array(symbols)[cols], "price": prices[rows, cols],
+        "detected_at": idx[rows] + pd.to_timedelta(rng.integers(0, 86_400, n_signals), unit="s"),
+        "ai_decision": rng.choice(["BUY", "WAIT", "AVOID"], n_signals),
+        "ai_score": rng.integers(0, 100, n_signals),
+    })
+    return signals, bars, bars * 0.99
+
+
+if __name__ == "__main__":
+    check_stale_bars()
+    check_weekend_fill()
+    print("✅ Verificaciones OK (velas viejas / fin de semana)")
+
+    print(f"{'señales':>8} | {'símbolos':>8} | {'matrices (s)':>12} | {'retornos (s)':>12} | {'resumen (s)':>11}")
+    print("-" * 64)
+    for n_signals, n_symbols in SIZES:
+        signals, bars_close, bars_low = make_case(n_signals, n_symbols)
+        t0 = time.perf_counter()
+        close = daily_matrix(bars_close, bars_close.index[0], bars_close.index[-1])
+        low = daily_matrix(bars_low, bars_close.index[0], bars_close.index[-1])
+        t1 = time.perf_counter()
+        out = forward_returns(signals, close, low, HORIZONS)
+        t2 = time.perf_counter()
+        summarize(out, HORIZONS, close)
+        t3 = time.perf_counter()
+        print(f"{n_signals:>8} | {n_symbols:>8} | {t1 - t0:>12.3f} | {t2 - t1:>12.3f} | {t3 - t2:>11.3f}")
@@ -0,0 +1,66 @@
+# benchmarks/bench_candles.py
+"""
+Benchmark: detección de velas fila por fila (df.apply) vs motor vectorizado.
+Uso: python benchmarks/bench_candles.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CandlePatterns import CANDLE_PATTERNS, detect_patterns
+
+SIZES = [300, 5_000, 50_000]
+
+
+def make_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """DataFrame sintético con la forma de TradingView: ~5% de velas en 1 y algunos NaN."""
+    rng = np.random.default_rng(seed)
+    data = (rng.random((rows, len(CANDLE_PATTERNS))) < 0.05).astype(float)
+    data[rng.random(data.shape) < 0.01] = np.nan
+    df = pd.DataFrame(data, columns=CANDLE_PATTERNS)
+    df.insert(0, 'name', [f"SYM{i}" for i in range(rows)])
+    df.insert(1, 'close', rng.uniform(1, 500, rows))
+    return df
+
+
+def legacy_detect(df: pd.DataFrame) -> pd.Series:
+    """Implementación original (copiada de _process_technicals)."""
+    candle_cols = [c for c in df.columns if "Candle." in c]
+
+    def detectar(row):
+        encontrados = []
+        for col in candle_cols:
+            if pd.notna(row[col]) and row[col] == 1:
+                nombre = col.replace("Candle.", "").replace(".", " ")
+                encontrados.append(nombre)
+        return ", ".join(encontrados) if encontrados else None
+
+    return df.apply(detectar, axis=1)
+
+
+def timed(fn, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+if __name__ == "__main__":
+    print(f"{'filas':>8} | {'apply (s)':>10} | {'vector (s)':>10} | {'speedup':>8}")
+    print("-" * 46)
+    for rows in SIZES:
+        df = make_frame(rows)
+        t_old, old = timed(legacy_detect, df, repeat=1 if rows > 10_000 else 3)
+        t_new, (labels, mask) = timed(detect_patterns, df)
+
+        # Mismo resultado que la versión original
+        assert old.fillna("-").tolist() == labels.fillna("-").tolist(), f"Diferencias en {rows} filas"
+        print(f"{rows:>8} | {t_old:>10.4f} | {t_new:>10.4f} | {t_old / t_new:>7.1f}x")
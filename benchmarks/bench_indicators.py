@@ -0,0 +1,72 @@
+# benchmarks/bench_indicators.py
+"""
+Benchmark: indicadores (RSI, Stoch K/D, Mom, CCI20, AO) para muchos símbolos.
+Compara un cálculo por símbolo con pandas (una Serie por llamada, como _calculate_rsi)
+contra el motor en lote (Indicators.py), y mide el modo incremental (una vela nueva).
+Uso: python benchmarks/bench_indicators.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Indicators import IndicatorEngine
+
+SIZES = [1_000, 5_000]
+BARS = 250
+
+
+def make_bars(symbols: int, bars: int = BARS, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    cols = [f"S{i}" for i in range(symbols)]
+    close = pd.DataFrame(100 + rng.normal(0, 1, (bars, symbols)).cumsum(axis=0), columns=cols)
+    high = close + rng.uniform(0, 1, (bars, symbols))
+    low = close - rng.uniform(0, 1, (bars, symbols))
+    return high, low, close
+
+
+def per_symbol(high: pd.DataFrame, low: pd.DataFrame, close: pd.DataFrame) -> dict:
+    """Un símbolo por vez, con Series de pandas (ewm + rolling por llamada)."""
+    out = {}
+    for col in close.columns:
+        h, l, c = high[col], low[col], close[col]
+        delta = c.diff()
+        gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        rsi = 100 - 100 / (1 + gain / loss)
+        hh, ll = h.rolling(14).max(), l.rolling(14).min()
+        k = (100 * (c - ll) / (hh - ll)).rolling(3).mean()
+        tp = (h + l + c) / 3
+        mean_dev = tp.rolling(20).apply(lambda x: np.abs(x - x.mean()).mean(), raw=True)
+        hl2 = (h + l) / 2
+        out[col] = (rsi.iloc[-1], k.iloc[-1], k.rolling(3).mean().iloc[-1], (c - c.shift(10)).iloc[-1],
+                    ((tp - tp.rolling(20).mean()) / (0.015 * mean_dev)).iloc[-1],
+                    (hl2.rolling(5).mean() - hl2.rolling(34).mean()).iloc[-1])
+    return out
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == "__main__":
+    print(f"{'símbolos':>9} | {'por símbolo (s)':>15} | {'lote (s)':>9} | {'speedup':>8} | {'1 vela (ms)':>11}")
+    print("-" * 66)
+    for symbols in SIZES:
+        high, low, close = make_bars(symbols)
+        t_old, _ = timed(per_symbol, high, low, close)
+        t_new, (engine, _) = timed(IndicatorEngine.from_history, high, low, close)
+
+        # Modo incremental: una vela nueva para todos los símbolos
+        bar = close.iloc[-1].to_numpy() * 1.01
+        t0 = time.perf_counter()
+        engine.update(bar + 0.5, bar - 0.5, bar)
+        t_step = (time.perf_counter() - t0) * 1000
+
+        print(f"{symbols:>9} | {t_old:>15.3f} | {t_new:>9.3f} | {t_old / t_new:>7.1f}x | {t_step:>11.2f}")
@@ -0,0 +1,145 @@
+# benchmarks/bench_opportunities.py
+"""
+Benchmark: armado de oportunidades (dedupe + formato + Top N) en find_market_opportunities.
+Compara la versión fila por fila (apply + iterrows + sort) contra la columnar.
+Uso: python benchmarks/bench_opportunities.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AppServices import MarketAnalyzer
+from config import NOISE_WORDS
+
+SIZES = [1_000, 5_000, 20_000]
+TOP_N = 20
+
+COMPANIES = ["Grupo Financiero Galicia", "Coca Cola", "Banco Macro", "Apple", "Pampa Energia",
+             "Mercado Libre", "Telecom Argentina", "Loma Negra", "Vista Energy", "Banco BBVA"]
+SUFFIXES = ["", " S.A.", " INC", " CORP", " ADR", " CEDEAR", " SP ADR", " SA", " PLC", " LTD"]
+PATTERNS = [None, None, None, "Hammer", "Doji", "Engulfing Bullish, Doji"]
+
+
+def make_frame(rows: int, seed: int = 7) -> pd.DataFrame:
+    """Filas ya filtradas por caída, con nombres repetidos y 'ruido' financiero."""
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(COMPANIES), rows)
+    base = np.array([f"{COMPANIES[i]} {n}" for i, n in zip(idx, rng.integers(0, rows // 4 + 1, rows))], dtype=object)
+    suffix = np.array(SUFFIXES, dtype=object)[rng.integers(0, len(SUFFIXES), rows)]
+    rsi = rng.uniform(10, 70, rows)
+    rsi[rng.random(rows) < 0.05] = np.nan
+    df = pd.DataFrame({
+        "name": [f"T{i}" for i in range(rows)],
+        "description": base + suffix,
+        "close": rng.uniform(1, 300, rows),
+        "change": np.round(rng.uniform(-15, -3, rows), 2),
+        "volume": rng.integers(60_000, 5_000_000, rows),
+        "market_cap_basic": rng.uniform(1e8, 1e12, rows),
+        "RSI": rsi,
+    })
+    # Igual que CandlePatterns: columna object con None donde no hay patrón
+    df["Patrones_Hoy"] = pd.Series(np.array(PATTERNS, dtype=object)[rng.integers(0, len(PATTERNS), rows)], dtype=object)
+    return df
+
+
+def legacy_build(filtered: pd.DataFrame, col_change: str = "change") -> list:
+    """Implementación anterior (apply + iterrows + sort en Python)."""
+    filtered = filtered.copy()
+    if 'description' in filtered.columns:
+        if 'market_cap_basic' in filtered.columns:
+            filtered = filtered.sort_values('market_cap_basic', ascending=False, na_position='last', kind='stable')
+
+        def clean_name(text):
+            if not isinstance(text, str): return str(text)
+            text = text.upper()
+            for word in NOISE_WORDS:
+                text = text.replace(word, "")
+            return " ".join(text.split()[:2])
+
+        filtered['clean_id'] = filtered['description'].apply(clean_name)
+        filtered = filtered.drop_duplicates(subset=['clean_id'], keep='first')
+
+    opportunities = []
+    for _, row in filtered.iterrows():
+        rsi = row.get('RSI', 50)
+        patron = row.get('Patrones_Hoy')
+        tech_msg = []
+        if patron: tech_msg.append(f"🕯️ {patron}")
+        if rsi < 30: tech_msg.append(f"💎 Oversold ({round(rsi)})")
+        signal_reason = " | ".join(tech_msg) if tech_msg else "Dip detected"
+        symbol = row.get('base_currency', row.get('name'))
+        name = row.get('base_currency_desc', row.get('description', symbol))
+        opportunities.append({
+            "symbol": symbol, "name": name,
+            "price": float(row['close']),
+            "percent_change": float(row[col_change]),
+            "rsi": float(rsi) if pd.notna(rsi) else 50,
+            "technical_signal": signal_reason,
+            "ai_score": None, "ai_decision": None, "ai_reason": None
+        })
+    opportunities.sort(key=lambda x: x['percent_change'])
+    return opportunities[:TOP_N]
+
+
+def columnar_build(filtered: pd.DataFrame, analyzer: MarketAnalyzer) -> list:
+    return analyzer._build_opportunities(analyzer._dedupe_by_name(filtered), "change", top_n=TOP_N)
+
+
+def check_primary_listing(analyzer: MarketAnalyzer):
+    """
+    Dos listados del mismo nombre (ej: la acción local y su CEDEAR): el que más cae llega
+    primero, pero después de técnicos + dedupe tiene que sobrevivir el de mayor capitalización.
+    """
+    raw = pd.DataFrame({
+        "name": ["GGALD", "GGAL"],
+        "description": ["Grupo Financiero Galicia CEDEAR", "Grupo Financiero Galicia S.A."],
+        "close": [4.1, 52.3],
+        "change": [-9.5, -4.2],
+        "volume": [1_000, 900_000],
+        "market_cap_basic": [1.0e6, 7.5e9],
+    })
+    deduped = analyzer._dedupe_by_name(analyzer._process_technicals(raw))
+    assert deduped["name"].tolist() == ["GGAL"], f"Dedupe no conservó el listado principal: {deduped['name'].tolist()}"
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+if __name__ == "__main__":
+    analyzer = MarketAnalyzer()
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        check_primary_listing(analyzer)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    rows_out = []
+    for rows in SIZES:
+        df = make_frame(rows)
+        # Silenciamos el print de deduplicación durante la medición
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            t_old, old = timed(legacy_build, df)
+            t_new, new = timed(columnar_build, df, analyzer)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        assert old == new, f"Diferencias en {rows} filas"
+        rows_out.append((rows, t_old, t_new))
+
+    print(f"{'filas':>8} | {'legacy (s)':>10} | {'columnar (s)':>12} | {'speedup':>8}")
+    print("-" * 48)
+    for rows, t_old, t_new in rows_out:
+        print(f"{rows:>8} | {t_old:>10.4f} | {t_new:>12.4f} | {t_old / t_new:>7.1f}x")
@@ -0,0 +1,305 @@
+# benchmarks/bench_pipeline.py
+"""
+Benchmark del pipeline completo de escaneo con respuestas grabadas de TradingView:
+    scan (scan_tradingview / scan_coin_market) -> process (_process_technicals / _process_crypto_technicals)
+    -> dedupe (_dedupe_by_name) -> build (_build_opportunities), todo dentro de find_market_opportunities.
+
+Las respuestas salen de benchmarks/fixtures/ (ver record_fixtures.py), escaladas a 300 / 5k / 50k filas,
+y las sirve un "servidor" local que respeta range, sort y los filtros numéricos del payload
+(mercados y filtros de tipo se ignoran: el fixture ya es el universo). Sin red y sin snapshots.
+
+Por etapa reporta tiempo (mediana de REPEAT corridas, con su dispersión MAD) y pico de memoria
+(tracemalloc, corrida aparte). Con --save-baseline guarda los resultados en benchmarks/baselines/pipeline.json;
+sin él, compara contra ese archivo y marca REGRESIÓN si una etapa empeora más que la tolerancia
+y más que el ruido medido (sale con código 1). Las líneas base dependen de la máquina: no se versionan,
+cada entorno genera la suya con --save-baseline (sin línea base solo se reportan los tiempos).
+Uso: python benchmarks/bench_pipeline.py [--save-baseline] [--sizes 300,5000] [--markets USA]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["SNAPSHOT_ENABLED"] = "0"   # El benchmark no escribe snapshots Parquet
+os.environ["SCAN_CACHE_SECONDS"] = "0"  # Cada corrida mide el escaneo completo (sin scan_cache)
+
+import AppServices
+import TVScanner
+from AppServices import MarketAnalyzer
+from config import SCAN_TOP_N, TV_COIN_URL
+from UpstreamReplay import scanner_answer, scanner_table
+from record_fixtures import COIN_FIXTURE, GLOBAL_FIXTURE, GLOBAL_URL, load_fixture
+
+SIZES = [300, 5_000, 50_000]
+MARKETS = {"CRYPTO": (TV_COIN_URL, COIN_FIXTURE), "USA": (GLOBAL_URL, GLOBAL_FIXTURE)}
+THRESHOLD = 100.0   # Umbral permisivo: todas las filas recorren el pipeline (el filtro se evalúa igual)
+STAGES = ["scan", "process", "dedupe", "build", "total"]
+REPEAT = 7
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+TIME_TOLERANCE = 0.25      # +25% de tiempo
+MEMORY_TOLERANCE = 0.25    # +25% de pico de memoria
+MIN_DELTA_SECONDS = 0.010  # Ruido: diferencias menores no cuentan
+NOISE_MADS = 4             # ...ni las menores a 4 MAD de las corridas (el ruido crece con la etapa)
+MIN_DELTA_MB = 1.0
+
+RENAME_FOR_COPIES = {"name", "base_currency"}
+DESCRIPTION_COLS = {"description", "base_currency_desc"}
+CHANGE_COLS = {"change", "24h_close_change|5"}
+
+
+def scale_fixture(body: dict, rows: int, seed: int = 11) -> dict:
+    """
+    Repite las filas grabadas hasta tener 'rows'. Cada copia cambia ticker, id y nombre
+    (para que la deduplicación no las colapse) y mueve un poco la variación del día.
+    """
+    rng = np.random.default_rng(seed)
+    columns = body["columns"]
+    index = {c: i for i, c in enumerate(columns)}
+    base = body["data"]
+    data = []
+    for i in range(rows):
+        copy_n, src = divmod(i, len(base))
+        row = src_row = base[src]
+        if copy_n:
+            d = list(src_row["d"])
+            for col in RENAME_FOR_COPIES & index.keys():
+                d[index[col]] = f"{d[index[col]]}{copy_n}"
+            for col in DESCRIPTION_COLS & index.keys():
+                d[index[col]] = f"{copy_n} {d[index[col]]}"
+            for col in CHANGE_COLS & index.keys():
+                if isinstance(d[index[col]], (int, float)):
+                    d[index[col]] = d[index[col]] * rng.uniform(0.8, 1.2)
+            row = {"s": f"{src_row['s']}.{copy_n}", "d": d}
+        data.append(row)
+    return {"totalCount": rows, "columns": columns, "data": data}
+
+
+class ReplayResponse:
+    def __init__(self, content: bytes, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ReplayServer:
+    """
+    Reemplazo de http_post: responde cada payload desde el fixture escalado (misma lógica que el stand-in
+    de UpstreamReplay.py, sin HTTP de por medio). Las respuestas se arman una vez y se guardan como bytes
+    (la corrida medida solo decodifica).
+    """
+
+    def __init__(self, fixtures: dict):
+        self.tables = {url: scanner_table([body]) for url, body in fixtures.items()}
+        self._responses = {}
+
+    def __call__(self, url: str, **kwargs) -> ReplayResponse:
+        payload = kwargs.get("json") or {}
+        key = url + json.dumps(payload, sort_keys=True)
+        content = self._responses.get(key)
+        if content is None:
+            answer = scanner_answer(self.tables[url], payload, match_markets=False)
+            content = self._responses[key] = json.dumps(answer).encode("utf-8")
+        return ReplayResponse(content)
+
+
+class StageProfiler:
+    """Envuelve los métodos del analyzer para medir cada etapa (tiempo o pico de memoria)."""
+
+    WRAPPED = {
+        "scan_tradingview": "scan", "scan_coin_market": "scan",
+        "_process_technicals": "process", "_process_crypto_technicals": "process",
+        "_dedupe_by_name": "dedupe", "_build_opportunities": "build",
+    }
+
+    def __init__(self, analyzer: MarketAnalyzer, memory: bool = False):
+        self.memory = memory
+        self.results = {}
+        self.rows_out = {}
+        self._peak_abs = 0
+        for method, stage in self.WRAPPED.items():
+            setattr(analyzer, method, self._wrap(getattr(analyzer, method), stage))
+
+    def _wrap(self, fn, stage: str):
+        def wrapper(*args, **kwargs):
+            with self.stage(stage):
+                result = fn(*args, **kwargs)
+            self.rows_out[stage] = len(result)
+            return result
+        return wrapper
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.memory:
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+        else:
+            t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self._peak_abs = max(self._peak_abs, peak)
+                self.results[name] = (peak - start) / 1024 ** 2
+            else:
+                self.results[name] = time.perf_counter() - t0
+
+    def run(self, analyzer: MarketAnalyzer, market: str) -> int:
+        """find_market_opportunities completo; 'total' incluye las etapas y el filtrado entre ellas."""
+        self.results, self.rows_out, self._peak_abs = {}, {}, 0
+        if self.memory:
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            t0 = None
+        else:
+            t0 = time.perf_counter()
+        opportunities = analyzer.find_market_opportunities(market, THRESHOLD)
+        if self.memory:
+            peak = max(self._peak_abs, tracemalloc.get_traced_memory()[1])
+            self.results["total"] = (peak - start) / 1024 ** 2
+        else:
+            self.results["total"] = time.perf_counter() - t0
+        self.rows_out["total"] = len(opportunities)
+        return len(opportunities)
+
+
+@contextmanager
+def replay(server: ReplayServer, rows: int):
+    """Conecta el servidor local y agranda el límite del escaneo para que entren todas las filas."""
+    saved = AppServices.http_post, TVScanner.http_post, AppServices.SCAN_OVERFETCH
+    stdout = sys.stdout
+    AppServices.http_post = TVScanner.http_post = server
+    AppServices.SCAN_OVERFETCH = math.ceil(rows / SCAN_TOP_N)
+    sys.stdout = open(os.devnull, "w")   # Silenciamos los prints del pipeline
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        AppServices.http_post, TVScanner.http_post, AppServices.SCAN_OVERFETCH = saved
+
+
+def bench(market: str, rows: int) -> dict:
+    url, path = MARKETS[market]
+    server = ReplayServer({url: scale_fixture(load_fixture(path), rows)})
+    with replay(server, rows):
+        # Calentamiento: arma las respuestas del servidor local (no se mide)
+        analyzer = MarketAnalyzer()
+        warmup = StageProfiler(analyzer)
+        warmup.run(analyzer, market)
+
+        samples = {}
+        for _ in range(REPEAT):
+            analyzer = MarketAnalyzer()
+            profiler = StageProfiler(analyzer)
+            profiler.run(analyzer, market)
+            for stage, seconds in profiler.results.items():
+                samples.setdefault(stage, []).append(seconds)
+        times = {stage: statistics.median(values) for stage, values in samples.items()}
+        spread = {stage: statistics.median(abs(v - times[stage]) for v in values) for stage, values in samples.items()}
+
+        analyzer = MarketAnalyzer()
+        profiler = StageProfiler(analyzer, memory=True)
+        tracemalloc.start()
+        try:
+            profiler.run(analyzer, market)
+        finally:
+            tracemalloc.stop()
+        memory = profiler.results
+
+    return {f"{market}:{rows}:{stage}": {"seconds": round(times.get(stage, 0.0), 5),
+                                         "mad": round(spread.get(stage, 0.0), 5),
+                                         "peak_mb": round(memory.get(stage, 0.0), 3),
+                                         "rows_out": warmup.rows_out.get(stage, 0)}
+            for stage in STAGES}
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    """
+    {clave: [motivos]} de las etapas que empeoraron más que la tolerancia. En tiempo, además,
+    la diferencia tiene que superar el ruido: MIN_DELTA_SECONDS o NOISE_MADS veces la
+    dispersión de las corridas (la mayor entre la línea base y la actual).
+    """
+    regressions = {}
+    for key, now in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        reasons = []
+        noise = max(MIN_DELTA_SECONDS, NOISE_MADS * max(now.get("mad", 0.0), base.get("mad", 0.0)))
+        if now["seconds"] > base["seconds"] * (1 + TIME_TOLERANCE) and now["seconds"] - base["seconds"] > noise:
+            reasons.append(f"tiempo {base['seconds'] * 1000:.1f} -> {now['seconds'] * 1000:.1f} ms")
+        if now["peak_mb"] > base["peak_mb"] * (1 + MEMORY_TOLERANCE) and now["peak_mb"] - base["peak_mb"] > MIN_DELTA_MB:
+            reasons.append(f"memoria {base['peak_mb']:.1f} -> {now['peak_mb']:.1f} MB")
+        if reasons:
+            regressions[key] = reasons
+    return regressions
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(results: dict, path: str = BASELINE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    meta = {"created_at": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "pandas": pd.__version__, "numpy": np.__version__, "machine": platform.machine()}
+    merged = load_baseline(path) | results
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": dict(sorted(merged.items()))}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de escaneo con respuestas grabadas")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--sizes", default=None, help="Ej: 300,5000,50000")
+    parser.add_argument("--markets", default=None, help="Ej: CRYPTO,USA")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else SIZES
+    markets = [m.strip().upper() for m in args.markets.split(",")] if args.markets else list(MARKETS)
+
+    results = {}
+    for market in markets:
+        for rows in sizes:
+            results |= bench(market, rows)
+
+    baseline = {} if args.save_baseline else load_baseline()
+    regressions = compare(results, baseline)
+
+    print(f"{'mercado':>7} | {'filas':>6} | {'etapa':>7} | {'salida':>6} | {'tiempo (ms)':>11} | {'pico (MB)':>9} | {'base (ms)':>9} | estado")
+    print("-" * 87)
+    for market in markets:
+        for rows in sizes:
+            for stage in STAGES:
+                key = f"{market}:{rows}:{stage}"
+                now, base = results[key], baseline.get(key)
+                base_ms = f"{base['seconds'] * 1000:>9.1f}" if base else f"{'-':>9}"
+                status = "REGRESIÓN: " + ", ".join(regressions[key]) if key in regressions else ("ok" if base else "")
+                print(f"{market:>7} | {rows:>6} | {stage:>7} | {now['rows_out']:>6} | {now['seconds'] * 1000:>11.1f} | {now['peak_mb']:>9.2f} | {base_ms} | {status}")
+
+    if args.save_baseline:
+        save_baseline(results)
+        print(f"\n💾 Línea base guardada en {os.path.relpath(BASELINE_PATH)}")
+    elif not baseline:
+        print(f"\nℹ️ Sin línea base en {os.path.relpath(BASELINE_PATH)}: correr con --save-baseline en esta máquina para comparar")
+    elif regressions:
+        print(f"\n❌ {len(regressions)} etapa(s) con regresión (tolerancia +{TIME_TOLERANCE:.0%} tiempo, +{MEMORY_TOLERANCE:.0%} memoria)")
+        sys.exit(1)
@@ -0,0 +1,83 @@
+# benchmarks/bench_signal_persistence.py
+"""
+Benchmark: guardado de las señales de un ciclo + lectura para el reporte.
+Compara un objeto ORM por señal (db.add uno por uno, commit, re-lectura de atributos)
+contra el insert en lote de SignalStore (una transacción, filas livianas).
+Usa una base SQLite temporal (no toca la del bot).
+Uso: python benchmarks/bench_signal_persistence.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from modelsTables import CryptoSignal
+from SignalStore import bulk_save_signals
+
+SIZES = [1_000, 10_000]
+
+
+def make_cycle(rows: int):
+    opportunities = [{
+        "symbol": f"T{i}", "name": f"Token {i}", "price": 1.0 + i * 0.01, "percent_change": -5.0 - (i % 10),
+        "rsi": 20.0 + (i % 40), "technical_signal": "📉 RSI: 25.0 | 🕯️ Hammer",
+    } for i in range(rows)]
+    analyses = [{"score": i % 100, "decision": ("BUY", "WAIT", "NEUTRAL")[i % 3], "reason": "Titulares mixtos"}
+                for i in range(rows)]
+    return opportunities, analyses
+
+
+def orm_save(db, opportunities, analyses) -> list:
+    """Camino anterior: un objeto ORM por señal."""
+    saved = []
+    for op, ai in zip(opportunities, analyses):
+        signal = CryptoSignal(
+            symbol=op['symbol'], name=op['name'], price=op['price'], percent_change_24h=op['percent_change'],
+            rsi=op['rsi'], technical_signal=op['technical_signal'],
+            ai_score=ai.get('score'), ai_decision=ai.get('decision'), ai_reason=ai.get('reason')
+        )
+        db.add(signal)
+        saved.append(signal)
+    db.commit()
+    return saved
+
+
+def bulk_save(db, opportunities, analyses) -> list:
+    return bulk_save_signals(db, "CRYPTO", opportunities, analyses)
+
+
+def report(signals) -> int:
+    """Lo que hace el reporte de Telegram: leer atributos de cada señal."""
+    return sum(len(f"{s.symbol}{s.price}{s.percent_change_24h}{s.ai_decision}{s.ai_score}{s.ai_reason}") for s in signals)
+
+
+def run(save_fn, rows: int) -> float:
+    opportunities, analyses = make_cycle(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        try:
+            t0 = time.perf_counter()
+            report(save_fn(db, opportunities, analyses))
+            elapsed = time.perf_counter() - t0
+            assert db.execute(select(func.count()).select_from(CryptoSignal)).scalar() == rows
+        finally:
+            db.close()
+            engine.dispose()
+    return elapsed
+
+
+if __name__ == "__main__":
+    print(f"{'señales':>8} | {'ORM (s)':>9} | {'lote (s)':>9} | {'speedup':>8}")
+    print("-" * 44)
+    for rows in SIZES:
+        t_orm = min(run(orm_save, rows) for _ in range(3))
+        t_bulk = min(run(bulk_save, rows) for _ in range(3))
+        print(f"{rows:>8} | {t_orm:>9.4f} | {t_bulk:>9.4f} | {t_orm / t_bulk:>7.1f}x")
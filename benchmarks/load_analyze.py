@@ -0,0 +1,114 @@
+# benchmarks/load_analyze.py
+"""
+Prueba de carga del camino completo /analyze -> IA -> Telegram, sin red.
+
+1. Stand-in de los proveedores (cassettes + fakes, ver UpstreamReplay.py):
+       python UpstreamReplay.py serve --latency-ms 80 --jitter-ms 40 --host-latency generativelanguage=900 --error-rate 0.02
+2. La app en modo replay, con una base descartable y tantos workers de jobs como la concurrencia:
+       UPSTREAM_MODE=replay DATABASE_URL=sqlite:////tmp/load.db SNAPSHOT_ENABLED=0 ANALYSIS_JOB_WORKERS=10 \\
+       TELEGRAM_BOT_TOKEN=x TELEGRAM_CHAT_ID=1 uvicorn main:app --port 8000
+3. Este script: N pedidos concurrentes repartidos entre los endpoints. Cada pedido encola SU job
+   (dedupe=false: cada uno corre escaneo -> IA -> Telegram) y espera a que termine (/jobs/{id});
+   latencias de punta a punta por endpoint, jobs distintos, señales (una vez por job)
+   y lo que vio el stand-in (pedidos por proveedor, errores inyectados, mensajes de Telegram).
+   Si el pool de la app (ANALYSIS_JOB_WORKERS, ver /jobs/stats) es menor que --concurrency,
+   los jobs hacen cola en la app: el script avisa y no arranca (--allow-queueing para medirlo igual).
+   --dedupe mide en cambio el camino compartido (pedidos iguales en vuelo -> un solo job).
+Uso: python benchmarks/load_analyze.py --requests 30 --concurrency 10
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import REPLAY_URL
+
+ENDPOINTS = ["/analyze?threshold=-5", "/analyze/stocks?threshold=-3", "/analyze/Merval?threshold=-2"]
+
+
+def stand_in_stats(base: str) -> dict:
+    try:
+        return requests.get(f"{base}/__replay/stats", timeout=5).json()
+    except requests.RequestException:
+        return {}
+
+
+FINAL_STATUSES = ("done", "cancelled", "failed")
+
+
+def hit(session: requests.Session, app: str, endpoint: str, dedupe: bool = False, timeout: float = 600):
+    """Encola el escaneo y espera el job. Devuelve (segundos, estado final, señales guardadas, job_id)."""
+    t0 = time.perf_counter()
+    job_id = None
+    try:
+        r = session.get(app + endpoint, params={"dedupe": str(dedupe).lower()}, timeout=30)
+        if r.status_code != 202:
+            return time.perf_counter() - t0, r.status_code, 0, None
+        job = r.json()
+        job_id = job["job_id"]
+        while job["status"] not in FINAL_STATUSES and time.perf_counter() - t0 < timeout:
+            time.sleep(0.25)
+            job = session.get(f"{app}/jobs/{job_id}", timeout=30).json()
+        status, rows = job["status"], job.get("saved") or 0
+    except requests.RequestException as e:
+        status, rows = type(e).__name__, 0
+    return time.perf_counter() - t0, status, rows, job_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga concurrente sobre /analyze con proveedores simulados")
+    parser.add_argument("--app", default="http://127.0.0.1:8000")
+    parser.add_argument("--stand-in", default=REPLAY_URL)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--dedupe", action="store_true", help="Pedidos iguales en vuelo comparten job (como un cliente normal)")
+    parser.add_argument("--allow-queueing", action="store_true", help="Correr aunque el pool de jobs de la app sea menor que la concurrencia")
+    args = parser.parse_args()
+
+    workers = requests.get(f"{args.app}/jobs/stats", timeout=10).json().get("workers", 0)
+    if workers < args.concurrency and not args.allow_queueing:
+        sys.exit(f"❌ La app corre {workers} jobs a la vez y la concurrencia es {args.concurrency}: "
+                 f"levantarla con ANALYSIS_JOB_WORKERS={args.concurrency} (o usar --allow-queueing)")
+
+    before = stand_in_stats(args.stand_in)
+    endpoints = [ENDPOINTS[i % len(ENDPOINTS)] for i in range(args.requests)]
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda endpoint: hit(session, args.app, endpoint, args.dedupe), endpoints))
+    wall = time.perf_counter() - t0
+    after = stand_in_stats(args.stand_in)
+
+    print(f"{'endpoint':<32} | {'n':>3} | {'jobs':>4} | {'ok':>3} | {'p50 (s)':>7} | {'p95 (s)':>7} | {'max (s)':>7} | {'señales':>7}")
+    print("-" * 91)
+    for endpoint in ENDPOINTS:
+        rows = [r for e, r in zip(endpoints, results) if e == endpoint]
+        times = np.array([r[0] for r in rows])
+        ok = sum(1 for r in rows if r[1] == "done")
+        # Señales una vez por job: con --dedupe varios pedidos ven el mismo job
+        saved = {r[3]: r[2] for r in rows if r[3]}
+        print(f"{endpoint:<32} | {len(rows):>3} | {len(saved):>4} | {ok:>3} | {np.percentile(times, 50):>7.2f} | "
+              f"{np.percentile(times, 95):>7.2f} | {times.max():>7.2f} | {sum(saved.values()):>7}")
+    distinct = len({r[3] for r in results if r[3]})
+    print(f"\n{args.requests} pedidos ({distinct} jobs distintos, {workers} workers en la app), "
+          f"concurrencia {args.concurrency}: {wall:.1f}s ({args.requests / wall:.2f} req/s)")
+
+    errors = {r[1] for r in results if r[1] != "done"}
+    if errors:
+        print(f"⚠️ Jobs sin terminar bien: {errors}")
+    if args.dedupe:
+        print("(--dedupe: pedidos iguales en vuelo comparten job, ver 'deduplicated' en /jobs/stats)")
+    if after:
+        print("\n🎭 Stand-in durante la prueba:")
+        for host, count in sorted(after.get("requests", {}).items()):
+            print(f"   {host:<36} {count - before.get('requests', {}).get(host, 0):>6} pedidos")
+        for key in ("replayed", "synthetic", "unmatched", "injected_errors", "telegram_messages"):
+            print(f"   {key:<36} {after.get(key, 0) - before.get(key, 0):>6}")
@@ -0,0 +1,119 @@
+# benchmarks/record_fixtures.py
+"""
+Graba las respuestas del scanner de TradingView que usa bench_pipeline.py.
+
+Formato (gzip): el mismo JSON que devuelve el scanner, más la lista de columnas
+en el orden de 'd' (al reproducirlo se reordena según las columnas que pide cada payload):
+    {"totalCount": N, "columns": [...], "data": [{"s": "EXCHANGE:TICKER", "d": [...]}, ...]}
+
+Fuentes:
+  - Por defecto, las muestras que vienen en el repo (TV_Data_Completa.xlsx y Test_Crypto_Data.xlsx),
+    así los fixtures se pueden regenerar sin red.
+  - --live: graba respuestas reales del scanner (acciones de 'america' y el mercado 'coin').
+Uso: python benchmarks/record_fixtures.py [--live] [--limit 1000]
+"""
+import argparse
+import ast
+import gzip
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import TV_COLUMNS, TV_HEADERS, TV_COOKIES, TV_COIN_URL
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GLOBAL_FIXTURE = os.path.join(FIXTURES_DIR, "tv_global_scan.json.gz")
+COIN_FIXTURE = os.path.join(FIXTURES_DIR, "tv_coin_scan.json.gz")
+GLOBAL_URL = "https://scanner.tradingview.com/global/scan"
+
+
+def _plain(value):
+    """Celda de Excel -> valor JSON (NaN -> null, listas guardadas como texto -> listas)."""
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, str) and value.startswith("[") and value.endswith("]"):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return value
+    return value
+
+
+def frame_to_response(df: pd.DataFrame, columns: list, symbol_col: str) -> dict:
+    """DataFrame -> respuesta del scanner (columnas faltantes viajan como null, igual que en TV)."""
+    present = [c for c in columns if c in df.columns]
+    records = df[present].to_dict("records")
+    data = []
+    for (_, row), record in zip(df.iterrows(), records):
+        data.append({
+            "s": f"{row.get('exchange', 'TV')}:{row[symbol_col]}",
+            "d": [_plain(record[c]) if c in record else None for c in columns],
+        })
+    return {"totalCount": len(data), "columns": list(columns), "data": data}
+
+
+def from_samples() -> dict:
+    """Fixtures a partir de las muestras del repo."""
+    stocks = pd.read_excel(os.path.join(ROOT, "TV_Data_Completa.xlsx"))
+    coins = pd.read_excel(os.path.join(ROOT, "Test_Crypto_Data.xlsx"))
+    # La muestra cripto ya pasó por _process_crypto_technicals: volvemos al formato crudo
+    coins = coins.drop(columns=["Patrones_Hoy"], errors="ignore").rename(columns={"change_24h": "24h_close_change|5"})
+    return {
+        GLOBAL_FIXTURE: frame_to_response(stocks, sorted(TV_COLUMNS), "name"),
+        COIN_FIXTURE: frame_to_response(coins, list(coins.columns), "base_currency"),
+    }
+
+
+def from_live(limit: int) -> dict:
+    """Fixtures grabados del scanner real (necesita red)."""
+    from ProviderClient import http_post
+
+    columns = sorted(TV_COLUMNS)
+    coin_columns = pd.read_excel(os.path.join(ROOT, "Test_Crypto_Data.xlsx"), nrows=0).columns
+    coin_columns = [c for c in coin_columns if c not in ("Patrones_Hoy", "change_24h")] + ["24h_close_change|5"]
+    requests_ = {
+        GLOBAL_FIXTURE: (GLOBAL_URL, {"columns": columns, "markets": ["america"], "range": [0, limit],
+                                      "sort": {"sortBy": "market_cap_basic", "sortOrder": "desc"}}),
+        COIN_FIXTURE: (TV_COIN_URL, {"columns": coin_columns, "markets": ["coin"], "range": [0, limit],
+                                     "sort": {"sortBy": "crypto_total_rank", "sortOrder": "asc"}}),
+    }
+    out = {}
+    for path, (url, payload) in requests_.items():
+        payload.update({"ignore_unknown_fields": False, "options": {"lang": "es"}, "symbols": {}})
+        r = http_post(url, headers=TV_HEADERS, cookies=TV_COOKIES, json=payload, timeout=30)
+        r.raise_for_status()
+        body = r.json()
+        body["columns"] = payload["columns"]
+        out[path] = body
+    return out
+
+
+def save_fixture(path: str, body: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(body, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_fixture(path: str) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Graba fixtures del scanner de TradingView")
+    parser.add_argument("--live", action="store_true", help="Grabar del scanner real en vez de las muestras del repo")
+    parser.add_argument("--limit", type=int, default=1000, help="Filas a grabar en modo --live")
+    args = parser.parse_args()
+
+    fixtures = from_live(args.limit) if args.live else from_samples()
+    for path, body in fixtures.items():
+        save_fixture(path, body)
+        print(f"💾 {os.path.relpath(path, ROOT)}: {body['totalCount']} filas x {len(body['columns'])} columnas")
@@ -10,7 +10,16 @@ load_dotenv()
 CMC_API_KEY = os.getenv("CMC_API_KEY")
 CMC_BASE_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
 USE_MOCK_DATA = False
-SQLALCHEMY_DATABASE_URL = "sqlite:///./crypto_ops.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./crypto_ops.db")
+# Perfil de rendimiento de SQLite (se aplica a cada conexión nueva)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",          # Lectores no bloquean al escritor (dashboard + jobs de fondo)
+    "synchronous": "NORMAL",        # Seguro con WAL, sin fsync en cada commit
+    "busy_timeout": 5000,           # ms esperando un lock antes de fallar con 'database is locked'
+    "cache_size": -64000,           # Negativo = KiB -> ~64 MB de cache de páginas
+    "mmap_size": 268435456,         # 256 MB de lectura por memory-map
+    "temp_store": "MEMORY",
+}
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 
@@ -111,5 +120,132 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# --- COLA DE SALIDA DE TELEGRAM (TelegramOutbox.py) ---
+TELEGRAM_MAX_CHARS = 4096            # Límite de la API por mensaje
+TELEGRAM_CHAT_RATE = 1.0             # Mensajes por segundo a un mismo chat
+TELEGRAM_CHAT_BURST = 3              # Ráfaga corta tolerada en chats privados
+TELEGRAM_GROUP_PER_MINUTE = 20       # Grupos (chat_id negativo)
+TELEGRAM_GLOBAL_RATE = 30            # Mensajes por segundo de todo el bot
+TELEGRAM_COALESCE_SECONDS = float(os.getenv("TELEGRAM_COALESCE_SECONDS", "2"))  # Ventana para juntar avisos
+TELEGRAM_QUEUE_MAX = 500             # Avisos pendientes (si se llena se descarta el más viejo)
+TELEGRAM_MAX_ATTEMPTS = 5
+
 # Horarios de ejecución automática (formato 24hs)
-SCHEDULE_HOURS = [9, 13, 22]
\ No newline at end of file
+SCHEDULE_HOURS = [9, 13, 22]
+
+# Mercados del escaneo automático y su umbral de caída (%). Corren en paralelo.
+AUTO_MARKETS = {"CRYPTO": -5.0, "USA": -3.0, "MERVAL": -2.0}
+# Decisiones IA que se guardan/notifican en el modo automático (WAIT se ignora para no hacer spam)
+AUTO_DECISIONS = ["BUY", "NEUTRAL"]
+# Tiempo máximo de un ciclo automático: lo que no terminó a tiempo se descarta
+AUTO_CYCLE_DEADLINE_SECONDS = float(os.getenv("AUTO_CYCLE_DEADLINE_SECONDS", "900"))
+
+# --- CONCURRENCIA IA ---
+# Máximo de análisis (Noticias + Gemini) corriendo en paralelo por ciclo
+AI_MAX_WORKERS = int(os.getenv("AI_MAX_WORKERS", "5"))
+# Activos por llamada a Gemini (modo batch). 1 = una llamada por activo (modo clásico)
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "5"))
+# Salida estructurada: Gemini responde con el JSON Schema del análisis (prompt compacto, sin parseo frágil)
+# 0 = modo texto libre de antes (prompt largo + limpieza de ```json)
+AI_STRUCTURED_OUTPUT = os.getenv("AI_STRUCTURED_OUTPUT", "1") == "1"
+# Tokens y latencia por llamada (ver AIUsageMeter): ciclos recientes y llamadas por mercado que se guardan
+AI_USAGE_CYCLES = 50
+AI_USAGE_CALLS_PER_MARKET = 500
+
+# --- CACHE DE SENTIMIENTO IA ---
+# Si los titulares de un activo no cambiaron dentro de este plazo, reutilizamos la respuesta de Gemini
+SENTIMENT_CACHE_TTL_HOURS = float(os.getenv("SENTIMENT_CACHE_TTL_HOURS", "12"))
+SENTIMENT_CACHE_MAX_ENTRIES = int(os.getenv("SENTIMENT_CACHE_MAX_ENTRIES", "5000"))
+
+# --- CACHE DE PRECIOS ---
+# Segundos que un precio se considera fresco según la clase de activo
+PRICE_CACHE_TTL_SECONDS = {
+    "crypto": float(os.getenv("PRICE_TTL_CRYPTO", "30")),
+    "stock": float(os.getenv("PRICE_TTL_STOCK", "60")),
+}
+# Antigüedad máxima aceptada para ejecutar compras/ventas (más estricta que los dashboards)
+PRICE_MAX_AGE_TRADE = float(os.getenv("PRICE_MAX_AGE_TRADE", "10"))
+
+# --- CLIENTE HTTP COMPARTIDO (ProviderClient.py) ---
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))   # Segundos, si la llamada no define otro
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))      # Solo GETs
+HTTP_POOL_DEFAULT = 4
+# Conexiones keep-alive por host (los scans en paralelo necesitan más)
+HTTP_POOL_SIZES = {
+    "scanner.tradingview.com": 8,
+    "api.binance.com": 4,
+    "pro-api.coinmarketcap.com": 4,
+    "api.alternative.me": 2,
+    "api.telegram.org": 2,
+}
+
+# --- SNAPSHOTS DE ESCANEOS (SnapshotStore.py) ---
+# Cada escaneo se guarda en Parquet: SNAPSHOT_DIR/market=USA/date=YYYY-MM-DD/raw_<ts>.parquet
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1") == "1"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./snapshots")
+SNAPSHOT_COMPRESSION = "zstd"
+# Universo completo por mercado (sin filtro de caída), guardado como universe_<ts>.parquet antes
+# de cada backfill de velas: los escaneos de oportunidades ya solo traen las filas que cayeron
+UNIVERSE_LIMITS = {"CRYPTO": 300, "USA": 800, "MERVAL": 400}
+
+# --- ESCANEO DE OPORTUNIDADES ---
+# Candidatos finales por mercado (los que pasan a la IA)
+SCAN_TOP_N = int(os.getenv("SCAN_TOP_N", "20"))
+# Filas que pedimos a TradingView por cada candidato final (margen para la deduplicación)
+SCAN_OVERFETCH = int(os.getenv("SCAN_OVERFETCH", "3"))
+# Cache en memoria del último escaneo por mercado (AppServices.ScanSnapshotCache):
+# dentro de la ventana, otro threshold (u otro endpoint) filtra el mismo DataFrame. 0 = sin cache
+SCAN_CACHE_SECONDS = float(os.getenv("SCAN_CACHE_SECONDS", "60"))
+# Tope de caída con que se pide el snapshot (sirve para cualquier threshold <= tope)
+SCAN_CACHE_MAX_CHANGE = float(os.getenv("SCAN_CACHE_MAX_CHANGE", "0"))
+# Universo USA: antes era "Top 800 por capitalización"; ahora lo filtra el servidor con un piso de market cap
+USA_MIN_MARKET_CAP = float(os.getenv("USA_MIN_MARKET_CAP", "5e9"))
+# Palabras 'ruido' que hacen que los nombres parezcan distintos (deduplicación de listados)
+NOISE_WORDS = [
+    " CEDEAR", " ADR", " S.A.", " SA", " INC.", " INC", " CORP", " LTD", 
+    " PLC", " AG", " SHS", " CERT DEPOSITO", " ARG REPR", " SP ADR"
+]
+
+# --- ESCANEOS FRAGMENTADOS (TVScanner.py) ---
+SCAN_SHARD_SIZE = int(os.getenv("SCAN_SHARD_SIZE", "250"))   # Filas por página de rango
+SCAN_MAX_WORKERS = int(os.getenv("SCAN_MAX_WORKERS", "6"))   # Fragmentos en paralelo
+
+# --- MARK-TO-MARKET ---
+# Cada cuántos segundos el job de fondo revalúa las posiciones abiertas
+MARK_INTERVAL_SECONDS = int(os.getenv("MARK_INTERVAL_SECONDS", "60"))
+
+# --- LIVE FEED (SSE /stream) ---
+LIVE_FEED_BUFFER = 500              # Eventos que guardamos para reenviar al reconectar
+LIVE_FEED_QUEUE_SIZE = 1000         # Máximo de eventos pendientes por navegador
+LIVE_FEED_HEARTBEAT_SECONDS = 15    # Comentario keep-alive para que proxies no corten la conexión
+
+# --- HISTORIAL LOCAL DE VELAS (BarStore.py) ---
+# BARS_DIR/interval=1d/symbol=AAPL/part_<primera>_<última>.parquet
+BARS_DIR = os.getenv("BARS_DIR", "./bars")
+BARS_INTERVALS = ["1d", "1h"]
+# Historial inicial a descargar cuando un símbolo no tiene nada guardado
+BARS_HISTORY_DAYS = {"1d": 730, "1h": 60}
+BARS_MAX_PARTS = 30          # Más parts que esto por símbolo -> se compactan en uno
+BARS_MAX_WORKERS = 6         # Símbolos cripto descargando en paralelo (Binance)
+BARS_BACKFILL_MINUTES = 60   # Cada cuánto el job de fondo trae las velas que faltan
+
+# --- BACKTEST DE SEÑALES (Backtester.py) ---
+BACKTEST_HORIZONS = [1, 3, 7, 14]                 # Días corridos después de la señal
+BACKTEST_SCORE_BUCKETS = [0, 20, 40, 60, 80, 101]  # Tramos de ai_score: [0-19], [20-39], ...
+# Días sin vela que se rellenan con el último cierre (fin de semana + feriado largo).
+# Después de la última vela real de cada símbolo no se rellena nada: el horizonte queda sin pasar
+BACKTEST_FILL_DAYS = 4
+# --- RECORD / REPLAY DE PROVEEDORES (UpstreamReplay.py) ---
+# live = APIs reales | record = APIs reales + graba cassettes | replay = todo contra el stand-in local
+UPSTREAM_MODE = os.getenv("UPSTREAM_MODE", "live").lower()
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "./cassettes")
+REPLAY_URL = os.getenv("REPLAY_URL", "http://127.0.0.1:8765")
+# Valores por defecto del stand-in (se pueden pisar por línea de comandos)
+REPLAY_LATENCY_MS = float(os.getenv("REPLAY_LATENCY_MS", "0"))
+REPLAY_JITTER_MS = float(os.getenv("REPLAY_JITTER_MS", "0"))
+REPLAY_ERROR_RATE = float(os.getenv("REPLAY_ERROR_RATE", "0"))
+REPLAY_ERROR_STATUS = os.getenv("REPLAY_ERROR_STATUS", "503").split(",")   # Códigos HTTP o 'reset'
+
+# --- JOBS DE ANÁLISIS EN SEGUNDO PLANO (AnalysisJobs.py) ---
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "2"))   # Escaneos manuales corriendo a la vez
+ANALYSIS_JOB_HISTORY = 50     # Jobs que lista /jobs por defecto (los más nuevos primero)
@@ -1,15 +1,28 @@
 # database.py
-from sqlalchemy import create_engine, text, inspect, Float, Integer, String, DateTime, Boolean
+from sqlalchemy import create_engine, event, text, inspect, Float, Integer, String, DateTime, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config import SQLALCHEMY_DATABASE_URL
+from config import SQLALCHEMY_DATABASE_URL, SQLITE_PRAGMAS
 
 # Crear el motor
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, "timeout": SQLITE_PRAGMAS.get("busy_timeout", 5000) / 1000}
 )
 
+# --- PERFIL DE RENDIMIENTO SQLITE ---
+# Los PRAGMA son por conexión: los aplicamos cada vez que el pool abre una nueva
+@event.listens_for(engine, "connect")
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -36,13 +49,16 @@ def smart_migration(target_metadata):
     1. Recorre TODAS las tablas definidas en modelsTables.py (target_metadata).
     2. Compara las columnas del modelo con las columnas reales de la DB.
     3. Si falta alguna columna, la crea automáticamente.
+    4. Sincroniza los índices: crea los declarados que faltan (incluye compuestos)
+       y borra los 'ix_' que ya no están en el modelo (o cambiaron de columnas).
     """
-    inspector = inspect(engine)
-    
-    # Obtener nombres de tablas reales en la DB
-    existing_tables = inspector.get_table_names()
+    # engine.begin(): los ALTER/CREATE INDEX quedan confirmados al salir (commit)
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+
+        # Obtener nombres de tablas reales en la DB
+        existing_tables = inspector.get_table_names()
 
-    with engine.connect() as conn:
         # Iterar sobre los modelos definidos en el código (La verdad absoluta)
         for table_name, table_obj in target_metadata.tables.items():
             
@@ -61,6 +77,29 @@ def smart_migration(target_metadata):
                         # Comando SQL dinámico
                         # Nota: En SQLite, al agregar columnas, solemos permitir NULL para evitar conflictos con datos viejos
                         conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {sql_type}"))
+
+                sync_indexes(conn, inspector, table_name, table_obj)
             
             # B. Si la tabla no existe, SQLAlchemy la creará después con create_all(), 
-            # así que no hacemos nada aquí.
\ No newline at end of file
+            # así que no hacemos nada aquí (create_all también crea sus índices).
+
+def sync_indexes(conn, inspector, table_name, table_obj):
+    """Compara los índices declarados en el modelo con los reales de la tabla y los alinea."""
+    existing = {ix["name"]: ix for ix in inspector.get_indexes(table_name)}
+    declared = {ix.name: ix for ix in table_obj.indexes}
+
+    # Borrar: solo los que maneja el ORM (prefijo 'ix_'), nunca índices creados a mano
+    for name, ix in existing.items():
+        declared_ix = declared.get(name)
+        changed = declared_ix is not None and [c.name for c in declared_ix.columns] != ix["column_names"]
+        if name.startswith("ix_") and (declared_ix is None or changed):
+            print(f"🔧 [AUTO-MIGRATION] Tabla '{table_name}': Eliminando índice '{name}'...")
+            conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+    # Crear: los declarados que faltan (o que acabamos de borrar por cambio de columnas)
+    current = {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+    for name, ix in declared.items():
+        if name not in current:
+            cols = ", ".join(c.name for c in ix.columns)
+            print(f"🔧 [AUTO-MIGRATION] Tabla '{table_name}': Creando índice '{name}' ({cols})...")
+            ix.create(bind=conn, checkfirst=True)
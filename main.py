@@ -4,17 +4,32 @@ from fastapi import FastAPI, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+import asyncio
+import time
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
 
 from database import engine, get_db, Base, SessionLocal, smart_migration
 from modelsTables import CryptoSignal, StockSignal, Trade
-from FieldsJSON import CoinSignalSchema, StockSignalSchema, TradeCreateSchema, PortfolioItemSchema
-from AppServices import MarketAnalyzer, Notifier, NewsIntel
-from config import SCHEDULE_HOURS
+from FieldsJSON import (
+    TradeCreateSchema, PortfolioItemSchema, AnalysisJobSchema, JobCandidateSchema
+)
+from AppServices import MarketAnalyzer, Notifier, NewsIntel, MarkToMarketEngine, sentiment_cache, scan_cache, ai_usage
+from ProviderClient import close_sessions
+from TelegramOutbox import telegram_outbox
+from LiveFeed import live_feed, sse_format
+from SignalStore import bulk_save_signals
+from BarStore import backfill_universe
+from Backtester import run_backtest
+from AnalysisJobs import AnalysisJobManager, candidate_view
+from config import (
+    SCHEDULE_HOURS, PRICE_MAX_AGE_TRADE, MARK_INTERVAL_SECONDS, LIVE_FEED_HEARTBEAT_SECONDS,
+    AUTO_MARKETS, AUTO_DECISIONS, AUTO_CYCLE_DEADLINE_SECONDS, BARS_BACKFILL_MINUTES, UNIVERSE_LIMITS
+)
 
 from fastapi import FastAPI, Depends, HTTPException, Request # <--- Agrega Request
-from fastapi.responses import HTMLResponse # <--- Importante
+from fastapi.responses import HTMLResponse, StreamingResponse # <--- Importante
 from fastapi.templating import Jinja2Templates # <--- Importante
 from datetime import timedelta # <--- Para filtrar por fecha
 
@@ -27,107 +42,128 @@ async def lifespan(app: FastAPI):
     
     scheduler = BackgroundScheduler()
     for hour in SCHEDULE_HOURS:
-        scheduler.add_job(auto_check_market, 'cron', hour=hour, minute=0)
+        scheduler.add_job(auto_check_market, 'cron', hour=hour, minute=0, max_instances=1, coalesce=True)
+    # Valuación de posiciones en segundo plano (arranca ya mismo)
+    scheduler.add_job(mark_engine.run_once, 'interval', seconds=MARK_INTERVAL_SECONDS,
+                      next_run_time=datetime.now(), max_instances=1, coalesce=True)
+    # Historial local de velas: solo se bajan los tramos que faltan
+    scheduler.add_job(refresh_bars, 'interval', minutes=BARS_BACKFILL_MINUTES, max_instances=1, coalesce=True)
     scheduler.start()
+    telegram_outbox.start()
+    # Escaneos manuales que quedaron a medias en el último apagado
+    analysis_jobs.resume()
     yield
     scheduler.shutdown()
+    analysis_jobs.shutdown()
+    # Lo que quedó en la cola de Telegram sale antes de cerrar las conexiones
+    telegram_outbox.stop(timeout=10)
+    close_sessions()
 
-def auto_check_market():
+class CycleDeadlineExceeded(Exception):
+    pass
+
+# Último reporte del escaneo automático (tiempos por mercado y etapa)
+last_auto_cycle = {}
+
+def run_auto_market(market_type: str, threshold: float, deadline: float) -> dict:
     """
-    Escaneo Inteligente (Técnico + Fundamental/IA).
+    Pipeline de UN mercado dentro del ciclo automático: escaneo -> IA -> guardado -> aviso.
+    Mide cada etapa y, si se pasó el deadline del ciclo, no arranca la siguiente
+    (un resultado que llega tarde no se guarda ni se notifica). Dentro de la etapa de IA
+    el deadline también corta: los candidatos que todavía no arrancaron se saltean.
     """
-    print(f"\n⏰ [AUTO] Escaneo Inteligente iniciado: {datetime.now()}")
-    
-    analyzer = MarketAnalyzer()
+    report = {"market": market_type, "status": "ok", "timings": {}, "candidates": 0, "saved": 0, "ai_usage": None}
     news_intel = NewsIntel()
-    db = SessionLocal()
-    
-    try:
-        # --- A. ANÁLISIS TÉCNICO ---
-        crypto_dips = analyzer.find_dip_opportunities(threshold=-5.0)
-        stock_dips = analyzer.find_stock_dips(threshold=-3.0)
-        merval_dips = analyzer.find_merval_dips(threshold=-2.0)
-        
-        valid_cryptos = []
-        valid_stocks = [] # Preparado para stocks también
-
-        # --- B. CRIPTO IA ---
-        if crypto_dips:
-            print(f"🔎 Analizando {len(crypto_dips)} candidatos cripto con IA...")
-            for op in crypto_dips:
-                # Consultar IA
-                ai_analysis = news_intel.get_sentiment_analysis(op['symbol'], op['name'], is_crypto=True)
-                
-                decision = ai_analysis.get('decision', 'NEUTRAL')
-                op['ai_score'] = ai_analysis.get('score', 50)
-                op['ai_reason'] = ai_analysis.get('reason', 'Sin datos')
-                op['ai_decision'] = decision
-
-                print(f"   🤖 {op['symbol']}: {decision}")
-
-                # FILTRO AUTOMÁTICO: Solo guardamos BUY o NEUTRAL (Ignoramos WAIT para no hacer spam)
-                if decision in ["BUY", "NEUTRAL"]:
-                    valid_cryptos.append(op)
-                    
-                    # Guardar en DB
-                    db_signal = CryptoSignal(
-                        symbol=op['symbol'], name=op['name'], 
-                        price=op['price'], percent_change_24h=op['percent_change_24h'],
-                        rsi=op['rsi'], ai_score=op['ai_score'],
-                        ai_decision=decision, ai_reason=op['ai_reason']
-                    )
-                    db.add(db_signal)
-
-        # --- C. STOCKS (Técnico por ahora, o IA simple) ---
-        if stock_dips:
-             for op in stock_dips:
-                # Opcional: Agregar IA para stocks en auto aquí si quieres
-                db_stock = StockSignal(
-                    symbol=op['symbol'], price=op['price'], 
-                    percent_change=op['percent_change'], rsi=op['rsi']
-                )
-                db.add(db_stock)
-                # Convertimos a formato compatible para el reporte
-                op['ai_decision'] = "TECNICO" 
-                op['ai_score'] = 50
-                op['ai_reason'] = "Detección automática por precio (Sin IA completa)"
-                valid_stocks.append(op)
-                
-        if merval_dips:
-             for op in merval_dips:
-                # Lógica de guardado igual a stocks
-                db_stock = StockSignal(
-                    symbol=op['symbol'], price=op['price'], 
-                    percent_change=op['percent_change'], rsi=op['rsi'],
-                    ai_decision="TECNICO", ai_score=50, ai_reason="Auto Merval"
-                )
-                db.add(db_stock)
-                op['ai_decision'] = "TECNICO"
-                valid_stocks.append(op) # Lo agregamos a la lista para notificar junto con los otros stocks
-        
-
-        db.commit()
 
-        # --- D. NOTIFICACIONES DETALLADAS 🔥 ---
-        if valid_cryptos:
-            msg = format_detailed_message("REPORTE AUTO CRIPTO", valid_cryptos)
-            Notifier.send_telegram_alert(msg)
-            
-        if valid_stocks:
-            msg = format_detailed_message("REPORTE AUTO STOCKS", valid_stocks)
-            Notifier.send_telegram_alert(msg)
-            
-        if not valid_cryptos and not valid_stocks:
-            print(">>> Sin oportunidades validadas.")
+    def stage(name, fn, *args, gated=True, **kwargs):
+        if gated and time.monotonic() > deadline:
+            raise CycleDeadlineExceeded(name)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            report["timings"][name] = round(time.perf_counter() - start, 3)
 
+    db = SessionLocal()
+    try:
+        opportunities = stage("scan", analyzer.find_market_opportunities, market_type, threshold)
+        report["candidates"] = len(opportunities)
+        if opportunities:
+            analyses = stage("ai", news_intel.analyze_opportunities, opportunities,
+                             market_type == 'CRYPTO', market_type == 'MERVAL',
+                             is_cancelled=lambda: time.monotonic() > deadline)
+            report["ai_usage"] = news_intel.last_usage
+            saved = stage("save", save_signals, db, market_type, opportunities, analyses, AUTO_DECISIONS)
+            report["saved"] = len(saved)
+            if saved:
+                # Lo guardado siempre se notifica, aunque el deadline venza justo acá (solo se encola)
+                stage("notify", Notifier.send_telegram_alert,
+                      format_detailed_message(f"REPORTE AUTO {market_type}", saved), gated=False)
+    except CycleDeadlineExceeded as e:
+        report["status"] = f"timeout ({e})"
     except Exception as e:
-        print(f"❌ Error Auto: {e}")
+        db.rollback()
+        report["status"] = f"error: {e}"
+        print(f"❌ Error Auto {market_type}: {e}")
     finally:
         db.close()
+    return report
+
+def auto_check_market():
+    """
+    Escaneo Inteligente (Técnico + Fundamental/IA) de todos los mercados de AUTO_MARKETS en paralelo.
+    El ciclo completo tiene un deadline: un proveedor lento no puede pisar el próximo horario.
+    """
+    global last_auto_cycle
+    started_at = datetime.now()
+    print(f"\n⏰ [AUTO] Escaneo Inteligente iniciado: {started_at}")
+    cycle_start = time.perf_counter()
+    deadline = time.monotonic() + AUTO_CYCLE_DEADLINE_SECONDS
+
+    executor = ThreadPoolExecutor(max_workers=len(AUTO_MARKETS), thread_name_prefix="auto-market")
+    futures = {executor.submit(run_auto_market, market, threshold, deadline): market
+               for market, threshold in AUTO_MARKETS.items()}
+    done, pending = wait(futures, timeout=max(0, deadline - time.monotonic()))
+    # No esperamos a los rezagados: al volver de su etapa actual ven el deadline y abandonan
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    reports = []
+    for future, market in futures.items():
+        if future in done:
+            reports.append(future.result())
+        else:
+            reports.append({"market": market, "status": "timeout (cycle)", "timings": {}, "candidates": 0, "saved": 0,
+                            "ai_usage": None})
+
+    for r in reports:
+        stages = ", ".join(f"{name}={secs:.1f}s" for name, secs in r["timings"].items()) or "-"
+        print(f"   📊 {r['market']}: {r['status']} | {r['candidates']} candidatos, {r['saved']} guardados | {stages}")
+        if r["ai_usage"]:
+            u = r["ai_usage"]
+            print(f"      🧠 IA: {u['calls']} llamadas, {u['prompt_tokens']}+{u['output_tokens']} tokens, "
+                  f"p50 {u['latency_p50']:.2f}s / p95 {u['latency_p95']:.2f}s")
+
+    total = round(time.perf_counter() - cycle_start, 3)
+    if not any(r["saved"] for r in reports):
+        print(">>> Sin oportunidades validadas.")
+    print(f"⏱️ [AUTO] Ciclo completo en {total:.1f}s")
+
+    last_auto_cycle = {"started_at": started_at, "total_seconds": total, "markets": reports}
+    return last_auto_cycle
+
+def refresh_bars():
+    """Snapshot del universo completo de cada mercado + backfill de las velas que faltan (BarStore)."""
+    for market in UNIVERSE_LIMITS:
+        analyzer.snapshot_universe(market)
+    return backfill_universe()
 
 app = FastAPI(title="Market Bot Trading & AI", lifespan=lifespan)
 analyzer = MarketAnalyzer()
+mark_engine = MarkToMarketEngine(analyzer)
 templates = Jinja2Templates(directory="templates")
+# Los escaneos manuales corren como jobs de fondo (save_signals y format_detailed_message están más abajo)
+analysis_jobs = AnalysisJobManager(analyzer, lambda *args: save_signals(*args),
+                                   lambda *args: format_detailed_message(*args))
 
 @app.get("/")
 def root():
@@ -135,22 +171,72 @@ def root():
 
 # --- ENDPOINTS MANUALES ---
 
-@app.get("/analyze", response_model=List[CoinSignalSchema])
-def analyze_market(threshold: float = -5.0, db: Session = Depends(get_db)):
-    return run_analysis_cycle(db, 'CRYPTO', threshold)
+# Escanear + 20 noticias/IA tarda más que el timeout de muchos clientes y proxies:
+# el endpoint encola un job y devuelve su id; el avance se consulta en /jobs/{job_id}.
+# Pedidos iguales en vuelo comparten job; dedupe=false encola uno nuevo igual.
+
+@app.get("/analyze", response_model=AnalysisJobSchema, status_code=202)
+def analyze_market(threshold: float = -5.0, dedupe: bool = True):
+    return analysis_jobs.submit('CRYPTO', threshold, dedupe)
 
-@app.get("/analyze/stocks", response_model=List[StockSignalSchema])
-def analyze_stocks(threshold: float = -3.0, db: Session = Depends(get_db)):
-    return run_analysis_cycle(db, 'USA', threshold)
+@app.get("/analyze/stocks", response_model=AnalysisJobSchema, status_code=202)
+def analyze_stocks(threshold: float = -3.0, dedupe: bool = True):
+    return analysis_jobs.submit('USA', threshold, dedupe)
 
-@app.get("/analyze/Merval", response_model=List[StockSignalSchema])
-def analyze_merval(threshold: float = -2.0, db: Session = Depends(get_db)):
+@app.get("/analyze/Merval", response_model=AnalysisJobSchema, status_code=202)
+def analyze_merval(threshold: float = -2.0, dedupe: bool = True):
     """
     Escanea ADRs Argentinos en Dólares (YPF, GGAL, MELI, etc.)
     Usa el motor unificado con el perfil 'MERVAL'.
     """
-    # Toda la magia ocurre aquí dentro 👇
-    return run_analysis_cycle(db, 'MERVAL', threshold)
+    return analysis_jobs.submit('MERVAL', threshold, dedupe)
+
+def get_job_or_404(job_id: str) -> dict:
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
+
+@app.get("/jobs", response_model=List[AnalysisJobSchema])
+def list_analysis_jobs(limit: int = 50, market: str = None):
+    """Últimos escaneos manuales (los más nuevos primero). market: CRYPTO / USA / MERVAL."""
+    return analysis_jobs.list_jobs(limit, market)
+
+@app.get("/jobs/stats")
+def get_job_stats():
+    """Jobs enviados, deduplicados, retomados tras un reinicio y terminados por estado."""
+    return analysis_jobs.stats()
+
+@app.get("/jobs/{job_id}", response_model=AnalysisJobSchema)
+def get_analysis_job(job_id: str):
+    """Progreso: etapa actual y candidatos por estado."""
+    return analysis_jobs.summary(get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/candidates", response_model=List[JobCandidateSchema])
+def get_job_candidates(job_id: str, status: str = None):
+    """Estado de cada candidato del escaneo (pending / analyzing / done / error / cancelled)."""
+    candidates = [candidate_view(c) for c in get_job_or_404(job_id)["candidates"] or []]
+    return [c for c in candidates if status is None or c["status"] == status]
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(job_id: str):
+    """
+    Resultados: con el job terminado, las señales guardadas; antes (o si se canceló),
+    los candidatos que ya tienen el análisis de la IA.
+    """
+    job = get_job_or_404(job_id)
+    if job["status"] == "done":
+        return {"job_id": job_id, "status": job["status"], "final": True, "results": job["results"] or []}
+    partial = [candidate_view(c) for c in job["candidates"] or [] if c["status"] in ("done", "error")]
+    return {"job_id": job_id, "status": job["status"], "final": False, "results": partial}
+
+@app.post("/jobs/{job_id}/cancel", response_model=AnalysisJobSchema)
+def cancel_analysis_job(job_id: str):
+    """Cancela el job: no se analiza lo pendiente y no se guardan señales (los parciales quedan)."""
+    job = analysis_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
 
 # ==========================================
 # --- NUEVOS ENDPOINTS: TRADING & SENTIMENT ---
@@ -167,11 +253,48 @@ def get_sentiment():
         "last_updated": datetime.now()
     }
 
+@app.get("/backtest")
+def backtest_signals(horizons: str = "1,3,7,14", since_days: int = None, market: str = None):
+    """
+    ¿Las señales BUY pagaron? Retornos a futuro por horizonte (días), tasa de acierto
+    por decisión IA y por tramo de score, y drawdowns. Usa el historial local de velas.
+    market: CRYPTO / USA / MERVAL / STOCK (USA + MERVAL); vacío = todos.
+    MERVAL se mide contra las velas SYM.BA; las acciones viejas sin mercado quedan fuera (unknown_market).
+    """
+    try:
+        horizon_list = [int(h) for h in horizons.split(",") if h.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="horizons debe ser una lista de enteros (ej: 1,3,7)")
+    if any(h < 1 for h in horizon_list):
+        raise HTTPException(status_code=400, detail="horizons debe tener solo enteros >= 1 (días)")
+    return run_backtest(horizon_list, since_days, market)
+
+@app.get("/auto/last-cycle")
+def get_last_auto_cycle():
+    """Resultado del último escaneo automático: estado, candidatos y tiempos por mercado/etapa."""
+    return last_auto_cycle
+
+@app.get("/ai/cache")
+def get_ai_cache_stats():
+    """Contadores de la cache de sentimiento IA (hits = llamadas a Gemini ahorradas)."""
+    return sentiment_cache.stats()
+
+@app.get("/scan/cache")
+def get_scan_cache_stats():
+    """Snapshots de escaneo en memoria por mercado: edad, filas y cuántos pedidos se ahorraron."""
+    return scan_cache.stats()
+
+@app.get("/ai/usage")
+def get_ai_usage():
+    """Tokens (entrada/salida) y latencia de Gemini: acumulado por mercado y últimos ciclos."""
+    return ai_usage.stats()
+
 @app.post("/trade/buy")
 def execute_buy_order(order: TradeCreateSchema, db: Session = Depends(get_db)):
     """Simula una compra. Calcula cantidad basada en el precio actual."""
-    # 1. Obtener precio actual real
-    current_price = analyzer.get_current_price(order.symbol)
+    # 1. Obtener precio actual real (los trades exigen un precio reciente)
+    quote = analyzer.get_price_quote(order.symbol, max_age=PRICE_MAX_AGE_TRADE)
+    current_price = quote['price']
     
     if current_price <= 0:
         raise HTTPException(status_code=400, detail=f"No se pudo obtener precio para {order.symbol}")
@@ -190,42 +313,41 @@ def execute_buy_order(order: TradeCreateSchema, db: Session = Depends(get_db)):
     db.add(new_trade)
     db.commit()
     db.refresh(new_trade)
+    # Primer mark con el precio de ejecución (el job de fondo lo irá actualizando)
+    mark_engine.mark_trade(db, new_trade, current_price, quote['source'])
     
     # 4. Notificar a Telegram
     msg = f"💸 **COMPRA EJECUTADA** 💸\nActivo: {new_trade.symbol}\nPrecio: ${round(current_price, 4)}\nInversión: ${order.investment_usd}\nCantidad: {round(quantity, 6)}"
     Notifier.send_telegram_alert(msg)
     
-    return {"message": "Orden ejecutada", "trade_id": new_trade.id, "details": msg}
+    return {
+        "message": "Orden ejecutada", "trade_id": new_trade.id, "details": msg,
+        "price_source": quote['source'], "price_age_seconds": quote['age_seconds']
+    }
 
 @app.get("/portfolio", response_model=List[PortfolioItemSchema])
 def view_portfolio(db: Session = Depends(get_db)):
     """Ve tus posiciones abiertas y calcula Ganancia/Pérdida en tiempo real."""
     trades = db.query(Trade).filter(Trade.status == "OPEN").all()
+    # Último mark de cada posición (lo calcula el job de fondo, sin APIs en el request)
+    marks = MarkToMarketEngine.get_marks(db)
     portfolio = []
     
     for trade in trades:
-        # Precio actual en vivo
-        live_price = analyzer.get_current_price(trade.symbol)
-        
-        # Si falla la API, usamos el precio de entrada para no romper el cálculo
-        if live_price == 0:
-            live_price = trade.entry_price 
-            
-        current_val = live_price * trade.quantity
-        pnl = current_val - trade.invested_amount
-        pnl_pct = (pnl / trade.invested_amount) * 100
-        
+        position = value_position(trade, marks.get(trade.id))
         item = {
             "id": trade.id,
             "symbol": trade.symbol,
             "entry_price": trade.entry_price,
-            "current_price": live_price,
+            "current_price": position['current_price'],
             "quantity": trade.quantity,
             "invested_amount": trade.invested_amount,
-            "current_value": current_val,
-            "pnl_usd": round(pnl, 2),
-            "pnl_percent": round(pnl_pct, 2),
-            "bought_at": trade.bought_at
+            "current_value": position['current_value'],
+            "pnl_usd": round(position['pnl_usd'], 2),
+            "pnl_percent": round(position['pnl_percent'], 2),
+            "bought_at": trade.bought_at,
+            "price_source": position['price_source'],
+            "price_age_seconds": position['price_age_seconds']
         }
         portfolio.append(item)
         
@@ -247,53 +369,21 @@ def dashboard(request: Request, db: Session = Depends(get_db)):
     recent_cryptos = db.query(CryptoSignal).order_by(CryptoSignal.detected_at.desc()).limit(20).all()
     recent_stocks = db.query(StockSignal).order_by(StockSignal.detected_at.desc()).limit(20).all()
     
-    normalized_ops = []
-
-    # 2. Normalizar Criptos (Mapear percent_change_24h -> percent_change)
-    for c in recent_cryptos:
-        normalized_ops.append({
-            "symbol": c.symbol,
-            "name": c.name,
-            "price": c.price,
-            "percent_change": c.percent_change_24h, # <--- AQUÍ ESTÁ EL FIX
-            "rsi": c.rsi,
-            "technical_signal": c.technical_signal,
-            "ai_score": c.ai_score,
-            "ai_decision": c.ai_decision,
-            "ai_reason": c.ai_reason,
-            "detected_at": c.detected_at
-        })
-
-    # 3. Normalizar Stocks (Ya tienen percent_change, pero unificamos estructura)
-    for s in recent_stocks:
-        normalized_ops.append({
-            "symbol": s.symbol,
-            "name": s.symbol, # Stocks no tienen campo 'name' en tu DB, usamos symbol
-            "price": s.price,
-            "percent_change": s.percent_change,
-            "rsi": s.rsi,
-            "technical_signal": s.technical_signal,
-            "ai_score": s.ai_score,
-            "ai_decision": s.ai_decision,
-            "ai_reason": s.ai_reason,
-            "detected_at": s.detected_at
-        })
+    # 2 y 3. Normalizar ambas tablas a una sola estructura (Criptos: percent_change_24h -> percent_change)
+    normalized_ops = [normalize_signal(c) for c in recent_cryptos] + [normalize_signal(s) for s in recent_stocks]
 
     # 4. Ordenar todo por fecha (lo más nuevo arriba)
     normalized_ops.sort(key=lambda x: x['detected_at'], reverse=True)
 
     # 5. Calcular datos del Portafolio (Paper Trading)
+    # PnL real usando los marks del job de fondo (una sola lectura, sin APIs)
     portfolio_items = db.query(Trade).filter(Trade.status == "OPEN").all()
+    marks = MarkToMarketEngine.get_marks(db)
     total_invested = sum(item.invested_amount for item in portfolio_items)
-    
-    # Calculamos valor actual estimado (usando precio de entrada si no hay live price para no demorar)
-    current_val_est = 0
-    for item in portfolio_items:
-        current_val_est += item.invested_amount # Simplificado para visualización rápida
-        # Si quisieras PnL real en dashboard, habría que llamar a APIs, pero lo haría lento.
-        # Mejor dejarlo estático o usar el precio de salida si existiera.
+    current_val_est = sum(value_position(item, marks.get(item.id))['current_value'] for item in portfolio_items)
 
-    total_pnl = current_val_est - total_invested # Dará 0 hasta que implementes live prices en dashboard
+    total_pnl = current_val_est - total_invested
+    total_pnl_pct = (total_pnl / total_invested) * 100 if total_invested else 0
 
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
@@ -302,7 +392,7 @@ def dashboard(request: Request, db: Session = Depends(get_db)):
             "total_invested": total_invested,
             "current_value": current_val_est,
             "pnl": total_pnl,
-            "pnl_percent": 0
+            "pnl_percent": total_pnl_pct
         }
     })
 
@@ -313,26 +403,23 @@ def view_portfolio_web(request: Request, db: Session = Depends(get_db)):
     Renderiza el Portafolio Web (Solo Posiciones Abiertas).
     """
     trades = db.query(Trade).filter(Trade.status == "OPEN").all()
+    marks = MarkToMarketEngine.get_marks(db)
     portfolio_data = []
     
     for trade in trades:
-        live_price = analyzer.get_current_price(trade.symbol)
-        if live_price == 0: live_price = trade.entry_price 
-            
-        current_val = live_price * trade.quantity
-        pnl = current_val - trade.invested_amount
-        pnl_pct = (pnl / trade.invested_amount) * 100
-        
+        position = value_position(trade, marks.get(trade.id))
         item = {
             "id": trade.id, # IDENTIFICADOR PARA EL BOTÓN DE VENTA
             "symbol": trade.symbol,
             "bought_at": trade.bought_at,
             "quantity": trade.quantity,
             "entry_price": trade.entry_price,
-            "current_price": live_price,
-            "current_value": current_val,
-            "pnl_usd": pnl,
-            "pnl_percent": pnl_pct
+            "current_price": position['current_price'],
+            "current_value": position['current_value'],
+            "pnl_usd": position['pnl_usd'],
+            "pnl_percent": position['pnl_percent'],
+            "price_source": position['price_source'],
+            "price_age_seconds": position['price_age_seconds']
         }
         portfolio_data.append(item)
         
@@ -352,8 +439,9 @@ def manual_sell_trade(trade_id: int, db: Session = Depends(get_db)):
     if trade.status == "CLOSED":
         raise HTTPException(status_code=400, detail="Este trade ya está cerrado")
         
-    # 1. Obtener precio actual
-    current_price = analyzer.get_current_price(trade.symbol)
+    # 1. Obtener precio actual (fresco, es una ejecución)
+    quote = analyzer.get_price_quote(trade.symbol, max_age=PRICE_MAX_AGE_TRADE)
+    current_price = quote['price']
     if current_price == 0: 
         # Si falla la API, usamos el precio de entrada como fallback de emergencia
         current_price = trade.entry_price 
@@ -368,8 +456,9 @@ def manual_sell_trade(trade_id: int, db: Session = Depends(get_db)):
     trade.closed_at = datetime.utcnow()
     trade.realized_pnl = pnl_usd
     
-    # 4. Guardar
+    # 4. Guardar (y sacar la posición de los marks en vivo)
     db.commit()
+    mark_engine.unmark_trade(db, trade.id)
     
     # 5. Notificar
     icon = "💰" if pnl_usd > 0 else "📉"
@@ -381,7 +470,48 @@ def manual_sell_trade(trade_id: int, db: Session = Depends(get_db)):
     )
     Notifier.send_telegram_alert(msg)
     
-    return {"message": "Venta exitosa", "pnl": pnl_usd}
+    return {
+        "message": "Venta exitosa", "pnl": pnl_usd,
+        "price_source": quote['source'], "price_age_seconds": quote['age_seconds']
+    }
+
+@app.get("/stream", tags=["Dashboard"])
+async def stream_updates(request: Request):
+    """
+    Server-Sent Events: el Dashboard y el Portafolio se suscriben acá (EventSource)
+    y reciben solo las novedades, sin recargar la página:
+    - signal: nueva señal Cripto/Stock guardada por un ciclo de análisis.
+    - mark: cambió el precio (y el PnL) de una posición abierta.
+    - position_closed: la posición se vendió.
+    """
+    last_id = request.headers.get("last-event-id")
+    queue = live_feed.subscribe(int(last_id) if last_id and last_id.isdigit() else None)
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=LIVE_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield sse_format(event)
+        finally:
+            live_feed.unsubscribe(queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stream/stats", tags=["Dashboard"])
+def get_stream_stats():
+    """Navegadores conectados y último id de evento emitido."""
+    return live_feed.stats()
+
+@app.get("/notifications/stats", tags=["Dashboard"])
+def get_notification_stats():
+    """Cola de Telegram: pendientes, enviados, digests, reintentos y fallas."""
+    return telegram_outbox.stats()
 
 @app.get("/history", response_class=HTMLResponse, tags=["Dashboard"])
 def view_history_web(request: Request, db: Session = Depends(get_db)):
@@ -404,6 +534,50 @@ def view_history_web(request: Request, db: Session = Depends(get_db)):
         "total_pnl": total_pnl
     })
 
+# --- HELPER: SEÑAL (Cripto o Stock) -> ESTRUCTURA ÚNICA DEL DASHBOARD ---
+def normalize_signal(signal) -> dict:
+    """Acepta objetos ORM o filas livianas de SignalStore (mismos atributos)."""
+    is_crypto = hasattr(signal, 'percent_change_24h')
+    return {
+        "id": signal.id,
+        "market": "CRYPTO" if is_crypto else "STOCK",
+        "symbol": signal.symbol,
+        # Stocks no tienen campo 'name' en la DB, usamos symbol
+        "name": signal.name if is_crypto else signal.symbol,
+        "price": signal.price,
+        "percent_change": signal.percent_change_24h if is_crypto else signal.percent_change,
+        "rsi": signal.rsi,
+        "technical_signal": signal.technical_signal,
+        "ai_score": signal.ai_score,
+        "ai_decision": signal.ai_decision,
+        "ai_reason": signal.ai_reason,
+        "detected_at": signal.detected_at
+    }
+
+# --- HELPER: VALUACIÓN DE UNA POSICIÓN DESDE SU MARK ---
+def value_position(trade: Trade, mark) -> dict:
+    """
+    Valúa una posición con su último mark (job de fondo).
+    Si todavía no tiene mark, usamos el precio de entrada para no romper el cálculo.
+    """
+    if mark is not None and mark.mark_price:
+        price, source = mark.mark_price, mark.price_source
+        age = (datetime.utcnow() - mark.marked_at).total_seconds() if mark.marked_at else None
+    else:
+        price, source, age = trade.entry_price, "entry", None
+
+    current_val = price * trade.quantity
+    pnl = current_val - trade.invested_amount
+    pnl_pct = (pnl / trade.invested_amount) * 100 if trade.invested_amount else 0.0
+    return {
+        "current_price": price,
+        "current_value": current_val,
+        "pnl_usd": pnl,
+        "pnl_percent": pnl_pct,
+        "price_source": source,
+        "price_age_seconds": round(age, 1) if age is not None else None
+    }
+
 # --- HELPER: CONSTRUCTOR DE MENSAJES DETALLADOS ---
 def format_detailed_message(title: str, signals: list):
     """
@@ -437,61 +611,17 @@ def format_detailed_message(title: str, signals: list):
     
     return msg
 
-def run_analysis_cycle(db: Session, market_type: str, threshold: float):
-    news_intel = NewsIntel()
-    
-    # 1. Usamos el nuevo Escáner Universal
-    opportunities = analyzer.find_market_opportunities(market_type, threshold)
-    saved_signals = []
-    
-    msg_inicio = f"🔎 Iniciando Análisis {market_type} ({len(opportunities)} activos)..."
-    print(msg_inicio)
-    Notifier.send_telegram_alert(msg_inicio)
-
-    for op in opportunities:
-        # 2. Análisis IA (Lógica Unificada)
-        # Determinamos si es crypto o merval para el contexto de la noticia
-        is_crypto = (market_type == 'CRYPTO')
-        is_merval = (market_type == 'MERVAL')
-        
-        try:
-            ai_analysis = news_intel.get_sentiment_analysis(
-                symbol=op['symbol'], 
-                asset_name=op['name'], 
-                is_crypto=is_crypto,
-                is_merval=is_merval
-            )
-        except:
-            ai_analysis = {"score": 50, "decision": "NEUTRAL", "reason": "Error IA"}
-
-        # 3. Guardado Polimórfico (Aquí el único IF necesario)
-        if market_type == 'CRYPTO':
-            db_signal = CryptoSignal(
-                symbol=op['symbol'], name=op['name'], 
-                price=op['price'], percent_change_24h=op['percent_change'], # Ojo: unificamos a percent_change en el scanner
-                rsi=op['rsi'], technical_signal=op['technical_signal'],
-                ai_score=ai_analysis.get('score'), ai_decision=ai_analysis.get('decision'), ai_reason=ai_analysis.get('reason')
-            )
-        else:
-            # Stock y Merval usan la misma tabla StockSignal
-            db_signal = StockSignal(
-                symbol=op['symbol'], 
-                price=op['price'], percent_change=op['percent_change'],
-                rsi=op['rsi'], technical_signal=op['technical_signal'],
-                ai_score=ai_analysis.get('score'), ai_decision=ai_analysis.get('decision'), ai_reason=ai_analysis.get('reason')
-            )
-            
-        db.add(db_signal)
-        saved_signals.append(db_signal) # Guardamos para el reporte
-    
-    db.commit()
-    
-    # 4. Reporte Unificado
-    if saved_signals:
-        full_msg = format_detailed_message(f"REPORTE {market_type}", saved_signals)
-        Notifier.send_telegram_alert(full_msg)
-    
+def save_signals(db: Session, market_type: str, opportunities: list, analyses: list, decisions: list = None) -> list:
+    """
+    Guarda las señales del ciclo en UN insert por lotes (una transacción) y las empuja
+    al Dashboard en vivo. Devuelve filas livianas para el reporte y la respuesta.
+    decisions: si se indica, solo se guardan esas decisiones IA (ej: ["BUY", "NEUTRAL"]).
+    """
+    saved_signals = bulk_save_signals(db, market_type, opportunities, analyses, decisions)
+    # Empujamos las señales nuevas a los navegadores conectados (/stream)
+    live_feed.publish_many("signal", [normalize_signal(sig) for sig in saved_signals])
     return saved_signals
+
 # --- ARRANQUE DEL SERVIDOR ---
 if __name__ == "__main__":
     hostsv="0.0.0.0" #local es "127.0.0.1"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, Boolean, Text
 from datetime import datetime
 from database import Base
 
@@ -21,10 +21,17 @@ class CryptoSignal(Base):
     
     detected_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Dashboard: ORDER BY detected_at DESC LIMIT 20 (SQLite recorre el índice al revés)
+        Index("ix_crypto_signals_detected_at", "detected_at"),
+    )
+
 class StockSignal(Base):
     __tablename__ = "stock_signals"
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, index=True)
+    # USA / MERVAL (MERVAL = BCBA, en pesos). NULL en las señales guardadas antes de esta columna
+    market = Column(String, nullable=True)
     price = Column(Float)
     percent_change = Column(Float)
     rsi = Column(Float, nullable=True)
@@ -36,6 +43,10 @@ class StockSignal(Base):
     
     detected_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_stock_signals_detected_at", "detected_at"),
+    )
+
 # --- NUEVA TABLA: TRANSACCIONES (Paper Trading) ---
 class Trade(Base):
     __tablename__ = "trades"
@@ -51,4 +62,57 @@ class Trade(Base):
     exit_price = Column(Float, nullable=True)
     sell_reason = Column(String, nullable=True)
     closed_at = Column(DateTime, nullable=True)
-    realized_pnl = Column(Float, nullable=True)
\ No newline at end of file
+    realized_pnl = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # Un solo índice compuesto cubre status='OPEN' (prefijo) y
+        # status='CLOSED' ORDER BY closed_at (historial) sin ordenar en memoria
+        Index("ix_trades_status_closed_at", "status", "closed_at"),
+    )
+
+# --- NUEVA TABLA: CACHE DE SENTIMIENTO IA ---
+class SentimentCacheEntry(Base):
+    __tablename__ = "sentiment_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True)  # market:SYMBOL:hash
+    symbol = Column(String, index=True)
+    market = Column(String)                              # crypto / merval / stock
+    headlines_hash = Column(String)
+    score = Column(Integer, nullable=True)
+    decision = Column(String, nullable=True)
+    reason = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# --- NUEVA TABLA: MARK-TO-MARKET (Último precio de cada posición abierta) ---
+class PositionMark(Base):
+    __tablename__ = "position_marks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    trade_id = Column(Integer, unique=True, index=True)
+    symbol = Column(String, index=True)
+    mark_price = Column(Float)
+    price_source = Column(String, nullable=True)   # yahoo / binance / cmc / entry
+    market_value = Column(Float)
+    pnl_usd = Column(Float)
+    pnl_percent = Column(Float)
+    marked_at = Column(DateTime, default=datetime.utcnow)
+
+# --- NUEVA TABLA: JOBS DE ANÁLISIS (/analyze en segundo plano, ver AnalysisJobs.py) ---
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String, primary_key=True, index=True)      # uuid hex (lo que recibe el cliente)
+    market = Column(String, index=True)                    # CRYPTO / USA / MERVAL
+    threshold = Column(Float)
+    status = Column(String, index=True)                    # queued / scanning / analyzing / saving / done / cancelled / failed
+    cancel_requested = Column(Boolean, default=False)
+    attempts = Column(Integer, default=0)                  # >1 = se retomó después de un reinicio
+    candidates = Column(Text, nullable=True)               # JSON: [{op, status, analysis}] (null = todavía no escaneó)
+    results = Column(Text, nullable=True)                  # JSON: señales guardadas al terminar
+    ai_usage = Column(Text, nullable=True)                 # JSON: tokens y latencia de la IA del job
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
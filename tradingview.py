@@ -1,6 +1,9 @@
-import requests
 import pandas as pd
 import matplotlib.pyplot as plt
+from CandlePatterns import add_pattern_columns, candle_columns
+from ProviderClient import http_post
+from SnapshotStore import save_snapshot
+from TVScanner import sharded_scan
 
 cookies = {
     'cookiePrivacyPreferenceBannerProduction': 'notApplicable',
@@ -64,7 +67,7 @@ def get_crypto_data(limit=100):
 
     try:
         print(f"📡 Consultando Crypto Screener (Top {limit})...")
-        response = requests.post(url, headers=headers, cookies=cookies, json=payload)
+        response = http_post(url, headers=headers, cookies=cookies, json=payload)
         
         if response.status_code == 200:
             json_data = response.json()
@@ -103,19 +106,9 @@ def procesar_crypto_tecnico(df_raw):
     if col_cambio in df.columns:
         df.rename(columns={col_cambio: "change_24h"}, inplace=True)
     
-    # 2. Detectar Patrones de Velas
-    candle_cols = [c for c in df.columns if "Candle." in c]
-    
-    def detectar(row):
-        patrones = []
-        for col in candle_cols:
-            if pd.notna(row[col]) and row[col] == 1:
-                # Limpiar nombre: Candle.Hammer -> Hammer
-                patrones.append(col.replace("Candle.", "").replace(".", " "))
-        return ", ".join(patrones) if patrones else "Sin Patrón"
-
-    if candle_cols:
-        df['Patrones_Hoy'] = df.apply(detectar, axis=1)
+    # 2. Detectar Patrones de Velas (vectorizado, ver CandlePatterns.py)
+    if candle_columns(df):
+        add_pattern_columns(df, empty_label="Sin Patrón")
 
     # 3. Seleccionar columnas finales limpias para ver en consola
     # Prioridad: Símbolo, Precio, Cambio, RSI, Patrón
@@ -179,18 +172,11 @@ def make_request(markets=None, limit=100):
     
     try:
         # Usamos 'headers' y 'cookies' (en minúscula) que vienen de tus líneas 0-36
-        response = requests.post(url, headers=headers, cookies=cookies, json=data)
-        
-        if response.status_code == 200:
-            json_data = response.json()
-            if 'data' in json_data:
-                return pd.DataFrame([d['d'] for d in json_data['data']])
-            else:
-                print("⚠️ La respuesta no contiene datos.")
-                return pd.DataFrame()
-        else:
-            print(f"❌ Error: {response.status_code}")
-            return pd.DataFrame()
+        # Un fragmento por mercado/página, en paralelo (ver TVScanner.py)
+        df = sharded_scan(url, data, listaunificada, headers=headers, cookies=cookies)
+        if df.empty:
+            print("⚠️ La respuesta no contiene datos.")
+        return df
 
     except Exception as e:
         print(f"❌ Error de conexión: {e}")
@@ -217,22 +203,9 @@ def generar_dataframe_tecnico(df_completo):
     # Creamos el sub-dataframe con todo lo necesario
     df_tech = df_completo[cols_existentes].copy()
 
-    # 2. LÓGICA: Unificar Patrones de Velas
-    candle_cols = [c for c in df_tech.columns if "Candle." in c]
-    
-    def detectar_patrones(row):
-        encontrados = []
-        for col in candle_cols:
-            # Verificamos que sea 1 (y nos aseguramos que no sea NaN)
-            if pd.notna(row[col]) and row[col] == 1: 
-                nombre_limpio = col.replace("Candle.", "").replace(".", " ")
-                encontrados.append(nombre_limpio)
-        return ", ".join(encontrados) if encontrados else "Sin Patrón"
-
-    if candle_cols:
-        df_tech['Patrones_Hoy'] = df_tech.apply(detectar_patrones, axis=1)
-    else:
-        df_tech['Patrones_Hoy'] = "Sin Datos Velas"
+    # 2. LÓGICA: Unificar Patrones de Velas (vectorizado, ver CandlePatterns.py)
+    candle_cols = candle_columns(df_tech)
+    add_pattern_columns(df_tech, empty_label="Sin Patrón", no_candles_label="Sin Datos Velas")
 
     # 3. Limpieza Final: Ordenamos columnas con PRIORIDAD
     # Ahora sí incluimos close y change al principio
@@ -273,24 +246,20 @@ if __name__ == "__main__":
         if not con_patron.empty:
             print(con_patron.sort_values(by='change')[cols_ver].head(10))
 
-        # --- 💾 GUARDANDO EXCELS ---
-        print("\n--- 💾 Guardando archivos Excel... ---")
+        # --- 💾 GUARDANDO SNAPSHOTS (Parquet) ---
+        print("\n--- 💾 Guardando snapshots... ---")
         
         try:
-            # 1. Excel Completo (Raw Data)
-            nombre_completo = "TV_Data_Completa.xlsx"
-            df_completo.to_excel(nombre_completo, index=False)
-            print(f"✅ Archivo guardado: {nombre_completo}")
-
-            # 2. Excel Técnico (Procesado y Limpio)
-            nombre_tecnico = "TV_Analisis_Tecnico.xlsx"
-            df_tecnico.to_excel(nombre_tecnico, index=False)
-            print(f"✅ Archivo guardado: {nombre_tecnico}")
+            # 1. Snapshot Completo (Raw Data)
+            ruta_completa = save_snapshot(df_completo, "GLOBAL", kind="raw")
+            print(f"✅ Snapshot guardado: {ruta_completa}")
+
+            # 2. Snapshot Técnico (Procesado y Limpio)
+            ruta_tecnica = save_snapshot(df_tecnico, "GLOBAL", kind="tecnico")
+            print(f"✅ Snapshot guardado: {ruta_tecnica}")
             
         except ImportError:
-            print("❌ Error: Necesitas instalar openpyxl. Ejecuta: pip install openpyxl")
-        except PermissionError:
-            print("❌ Error: Cierra el archivo Excel si lo tienes abierto antes de guardar.")
+            print("❌ Error: Necesitas instalar pyarrow. Ejecuta: pip install pyarrow")
 
     else:
         print("No se recibieron datos.")
@@ -318,11 +287,12 @@ if __name__ == "__main__":
         if not dips.empty:
              print(dips[['base_currency', 'close', 'change_24h', 'RSI']].head(5))
 
-        # Guardar Excel de prueba
+        # Guardar snapshot de prueba
         try:
-            df_clean.to_excel("Test_Crypto_Data.xlsx", index=False)
-            print("\n💾 Guardado 'Test_Crypto_Data.xlsx'")
-        except: pass
+            ruta = save_snapshot(df_clean, "CRYPTO", kind="tecnico")
+            print(f"\n💾 Snapshot guardado: {ruta}")
+        except Exception as e:
+            print(f"❌ Error guardando snapshot: {e}")
 
     else:
         print("❌ No se obtuvieron datos de Cripto.")